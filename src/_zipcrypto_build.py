@@ -0,0 +1,41 @@
+"""Builds the compiled ZipCrypto routine: `python3 -m src._zipcrypto_build` from the project root.
+
+The result (src/_zipcrypto_c.*.so) is picked up by src/zipcrypto.py; without a C compiler the
+build fails and the pure-Python decrypter is used instead.
+"""
+from cffi import FFI
+
+from .zipcrypto import CRC_TABLE
+
+CDEF = "void zipcrypto_decrypt(uint32_t *keys, const unsigned char *data, unsigned char *out, size_t length);"
+
+SOURCE = r"""
+#include <stdint.h>
+#include <stddef.h>
+
+static const uint32_t crc_table[256] = {%s};
+
+/* keys: key0, key1, key2, updated in place so the next buffer continues the stream */
+void zipcrypto_decrypt(uint32_t *keys, const unsigned char *data, unsigned char *out, size_t length)
+{
+    uint32_t key0 = keys[0], key1 = keys[1], key2 = keys[2];
+    for (size_t i = 0; i < length; i++) {
+        uint32_t k = key2 | 2;
+        unsigned char c = data[i] ^ (unsigned char)((k * (k ^ 1)) >> 8);
+        out[i] = c;
+        key0 = (key0 >> 8) ^ crc_table[(key0 ^ c) & 0xFF];
+        key1 = (key1 + (key0 & 0xFF)) * 134775813u + 1;
+        key2 = (key2 >> 8) ^ crc_table[(key2 ^ (key1 >> 24)) & 0xFF];
+    }
+    keys[0] = key0;
+    keys[1] = key1;
+    keys[2] = key2;
+}
+""" % ', '.join(f"0x{crc:08X}u" for crc in CRC_TABLE)
+
+ffibuilder = FFI()
+ffibuilder.cdef(CDEF)
+ffibuilder.set_source('src._zipcrypto_c', SOURCE, extra_compile_args=['-O2'])
+
+if __name__ == '__main__':
+    ffibuilder.compile(verbose=False)
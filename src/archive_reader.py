@@ -0,0 +1,158 @@
+import io
+import mmap
+import os
+from typing import BinaryIO, Optional
+
+
+class MappedArchive:
+    """Read-only memory map of an archive on disk, shared by all readers of that archive.
+
+    Pages are hinted for sequential access, so the kernel reads ahead in large blocks; each
+    reader is an independent cursor over the same mapping and needs no lock to seek.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+        self.size = os.fstat(self._fd).st_size
+        self._map: Optional[mmap.mmap] = None
+        try:
+            if self.size:
+                self._map = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+                self._advise()
+        except (OSError, ValueError):
+            # Not mappable (special file, exotic filesystem): readers fall back to pread()
+            self._map = None
+
+    def _advise(self):
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(self._fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        if hasattr(self._map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            try:
+                self._map.madvise(mmap.MADV_SEQUENTIAL)
+            except OSError:
+                pass
+
+    def reader(self) -> 'MappedReader':
+        """A new file-like cursor over the archive, e.g. for `zipfile.ZipFile`."""
+        return MappedReader(self)
+
+    def read_at(self, position: int, size: int) -> bytes:
+        position = max(0, min(position, self.size))
+        size = max(0, min(size, self.size - position))
+        if self._map is not None:
+            return self._map[position:position + size]
+        return os.pread(self._fd, size, position)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self) -> 'MappedArchive':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class MappedReader(io.RawIOBase):
+    """Seekable read-only file object over a MappedArchive; reads copy straight out of the mapping."""
+
+    def __init__(self, archive: MappedArchive):
+        super().__init__()
+        self.archive = archive
+        self.size = archive.size
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"Invalid whence: {whence}")
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.position = offset
+        return offset
+
+    def read(self, size: int = -1) -> bytes:
+        position = self.position
+        end = self.size if size is None or size < 0 else position + size
+        mapping = self.archive._map
+        # Slicing the mapping clamps to its end, like a read at EOF
+        data = mapping[position:end] if mapping is not None else self.archive.read_at(position, end - position)
+        self.position = position + len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class ArchiveSlice(io.RawIOBase):
+    """Seekable read-only window of `size` bytes at `start` in another file object.
+
+    Every read seeks the parent first, so the parent may be shared with other readers as long as
+    they are not used concurrently.
+    """
+
+    def __init__(self, parent: BinaryIO, start: int, size: int):
+        super().__init__()
+        self.parent = parent
+        self.start = start
+        self.size = size
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"Invalid whence: {whence}")
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.position = offset
+        return offset
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = max(0, self.size - self.position)
+        size = remaining if size is None or size < 0 else min(size, remaining)
+        if not size:
+            return b''
+        self.parent.seek(self.start + self.position)
+        data = self.parent.read(size)
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
@@ -0,0 +1,171 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class TokenBucket:
+    """Token bucket measured in bytes; `rate` is bytes per second."""
+
+    def __init__(self, rate: float, burst_seconds: float = 0.25, min_capacity: int = 256 * 1024):
+        self.rate = float(rate)
+        self.capacity = max(self.rate * burst_seconds, float(min_capacity))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, nbytes: int) -> float:
+        """Seconds until `nbytes` tokens are available (0 if available now)."""
+        self._refill()
+        needed = min(nbytes, self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def take(self, nbytes: int):
+        self._refill()
+        self.tokens -= nbytes
+
+    def reserve(self, nbytes: int) -> float:
+        """Take `nbytes` now (possibly going into debt) and return how long to sleep to repay it."""
+        self.take(nbytes)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class Flow:
+    """One active transfer registered with the limiter."""
+
+    def __init__(self, key: str, host: str, weight: float):
+        self.key = key
+        self.host = host
+        self.weight = max(weight, 0.01)
+        self.finish_tag = 0.0
+        self.bytes = 0
+        self.opened_at = time.monotonic()
+        self.closed_at: Optional[float] = None
+
+
+class Usage:
+    """Bytes moved by finished flows and the time during which at least one flow was open."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.downloads = 0
+        self.open = 0
+        self.since = 0.0
+        self.seconds = 0.0
+
+    def opened(self, now: float):
+        if not self.open:
+            self.since = now
+        self.open += 1
+        self.downloads += 1
+
+    def closed(self, now: float, nbytes: int):
+        self.bytes += nbytes
+        self.open -= 1
+        if not self.open:
+            self.seconds += now - self.since
+
+    def rate(self, now: float) -> int:
+        """Bytes/s over the time flows were open (the open ones up to `now`)."""
+        active = self.seconds + (now - self.since if self.open else 0.0)
+        return round(self.bytes / active) if active else 0
+
+
+class BandwidthLimiter:
+    """Global and per-host bandwidth caps with weighted fair sharing between active downloads.
+
+    The global cap is shared by self-clocked fair queueing: each read is tagged with a virtual
+    finish time (`bytes / weight` after the flow's previous tag) and tokens are granted in tag
+    order, so a fast host cannot starve small downloads from slower ones. Without any cap the
+    read loop skips `consume()` and flows are only used to report achieved rates: a closed flow
+    is folded into the usage totals and dropped, so nothing accumulates over a long run.
+    """
+
+    def __init__(self, global_rate: float = 0, host_rate: float = 0):
+        self.global_rate = global_rate
+        self.host_rate = host_rate
+        self.global_bucket = TokenBucket(global_rate) if global_rate else None
+        self.host_buckets: Dict[str, TokenBucket] = {}
+        self.enabled = bool(global_rate or host_rate)
+        # Open flows; finished ones only count in the usage totals
+        self.flows: List[Flow] = []
+        self.usage = Usage()
+        self.host_usage: Dict[str, Usage] = {}
+        self._waiters: List[Tuple[float, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def open_flow(self, key: str, host: str, weight: float = 1.0) -> Flow:
+        flow = Flow(key, host, weight)
+        self.flows.append(flow)
+        self.usage.opened(flow.opened_at)
+        self.host_usage.setdefault(host, Usage()).opened(flow.opened_at)
+        return flow
+
+    def close_flow(self, flow: Flow, nbytes: int):
+        if flow.closed_at is not None:
+            return
+        flow.bytes = nbytes
+        flow.closed_at = time.monotonic()
+        self.flows.remove(flow)
+        self.usage.closed(flow.closed_at, nbytes)
+        self.host_usage[flow.host].closed(flow.closed_at, nbytes)
+
+    async def consume(self, flow: Flow, nbytes: int):
+        """Wait as long as the caps require after `flow` has read `nbytes`."""
+        if self.host_rate:
+            bucket = self.host_buckets.get(flow.host)
+            if bucket is None:
+                bucket = self.host_buckets[flow.host] = TokenBucket(self.host_rate)
+            delay = bucket.reserve(nbytes)
+            if delay:
+                await asyncio.sleep(delay)
+
+        if self.global_bucket is None:
+            return
+        flow.finish_tag = max(self._virtual_time, flow.finish_tag) + nbytes / flow.weight
+        if not self._waiters and self.global_bucket.time_until(nbytes) == 0:
+            self.global_bucket.take(nbytes)
+            self._virtual_time = flow.finish_tag
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (flow.finish_tag, next(self._sequence), nbytes, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        """Grant queued reads in virtual-finish-tag order as the global bucket refills."""
+        while self._waiters:
+            tag, _, nbytes, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self.global_bucket.time_until(nbytes)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            heapq.heappop(self._waiters)
+            self.global_bucket.take(nbytes)
+            self._virtual_time = tag
+            future.set_result(None)
+
+    def report(self) -> Dict:
+        """Configured caps and achieved rates (bytes/s over the time each host had active flows)."""
+        now = time.monotonic()
+        return {
+            'global_limit_bytes_per_sec': int(self.global_rate),
+            'host_limit_bytes_per_sec': int(self.host_rate),
+            'achieved_bytes_per_sec': self.usage.rate(now),
+            'per_host': {
+                host: {'bytes': usage.bytes, 'downloads': usage.downloads, 'bytes_per_sec': usage.rate(now)}
+                for host, usage in self.host_usage.items()
+            },
+        }
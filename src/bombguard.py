@@ -0,0 +1,115 @@
+import zipfile
+from typing import Optional
+
+from .zipindex import LOCAL_HEADER, ZipIndex
+
+
+class ZipBombError(Exception):
+    """The archive inflates beyond the configured limits or has a malicious layout."""
+
+
+# Share of the per-entry ratio an archive as a whole may reach: real archives mix compressible
+# entries with incompressible ones, while a bomb inflates throughout
+ARCHIVE_RATIO_SHARE = 0.25
+# Output below which ratios are not enforced, per entry and per archive
+RATIO_MIN_OUTPUT = 8 * 1024 * 1024
+ARCHIVE_RATIO_MIN_OUTPUT = 256 * 1024 * 1024
+
+
+class ExtractionLimits:
+    """Decompression limits for one archive (sizes in bytes).
+
+    Ratios are only enforced once the output passes `ratio_min_output` (per entry) or
+    `archive_ratio_min_output` (per archive), so small, highly compressible files are fine.
+    The archive ratio defaults to ARCHIVE_RATIO_SHARE of the entry ratio.
+    """
+
+    def __init__(
+        self,
+        max_entry_ratio: float = 1000.0,
+        max_archive_ratio: Optional[float] = None,
+        ratio_min_output: int = RATIO_MIN_OUTPUT,
+        archive_ratio_min_output: int = ARCHIVE_RATIO_MIN_OUTPUT,
+        max_entry_size: Optional[int] = None,
+        max_total_size: Optional[int] = None
+    ):
+        self.max_entry_ratio = max_entry_ratio
+        self.max_archive_ratio = max_entry_ratio * ARCHIVE_RATIO_SHARE if max_archive_ratio is None else max_archive_ratio
+        self.ratio_min_output = ratio_min_output
+        self.archive_ratio_min_output = archive_ratio_min_output
+        self.max_entry_size = max_entry_size
+        self.max_total_size = max_total_size
+
+
+class BombGuard:
+    """Counts inflated output against compressed input while an archive is extracted.
+
+    `compressed()` is fed from the reader under the decompressor and `inflated()` from the copy
+    loop; either raises ZipBombError as soon as a limit is crossed, so a bomb entry is aborted
+    after a few MB of output instead of after filling the disk.
+    """
+
+    def __init__(self, limits: ExtractionLimits):
+        self.limits = limits
+        self.total_in = 0
+        self.total_out = 0
+        self.entry_name = ''
+        self.entry_in = 0
+        self.entry_out = 0
+
+    def start_entry(self, name: str):
+        self.entry_name = name
+        self.entry_in = 0
+        self.entry_out = 0
+
+    def compressed(self, nbytes: int):
+        self.entry_in += nbytes
+        self.total_in += nbytes
+
+    def inflated(self, nbytes: int):
+        self.entry_out += nbytes
+        self.total_out += nbytes
+        limits = self.limits
+        if limits.max_entry_size is not None and self.entry_out > limits.max_entry_size:
+            raise ZipBombError(f"Entry {self.entry_name} inflates beyond {limits.max_entry_size:,} bytes")
+        if limits.max_total_size is not None and self.total_out > limits.max_total_size:
+            raise ZipBombError(f"Archive inflates beyond {limits.max_total_size:,} bytes")
+        if self.entry_out > limits.ratio_min_output and self.entry_out > self.entry_in * limits.max_entry_ratio:
+            raise ZipBombError(
+                f"Entry {self.entry_name} inflates {self.entry_out / max(self.entry_in, 1):,.0f}:1, "
+                f"above the limit of {limits.max_entry_ratio:,.0f}:1"
+            )
+        if self.total_out > limits.archive_ratio_min_output and self.total_out > self.total_in * limits.max_archive_ratio:
+            raise ZipBombError(
+                f"Archive inflates {self.total_out / max(self.total_in, 1):,.0f}:1, "
+                f"above the limit of {limits.max_archive_ratio:,.0f}:1"
+            )
+
+    def check_index(self, index: ZipIndex):
+        """Reject archives whose central directory already gives them away, before writing anything."""
+        limits = self.limits
+        order = sorted(range(len(index)), key=index.header_offsets.__getitem__)
+        offsets, compressed_sizes, file_sizes = index.header_offsets, index.compressed_sizes, index.file_sizes
+        # Entries must not share or overlap their local header and data (the classic non-recursive bomb),
+        # nor claim compressed data reaching into the central directory
+        for current, following in zip(order, order[1:] + [None]):
+            try:
+                # The local name and extra field count too, and may be longer than the central directory's
+                start = index.data_offset(current)
+            except zipfile.BadZipFile:
+                # Reported when the entry is extracted; the central directory name is a lower bound
+                start = offsets[current] + LOCAL_HEADER.size + len(index.raw_name(current))
+            end = start + compressed_sizes[current]
+            if following is None:
+                if end > index.cd_start:
+                    raise ZipBombError(f"Entry {index.name(current)} extends into the central directory")
+            elif end > offsets[following]:
+                raise ZipBombError(
+                    f"Entries {index.name(current)} and {index.name(following)} overlap in the archive"
+                )
+        for i in order:
+            if file_sizes[i] > limits.ratio_min_output and file_sizes[i] > max(compressed_sizes[i], 1) * limits.max_entry_ratio:
+                raise ZipBombError(
+                    f"Entry {index.name(i)} declares a {file_sizes[i] / max(compressed_sizes[i], 1):,.0f}:1 "
+                    f"compression ratio, above the limit of {limits.max_entry_ratio:,.0f}:1"
+                )
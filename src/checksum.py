@@ -0,0 +1,156 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import shutil
+from typing import BinaryIO, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Digest algorithm names used in HTTP headers, mapped to hashlib names
+HEADER_ALGORITHMS = {
+    'sha-256': 'sha256',
+    'sha-512': 'sha512',
+    'sha': 'sha1',
+    'md5': 'md5',
+}
+
+HEX_DIGEST = re.compile(r'^[0-9a-f]+$')
+
+
+def normalize_sha256(value) -> Optional[str]:
+    """Lower-case hex SHA-256 from user input (optionally prefixed with `sha256:`), or None if invalid."""
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lower()
+    if value.startswith('sha256:'):
+        value = value[len('sha256:'):]
+    if len(value) != 64 or not HEX_DIGEST.match(value):
+        return None
+    return value
+
+
+def _b64_to_hex(value: str) -> Optional[str]:
+    try:
+        return base64.b64decode(value.strip(), validate=True).hex()
+    except (binascii.Error, ValueError):
+        return None
+
+
+def parse_digest_headers(headers) -> Dict[str, str]:
+    """Expected digests (hashlib name -> hex) announced by `Digest`, `Repr-Digest` or `Content-MD5`.
+
+    Only meaningful for a full (200) response: `Content-MD5` covers the body actually sent.
+    """
+    digests: Dict[str, str] = {}
+    # RFC 3230: Digest: SHA-256=<base64>, MD5=<base64>
+    for item in (headers.get('Digest') or '').split(','):
+        name, _, value = item.strip().partition('=')
+        algorithm = HEADER_ALGORITHMS.get(name.strip().lower())
+        hex_value = _b64_to_hex(value) if algorithm and value else None
+        if hex_value:
+            digests[algorithm] = hex_value
+    # RFC 9530: Repr-Digest: sha-256=:<base64>:
+    for item in (headers.get('Repr-Digest') or '').split(','):
+        name, _, value = item.strip().partition('=')
+        algorithm = HEADER_ALGORITHMS.get(name.strip().lower())
+        hex_value = _b64_to_hex(value.strip().strip(':')) if algorithm and value else None
+        if hex_value:
+            digests[algorithm] = hex_value
+    content_md5 = headers.get('Content-MD5')
+    if content_md5:
+        hex_value = _b64_to_hex(content_md5)
+        if hex_value:
+            digests['md5'] = hex_value
+    return digests
+
+
+class StreamingHasher:
+    """Hashes a body incrementally as it is written, for comparison with expected digests.
+
+    Data must arrive in order; a write at any other offset (segmented downloads) marks the
+    hasher as incomplete and the digests are then computed from the finished file instead.
+    """
+
+    def __init__(self, expected: Dict[str, str]):
+        self.expected = dict(expected)
+        self.hashers = {algorithm: hashlib.new(algorithm) for algorithm in self.expected}
+        self.position = 0
+        self.complete = True
+
+    def update(self, position: int, data: bytes):
+        if not self.complete:
+            return
+        if position != self.position:
+            self.complete = False
+            return
+        for hasher in self.hashers.values():
+            hasher.update(data)
+        self.position += len(data)
+
+    def rehash(self, source: BinaryIO, chunk_size: int = 1024 * 1024):
+        """Recompute all digests from the start of `source` (blocking; run in a worker thread)."""
+        self.hashers = {algorithm: hashlib.new(algorithm) for algorithm in self.expected}
+        source.seek(0)
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                break
+            for hasher in self.hashers.values():
+                hasher.update(data)
+        self.position = source.tell()
+        self.complete = True
+
+    def mismatches(self) -> Dict[str, str]:
+        """Algorithms whose computed digest differs from the expected one (algorithm -> actual hex)."""
+        mismatched = {}
+        for algorithm, hasher in self.hashers.items():
+            actual = hasher.hexdigest()
+            if actual != self.expected[algorithm]:
+                mismatched[algorithm] = actual
+        return mismatched
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a local file (blocking)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(chunk_size), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+class ArchiveCache:
+    """Content-addressed store of verified archives (`<sha256>.zip`), so known archives are not downloaded again."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.directory, f"{sha256}.zip")
+
+    def lookup(self, sha256: str) -> Optional[str]:
+        """Path of a cached archive with this digest, re-verified (blocking); corrupt entries are dropped."""
+        path = self.path_for(sha256)
+        if not os.path.isfile(path):
+            return None
+        if file_sha256(path) != sha256:
+            logger.warning(f"Cached archive {path} does not match its digest, removing it")
+            os.remove(path)
+            return None
+        return path
+
+    def add(self, sha256: str, path: str):
+        """Register a verified archive, hard-linking it when possible."""
+        target = self.path_for(sha256)
+        if os.path.exists(target):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            # Different filesystem or no hard link support
+            shutil.copyfile(path, f"{target}.tmp")
+            os.replace(f"{target}.tmp", target)
@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from .governor import Throttle
+
+logger = logging.getLogger(__name__)
+
+# Seconds of traffic behind each concurrency decision
+AIMD_INTERVAL = 2.0
+# Goodput has to grow by this fraction for an added slot to count as an improvement
+MIN_GAIN = 0.05
+# Multiplicative decrease after errors and after an increase that did not pay off
+ERROR_BACKOFF = 0.5
+PLATEAU_BACKOFF = 0.75
+# Decisions to wait after a decrease before probing upwards again
+COOLDOWN_INTERVALS = 2
+# Decisions kept for the run metrics
+MAX_HISTORY = 200
+
+
+class AimdLimit:
+    """Additive-increase/multiplicative-decrease controller of one concurrency limit.
+
+    Each interval, the limit grows by one slot if all slots were busy and the previous increase
+    raised goodput by at least MIN_GAIN. Errors halve it; an increase without gain (a plateau:
+    the link or the origin is saturated) takes it down by a quarter. After a decrease, the
+    controller waits a few intervals before probing again.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.minimum = max(1, minimum)
+        self.throttle = Throttle(maximum)
+        self.limit = float(max(self.minimum, min(initial, self.throttle.maximum)))
+        self.throttle.limit = int(self.limit)
+        self.goodput = 0.0
+        self.bytes = 0
+        self.errors = 0
+        self._baseline = 0.0
+        self._probing = False
+        self._cooldown = 0
+
+    def decide(self, elapsed: float) -> Optional[str]:
+        """New limit from the traffic since the last call; returns why it changed, or None."""
+        self.goodput = self.bytes / elapsed if elapsed > 0 else 0.0
+        errors, self.bytes, self.errors = self.errors, 0, 0
+        saturated = self.throttle.active >= self.throttle.limit and self.limit < self.throttle.maximum
+        probing, self._probing = self._probing, False
+        if errors:
+            return self._decrease(ERROR_BACKOFF, f"{errors} error(s)")
+        if probing and self.goodput < self._baseline * (1 + MIN_GAIN):
+            return self._decrease(PLATEAU_BACKOFF, 'plateau')
+        if self._cooldown and not probing:
+            self._cooldown -= 1
+            return None
+        if saturated and self.goodput > 0:
+            self._baseline = self.goodput
+            self._probing = True
+            self.limit += 1
+            return 'increase'
+        return None
+
+    def _decrease(self, factor: float, reason: str) -> Optional[str]:
+        self._cooldown = COOLDOWN_INTERVALS
+        limit = max(float(self.minimum), self.limit * factor)
+        if int(limit) == int(self.limit):
+            self.limit = limit
+            return None
+        self.limit = limit
+        return reason
+
+
+class AdaptiveConcurrency:
+    """Download concurrency that follows measured goodput, for the whole run and for each host.
+
+    Every transfer holds a slot of its host and one of the run. Both limits are AIMD
+    controllers fed with the bytes received and the host failures (timeouts, resets, 5xx, 429)
+    of the transfers: fast CDNs serving many small archives get more parallel connections, a
+    rate-limited origin gets fewer. With `adaptive=False` the limits stay at `initial`
+    (the run) and `host_maximum` (each host).
+    """
+
+    def __init__(
+        self,
+        initial: int = 3,
+        maximum: int = 16,
+        host_maximum: int = 6,
+        adaptive: bool = True,
+        interval: float = AIMD_INTERVAL
+    ):
+        self.adaptive = adaptive
+        self.interval = interval
+        self.initial = initial
+        self.host_maximum = host_maximum
+        self.total = AimdLimit(initial, maximum if adaptive else initial)
+        self.hosts: Dict[str, AimdLimit] = {}
+        self.peak = int(self.total.limit)
+        self.history: List[Dict] = []
+        self._last_update = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def _host(self, host: str) -> AimdLimit:
+        limit = self.hosts.get(host)
+        if limit is None:
+            initial = min(self.initial, self.host_maximum) if self.adaptive else self.host_maximum
+            limit = self.hosts[host] = AimdLimit(initial, self.host_maximum)
+        return limit
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[None]:
+        """Hold a transfer slot of `host` and of the run (the host's first, so a busy host blocks no one else)."""
+        async with self._host(host).throttle, self.total.throttle:
+            yield
+
+    def record(self, host: str, nbytes: int):
+        self.total.bytes += nbytes
+        self._host(host).bytes += nbytes
+
+    def record_error(self, host: str):
+        self.total.errors += 1
+        self._host(host).errors += 1
+
+    def start(self):
+        """Start adapting (idempotent; does nothing when not adaptive)."""
+        if self.adaptive and (self._task is None or self._task.done()):
+            self._last_update = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def update(self):
+        """Let every controller decide on the traffic since the previous update."""
+        now = time.monotonic()
+        elapsed, self._last_update = now - self._last_update, now
+        for scope, limit in [(None, self.total)] + list(self.hosts.items()):
+            reason = limit.decide(elapsed)
+            if reason is None:
+                continue
+            await limit.throttle.resize(int(limit.limit))
+            where = f" for {scope}" if scope else ''
+            logger.info(f"🎚️ Download concurrency{where} -> {limit.throttle.limit} ({reason}, "
+                        f"{limit.goodput / 1024 / 1024:.1f} MB/s)")
+            if scope is None:
+                self.peak = max(self.peak, limit.throttle.limit)
+            if len(self.history) < MAX_HISTORY:
+                self.history.append({
+                    'host': scope,
+                    'concurrency': limit.throttle.limit,
+                    'goodput_bytes_per_sec': round(limit.goodput),
+                    'reason': reason,
+                    'timestamp': datetime.now().isoformat(),
+                })
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.update()
+            except Exception as e:
+                logger.warning(f"Concurrency update error: {str(e)}")
+
+    def report(self) -> Dict:
+        return {
+            'adaptive': self.adaptive,
+            'concurrency': self.total.throttle.limit,
+            'peak_concurrency': self.peak,
+            'max_concurrency': self.total.throttle.maximum,
+            'per_host': {host: limit.throttle.limit for host, limit in self.hosts.items()},
+            'history': self.history,
+        }
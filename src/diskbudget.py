@@ -0,0 +1,110 @@
+import asyncio
+import errno
+import logging
+import os
+import shutil
+from typing import Dict, Optional, Set
+
+from .retry import InsufficientDiskError
+
+logger = logging.getLogger(__name__)
+
+# Free space left untouched by the budget (logs, key-value store, dataset)
+DISK_HEADROOM = 256 * 1024 * 1024
+
+
+class DiskBudgetExceeded(Exception):
+    """A download does not fit in the disk budget right now; it can wait for running jobs to finish."""
+
+    def __init__(self, key: str, nbytes: int):
+        super().__init__(f"{nbytes:,} bytes do not fit in the disk budget")
+        self.key = key
+        self.nbytes = nbytes
+
+
+class DiskBudget:
+    """Run-wide account of the disk space that archives and their extractions will take.
+
+    Sized once from `shutil.disk_usage` (minus `headroom`) or given explicitly. Jobs reserve
+    what they are about to write (the `Content-Length` of a download, the central directory
+    total of an extraction) under a key; what a finished job leaves on disk is deducted from
+    the capacity for good. A reservation that does not fit waits for others to be released,
+    unless it could never fit or every other holder is itself waiting (which would deadlock),
+    in which case InsufficientDiskError is raised at once.
+    """
+
+    def __init__(self, path: str, capacity: Optional[int] = None, headroom: int = DISK_HEADROOM):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.device = os.stat(path).st_dev
+        self.capacity = capacity if capacity else max(0, shutil.disk_usage(path).free - headroom)
+        self.peak_reserved = 0
+        self._reservations: Dict[str, int] = {}
+        self._waiting: Set[str] = set()
+        self._changed = asyncio.Condition()
+
+    @property
+    def reserved(self) -> int:
+        return sum(self._reservations.values())
+
+    @property
+    def available(self) -> int:
+        return self.capacity - self.reserved
+
+    def covers(self, path: str) -> bool:
+        """True if `path` (or its closest existing parent) lives on the budgeted filesystem."""
+        while not os.path.exists(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+        return os.stat(path).st_dev == self.device
+
+    def try_reserve(self, key: str, nbytes: int) -> bool:
+        """Add `nbytes` to the reservation of `key` if they fit now."""
+        if nbytes > self.available:
+            return False
+        self._reservations[key] = self._reservations.get(key, 0) + nbytes
+        self.peak_reserved = max(self.peak_reserved, self.reserved)
+        return True
+
+    async def reserve(self, key: str, nbytes: int):
+        """Add `nbytes` to the reservation of `key`, waiting until they fit."""
+        while not self.try_reserve(key, nbytes):
+            await self.wait_for_room(key, nbytes)
+
+    async def wait_for_room(self, key: str, nbytes: int):
+        """Wait until `nbytes` more fit next to the reservation of `key` (without reserving them)."""
+        async with self._changed:
+            self._waiting.add(key)
+            try:
+                while nbytes > self.available:
+                    holders = set(self._reservations) - {key}
+                    if nbytes > self.capacity - self._reservations.get(key, 0) or holders <= self._waiting:
+                        raise InsufficientDiskError(
+                            errno.ENOSPC, f"Insufficient disk space: {nbytes:,} bytes needed, {max(0, self.available):,} available")
+                    logger.info(f"⏳ Waiting for {nbytes:,} bytes of disk budget ({self.available:,} available)")
+                    await self._changed.wait()
+            finally:
+                self._waiting.discard(key)
+
+    async def release(self, key: str, nbytes: Optional[int] = None, kept: int = 0):
+        """Return `nbytes` of the reservation of `key` (all of it by default).
+
+        `kept` bytes stay on disk after the job and leave the budget for good.
+        """
+        async with self._changed:
+            left = 0 if nbytes is None else self._reservations.get(key, 0) - nbytes
+            if left > 0:
+                self._reservations[key] = left
+            else:
+                self._reservations.pop(key, None)
+            self.capacity -= kept
+            self._changed.notify_all()
+
+    def report(self) -> Dict:
+        return {
+            'capacity_bytes': self.capacity,
+            'reserved_bytes': self.reserved,
+            'peak_reserved_bytes': self.peak_reserved,
+        }
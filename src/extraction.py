@@ -0,0 +1,49 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .bombguard import BombGuard, ExtractionLimits
+
+# Most a single job may extract
+MAX_EXTRACTION_SIZE = 10 * 1024 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ExtractionOptions:
+    """Per-job extraction settings, the same for every level of a nested archive."""
+
+    # 'rename', 'skip' or 'overwrite' an entry whose target already exists
+    handle_duplicates: str = 'rename'
+    # Extensions (".csv") of the entries to extract; None or empty: all of them
+    file_types: Optional[List[str]] = None
+    # Tried in this order on encrypted ZIP entries
+    password: Optional[str] = None
+    passwords: Optional[List[str]] = None
+    max_compression_ratio: float = 1000.0
+    max_extraction_size: int = MAX_EXTRACTION_SIZE
+    # Levels of inner .zip entries unpacked (0: none)
+    max_depth: int = 0
+
+    def password_candidates(self) -> List[bytes]:
+        return [p.encode() for p in ([self.password] if self.password else []) + (self.passwords or [])]
+
+    def guard(self) -> BombGuard:
+        """Fresh bomb guard enforcing the limits of one (outermost) archive."""
+        return BombGuard(ExtractionLimits(
+            max_entry_ratio=self.max_compression_ratio,
+            max_entry_size=self.max_extraction_size,
+            max_total_size=self.max_extraction_size,
+        ))
+
+
+@dataclass
+class ExtractionRun:
+    """State of one ZIP extraction shared by the archive and the archives nested in it."""
+
+    options: ExtractionOptions
+    # Downloaded archive (the key of errors and nested records) and the directory it is extracted to
+    zip_path: str
+    extract_root: str
+    guard: BombGuard
+    pwd: Optional[bytes] = None
+    # Inner archives unpacked so far
+    nested: List[Dict] = field(default_factory=list)
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# Memory limit files of cgroup v2 and v1 ("max" or a huge number means unlimited)
+CGROUP_LIMIT_FILES = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+CGROUP_USAGE_FILES = (
+    ('/sys/fs/cgroup/memory.current', '/sys/fs/cgroup/memory.stat', 'inactive_file'),
+    ('/sys/fs/cgroup/memory/memory.usage_in_bytes', '/sys/fs/cgroup/memory/memory.stat', 'total_inactive_file'),
+)
+CGROUP_UNLIMITED = 1 << 60
+# Platform samples older than this are ignored in favour of local ones
+PLATFORM_SAMPLE_TTL = 10.0
+# Kept throttling decisions (the summary lists them)
+MAX_DECISIONS = 100
+
+NORMAL, HIGH, CRITICAL = 0, 1, 2
+LEVEL_NAMES = ('normal', 'high', 'critical')
+# Share of a buffer or in-memory allowance still granted at each level
+ALLOWANCE_SCALE = (1.0, 0.25, 0.0)
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def _read_stat(path: str, key: str) -> int:
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, value = line.partition(' ')
+                if name == key:
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def detect_memory_limit() -> int:
+    """Memory the run may use: ACTOR_MEMORY_MBYTES on Apify, else the cgroup limit, else physical RAM."""
+    mbytes = os.environ.get('ACTOR_MEMORY_MBYTES', '')
+    if mbytes.isdigit() and int(mbytes):
+        return int(mbytes) * MB
+    for path in CGROUP_LIMIT_FILES:
+        limit = _read_int(path)
+        if limit and limit < CGROUP_UNLIMITED:
+            return limit
+    return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+
+def read_memory_usage() -> int:
+    """Memory in use: the cgroup's (without reclaimable page cache) or this process's RSS, whichever is higher.
+
+    Written archives and extracted files fill the page cache, which the kernel drops before it
+    OOM-kills anything, so inactive file pages do not count.
+    """
+    usage = 0
+    for usage_file, stat_file, inactive_key in CGROUP_USAGE_FILES:
+        current = _read_int(usage_file)
+        if current is not None:
+            usage = max(0, current - _read_stat(stat_file, inactive_key))
+            break
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        rss = 0
+    return max(usage, rss)
+
+
+class Throttle:
+    """Concurrency limit that can be lowered and raised while tasks hold slots.
+
+    Lowering it never interrupts running tasks; new ones wait until enough have finished. Only as
+    many waiters are woken as there are free slots, so a released slot does not stir every task
+    queued behind the limit.
+    """
+
+    def __init__(self, limit: int):
+        self.maximum = max(1, limit)
+        self.limit = self.maximum
+        self.active = 0
+        self._changed = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._changed:
+            try:
+                await self._changed.wait_for(lambda: self.active < self.limit)
+            except asyncio.CancelledError:
+                # The wakeup may have been meant for us: hand it on
+                self._wake()
+                raise
+            self.active += 1
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._changed:
+            self.active -= 1
+            self._wake()
+
+    async def resize(self, limit: int):
+        async with self._changed:
+            self.limit = max(1, min(self.maximum, limit))
+            self._wake()
+
+    def _wake(self):
+        # Called with the condition's lock held
+        free = self.limit - self.active
+        if free > 0:
+            self._changed.notify(free)
+
+
+class MemoryGovernor:
+    """Throttles the run as memory use approaches the Actor's limit, so it slows down instead of being OOM-killed.
+
+    Memory is sampled every `interval` seconds from the cgroup and the process RSS, and from the
+    platform's `systemInfo` events when they arrive. Above `high` of the limit, download and
+    extraction concurrency are halved, new buffers and in-memory modes get a quarter of their
+    usual size and pooled buffers are dropped; above `critical`, one job runs at a time and
+    everything spills to disk. A level is left only once usage is `recovery_margin` below its
+    watermark, and concurrency then ramps back up one slot per sample.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 3,
+        extraction_concurrency: Optional[int] = None,
+        limit: Optional[int] = None,
+        interval: float = 1.0,
+        high: float = 0.75,
+        critical: float = 0.9,
+        recovery_margin: float = 0.1
+    ):
+        self.limit = limit or detect_memory_limit()
+        self.interval = interval
+        self.high = high
+        self.critical = critical
+        self.recovery_margin = recovery_margin
+        self.downloads = Throttle(concurrency)
+        self.extractions = Throttle(extraction_concurrency or concurrency)
+        self.level = NORMAL
+        self.usage = 0
+        self.peak_usage = 0
+        self.decisions: List[Dict] = []
+        # Called with the new level whenever it changes (e.g. to drop pooled buffers)
+        self.listeners: List[Callable[[int], None]] = []
+        self._platform_usage = 0
+        self._platform_time = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def under_pressure(self) -> bool:
+        return self.level > NORMAL
+
+    def allowance(self, nbytes: int) -> int:
+        """Part of `nbytes` a new buffer or in-memory mode may use at the current level."""
+        return int(nbytes * ALLOWANCE_SCALE[self.level])
+
+    def start(self):
+        """Start sampling (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def on_system_info(self, event_data):
+        """Listener for the SDK's `Event.SYSTEM_INFO`, which reports the memory the platform measures."""
+        memory_info = getattr(event_data, 'memory_info', None)
+        if memory_info is not None:
+            self._platform_usage = int(memory_info.current_size.bytes)
+            self._platform_time = time.monotonic()
+
+    def sample(self) -> int:
+        usage = read_memory_usage()
+        if time.monotonic() - self._platform_time <= PLATFORM_SAMPLE_TTL:
+            usage = max(usage, self._platform_usage)
+        self.usage = usage
+        self.peak_usage = max(self.peak_usage, usage)
+        return usage
+
+    def _level_for(self, ratio: float) -> int:
+        level = CRITICAL if ratio >= self.critical else HIGH if ratio >= self.high else NORMAL
+        if level < self.level:
+            # Step down one level at a time, and only well below the watermark that raised it
+            watermark = self.critical if self.level == CRITICAL else self.high
+            level = self.level if ratio >= watermark - self.recovery_margin else self.level - 1
+        return level
+
+    def _target(self, throttle: Throttle) -> int:
+        if self.level == CRITICAL:
+            return 1
+        if self.level == HIGH:
+            return max(1, throttle.maximum // 2)
+        return throttle.maximum
+
+    async def update(self):
+        """Sample memory once and adjust the level and concurrency limits."""
+        ratio = self.sample() / self.limit
+        level = self._level_for(ratio)
+        changed = level != self.level
+        if changed:
+            log = logger.warning if level > self.level else logger.info
+            log(f"🧠 Memory pressure {LEVEL_NAMES[self.level]} -> {LEVEL_NAMES[level]} "
+                f"({self.usage / MB:,.0f} of {self.limit / MB:,.0f} MB)")
+            self.level = level
+            for listener in self.listeners:
+                listener(level)
+        for throttle in (self.downloads, self.extractions):
+            target = self._target(throttle)
+            # Cut at once, ramp back up one slot per sample
+            limit = target if target < throttle.limit else min(target, throttle.limit + 1)
+            if limit != throttle.limit:
+                changed = True
+                await throttle.resize(limit)
+        if changed:
+            self._record_decision()
+
+    def _record_decision(self):
+        if len(self.decisions) < MAX_DECISIONS:
+            self.decisions.append({
+                'level': LEVEL_NAMES[self.level],
+                'memory_used_bytes': self.usage,
+                'download_concurrency': self.downloads.limit,
+                'extraction_concurrency': self.extractions.limit,
+                'timestamp': datetime.now().isoformat(),
+            })
+
+    async def _run(self):
+        while True:
+            try:
+                await self.update()
+            except Exception as e:
+                logger.warning(f"Memory sampling error: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def report(self) -> Dict:
+        return {
+            'memory_limit_bytes': self.limit,
+            'peak_memory_used_bytes': self.peak_usage,
+            'level': LEVEL_NAMES[self.level],
+            'decisions': self.decisions,
+        }
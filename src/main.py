@@ -1,17 +1,68 @@
 
 import asyncio
+import contextlib
+import gzip
+import io
 import json
 import logging
+import lzma
 import os
-import shutil
+import tarfile
+import tempfile
+import time
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import BinaryIO, Callable, Optional, Dict, List, Set, Tuple, Union
 from urllib.parse import urlparse
 from datetime import datetime
 
 import aiohttp
-from apify import Actor
+from apify import Actor, Event
+
+from .archive_reader import MappedArchive
+from .bandwidth import BandwidthLimiter
+from .bombguard import BombGuard, ZipBombError
+from .checksum import ArchiveCache, StreamingHasher, normalize_sha256, parse_digest_headers
+from .concurrency import AdaptiveConcurrency
+from .diskbudget import DiskBudget, DiskBudgetExceeded
+from .extraction import ExtractionOptions, ExtractionRun
+from .governor import MemoryGovernor
+from .metrics import JobMetrics, RunMetrics, current_job, current_job_id, trace_config, track_job
+from .mirrors import DownloadCandidate, HedgePolicy
+from .proxies import PROXY_EXCEPTIONS, ProxyEndpoint, ProxyPool, create_proxy_pool
+from .retry import (
+    HOST_FAILURES,
+    CircuitBreaker,
+    DownloadError,
+    ErrorType,
+    InsufficientDiskError,
+    RetryPolicy,
+    classify_exception,
+    classify_status,
+    is_disk_full,
+    parse_retry_after,
+)
+from .sniff import (
+    SNIFF_LIMIT,
+    STREAM_FORMATS,
+    TAR_BLOCK_SIZE,
+    describe_non_archive,
+    detect_format,
+    has_zip_directory,
+    is_non_archive_content_type,
+    is_tar_header,
+    looks_like_document,
+    read_head,
+)
+from .tarstream import ArchiveStream, ArchiveStreamError, StreamAborted, open_decompressed
+from .timeouts import TransferTimeouts, TransferWatchdog
+from .tracing import TRACE_FORMATS, Tracer
+from .tuning import TuningProfile, derive_profile, probe_system, profile_report
+from .writer import POOL_MAX_FREE, PREALLOCATE_MIN_SIZE, BufferPool, ChunkSizer, MemorySink, MemoryStream, WriteBehindWriter, WriteStream, preallocate
+from .workspace import WorkspaceManager
+from .zipindex import TappedReader, ZipIndex
 
 # Configure logging with detailed format
 logging.basicConfig(
@@ -20,21 +71,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Compressed inner archives are inflated into memory up to this size before spilling to disk
+NESTED_SPOOL_SIZE = 64 * 1024 * 1024
+# Input fields masked in the input log
+SECRET_INPUTS = ('password', 'passwords')
+# Suffixes dropped from a single compressed file (data.csv.gz -> data.csv)
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz')
+# Downloads that do not fit in the disk budget are kept in memory up to this size instead of waiting
+MEMORY_FALLBACK_LIMIT = 256 * 1024 * 1024
+
 
 class ZipDownloadExtractor:
     """High-performance ZIP downloader and extractor with advanced features."""
     
-    def __init__(self, actor: Actor):
+    def __init__(
+        self,
+        actor: Actor,
+        retry_policy: Optional[RetryPolicy] = None,
+        timeouts: Optional[TransferTimeouts] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
+        bandwidth: Optional[BandwidthLimiter] = None,
+        proxy_pool: Optional[ProxyPool] = None,
+        tmpfs_staging: bool = False,
+        disk_budget: Optional[DiskBudget] = None,
+        memory_governor: Optional[MemoryGovernor] = None,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        profile: Optional[TuningProfile] = None,
+        tracer: Optional[Tracer] = None
+    ):
         self.actor = actor
+        # Spans of jobs, extraction workers and dataset pushes (records nothing unless enabled)
+        self.tracer = tracer or Tracer()
+        # Worker counts and buffer sizes, tuned to the container by main()
+        self.profile = profile or TuningProfile()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.timeouts = timeouts or TransferTimeouts()
+        self.hedge_policy = hedge_policy or HedgePolicy()
+        self.bandwidth = bandwidth or BandwidthLimiter()
+        self.proxy_pool = proxy_pool
+        # Transfers at a time, overall and per host, adapted to the measured goodput
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        # Write buffers are reused across downloads instead of allocated per chunk
+        self.buffer_pool = BufferPool(self.profile.write_buffer_size)
+        # Lowers concurrency and memory use as the run nears its memory limit
+        self.memory = memory_governor or MemoryGovernor()
+        self.memory.listeners.append(self._on_memory_pressure)
+        self._on_memory_pressure(self.memory.level)
+        # Archives downloaded into memory, by the output path they would otherwise have used
+        self.memory_archives: Dict[str, MemorySink] = {}
+        # Output paths of archives that were extracted while downloading (nothing left to extract)
+        self.streamed_archives = set()
+        # Verified archives by SHA-256, consulted before downloading an archive with a known digest
+        self.archive_cache = ArchiveCache(os.path.join(os.getcwd(), 'apify_storage', 'cache'))
+        # Position of the password candidate that opened each archive (never the password itself)
+        self.password_indexes: Dict[str, int] = {}
+        # One private directory per job, removed in the background when the job is done
+        self.workspaces = WorkspaceManager(os.path.join(os.getcwd(), 'apify_storage', 'temp'))
+        # Stage archives that are not kept on tmpfs (RAM) when it has room
+        self.tmpfs_staging = tmpfs_staging
+        # Disk space shared by all jobs; downloads and extractions reserve theirs before writing
+        self.disk_budget = disk_budget or DiskBudget(os.path.join(os.getcwd(), 'apify_storage'))
+        # Budget releases scheduled by the cleanup thread once a job's workspace is deleted
+        self._budget_releases: Set[asyncio.Task] = set()
+        self.circuit_breakers: Dict[str, CircuitBreaker] = {}
+        # Category of the last error of each job, by job id and URL or archive path
+        self.error_types: Dict[Tuple[int, str], str] = {}
+        # Nested archives unpacked by extract_zip, by archive path
+        self.nested_archives: Dict[str, List[Dict]] = {}
+        # Phase timings and resource usage of finished jobs, for the summary
+        self.metrics = RunMetrics()
         self.stats = {
             'total_downloaded': 0,
             'total_extracted': 0,
             'files_processed': 0,
             'errors': [],
-            'start_time': None,
-            'end_time': None,
             'skipped_files': 0,
             'corrupted_files': 0,
+            'error_types': {},
+            'hedged_downloads': 0,
         }
         self.session: Optional[aiohttp.ClientSession] = None
     
@@ -42,210 +156,1234 @@ class ZipDownloadExtractor:
         self,
         url: str,
         output_path: str,
-        timeout: int = 300,
-        chunk_size: int = 8192,
-        retries: int = 3
+        timeout: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        retries: Optional[int] = None,
+        mirrors: Optional[List[str]] = None,
+        weight: float = 1.0,
+        memory_limit: int = 0,
+        expected_digests: Optional[Dict[str, str]] = None,
+        stream_extract: Optional[Callable[[str, BinaryIO, List[str]], bool]] = None
     ) -> bool:
-        """Download file with retry logic and progress tracking."""
-        for attempt in range(retries):
-            try:
-                logger.info(f"Starting download: {url} (Attempt {attempt + 1}/{retries})")
+        """Download file with stall detection, resumable retries, mirror hedging and circuit breaking.
+        
+        `timeout` is the time allowed until the server starts responding; once data flows, the
+        transfer only fails if it stalls or drops below the throughput floor. When `mirrors` are
+        given, a hedge request is raced against a slow primary and the loser is cancelled.
+        `weight` is this download's share of the global bandwidth cap relative to other downloads.
+        Bodies of at most `memory_limit` bytes are kept in memory instead of being written to
+        `output_path`; they are then available from `memory_archives[output_path]`.
+        The body is hashed while it streams and checked against `expected_digests` (hashlib name
+        -> hex) and any `Digest`/`Content-MD5` response header before the download counts as done.
+        With `stream_extract(format, fileobj, created)` and no mirrors, a tar-family body is handed
+        to that blocking extractor in a worker thread as it arrives instead of being stored; the
+        download is then listed in `streamed_archives`.
+        """
+        max_retries = self.retry_policy.max_retries if retries is None else retries
+        chunk_size = chunk_size or self.profile.read_chunk_size
+        urls = [url] + [m for m in dict.fromkeys(mirrors or []) if m != url]
+        candidates = [
+            DownloadCandidate(u, output_path if idx == 0 else f"{output_path}.mirror{idx}")
+            for idx, u in enumerate(urls)
+        ]
+        for candidate in candidates:
+            candidate.weight = weight
+            candidate.memory_limit = memory_limit
+            candidate.expected_digests = expected_digests or {}
+            candidate.budget_key = output_path
+            # Racing mirrors cannot share one sequential extraction
+            candidate.stream_extract = stream_extract if len(candidates) == 1 else None
+        attempt = 0
+        
+        try:
+            while True:
+                available = [c for c in candidates if self._breaker(c.host).allow_request()]
+                if not available:
+                    hosts = ', '.join(sorted({c.host for c in candidates}))
+                    self._record_error(url, ErrorType.CIRCUIT_OPEN, f"Circuit open for host {hosts}, not downloading {url}")
+                    return False
                 
-                timeout_obj = aiohttp.ClientTimeout(total=timeout)
-                connector = aiohttp.TCPConnector(ssl=True, limit=10)  # SECURITY FIX: SSL enabled
-                async with aiohttp.ClientSession(timeout=timeout_obj, connector=connector) as session:
-                    async with session.get(url, allow_redirects=True) as response:
-                        if response.status != 200:
-                            error_msg = f"HTTP {response.status} for {url}"
-                            logger.error(error_msg)
-                            if attempt == retries - 1:
-                                self.stats['errors'].append(error_msg)
-                                return False
-                            await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                            continue
-                        
-                        content_length = response.content_length or 0
-                        downloaded = 0
-                        
-                        # Ensure directory exists
-                        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                        
-                        with open(output_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(chunk_size):
-                                if chunk:
-                                    f.write(chunk)
-                                    downloaded += len(chunk)
-                                    
-                                    # Push real-time progress
-                                    if content_length:
-                                        progress = min(100, int((downloaded / content_length) * 100))
-                                        if progress % 10 == 0:  # Log every 10%
-                                            await self.actor.push_data({
-                                                'type': 'progress',
-                                                'status': 'downloading',
-                                                'url': url,
-                                                'progress_percent': progress,
-                                                'bytes_downloaded': downloaded,
-                                                'total_bytes': content_length,
-                                                'timestamp': datetime.now().isoformat(),
-                                            })
-                        
+                try:
+                    logger.info(f"Starting download: {url} (Attempt {attempt + 1}/{max_retries + 1})")
+                    if len(available) == 1:
+                        winner = available[0]
+                        await self._download_attempt(winner, timeout, chunk_size)
+                    else:
+                        winner = await self._download_hedged(available, timeout, chunk_size)
+                    
+                    if winner.url != url:
+                        logger.info(f"Mirror {winner.url} won the race for {url}")
+                    if winner.hasher is not None:
+                        with current_job().phase('validation'):
+                            await self._verify_checksums(winner)
+                    if winner.archive_stream is not None:
+                        self.streamed_archives.add(output_path)
+                        file_size = winner.archive_stream.position
+                    elif winner.sink is not None:
+                        self.memory_archives[output_path] = winner.sink
+                        file_size = winner.sink.size
+                    else:
+                        if winner.path != output_path:
+                            os.replace(winner.path, output_path)
                         file_size = os.path.getsize(output_path)
-                        self.stats['total_downloaded'] += file_size
-                        logger.info(f"✓ Downloaded {file_size:,} bytes from {url}")
-                        return True
-            
-            except asyncio.TimeoutError:
-                error_msg = f"Timeout downloading {url} (Attempt {attempt + 1}/{retries})"
-                logger.warning(error_msg)
-                if attempt == retries - 1:
-                    self.stats['errors'].append(error_msg)
+                    self.stats['total_downloaded'] += file_size
+                    current_job().bytes_downloaded += file_size
+                    where = ' (in memory)' if winner.sink is not None and winner.sink.in_memory else ''
+                    where = ' (extracted while downloading)' if winner.archive_stream is not None else where
+                    logger.info(f"✓ Downloaded {file_size:,} bytes from {winner.url}{where}")
+                    return True
+                
+                except DownloadError as e:
+                    if not self.retry_policy.should_retry(e.error_type, attempt, max_retries):
+                        self._record_error(url, e.error_type, str(e))
+                        if e.error_type in (ErrorType.INSUFFICIENT_DISK, ErrorType.CHECKSUM_MISMATCH) and os.path.exists(output_path):
+                            # Give the space back; neither a partial nor a corrupt file is of any use
+                            os.remove(output_path)
+                        return False
+                    delay = self.retry_policy.backoff(attempt, e.retry_after)
+                    logger.warning(f"{e} [{e.error_type}], retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                
+                except DiskBudgetExceeded as e:
+                    # Not a failed attempt: the body waits for running jobs to give disk space back
+                    try:
+                        await self.disk_budget.wait_for_room(e.key, e.nbytes)
+                    except InsufficientDiskError as disk_error:
+                        self._record_error(url, ErrorType.INSUFFICIENT_DISK, f"{disk_error.strerror} for {url}")
+                        return False
+                
+                except ArchiveStreamError:
+                    # The extractor has recorded the error; the transfer itself was fine
                     return False
-                await asyncio.sleep(2 ** attempt)
+        finally:
+            # Partial files of mirrors that lost or failed
+            for candidate in candidates[1:]:
+                if os.path.exists(candidate.path):
+                    os.remove(candidate.path)
+                    await self.disk_budget.release(output_path, candidate.reserved)
+            for candidate in candidates:
+                if candidate.sink is not None and self.memory_archives.get(output_path) is not candidate.sink:
+                    candidate.sink.close()
+                if output_path not in self.streamed_archives:
+                    await self._discard_archive_stream(candidate)
+    
+    async def _download_hedged(
+        self,
+        candidates: List[DownloadCandidate],
+        timeout: Optional[int],
+        chunk_size: int
+    ) -> DownloadCandidate:
+        """Race the best candidate against hedge requests on mirrors; return the winner."""
+        queue = self.hedge_policy.rank(candidates)
+        running: Dict[asyncio.Task, DownloadCandidate] = {}
+        last_error: Optional[DownloadError] = None
+        
+        def launch():
+            candidate = queue.pop(0)
+            running[asyncio.create_task(self._download_attempt(candidate, timeout, chunk_size))] = candidate
+        
+        launch()
+        try:
+            while running:
+                done, _ = await asyncio.wait(
+                    running, timeout=0.5 if queue else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    candidate = running.pop(task)
+                    if task.exception() is None:
+                        return candidate
+                    last_error = task.exception()
+                    logger.warning(f"Mirror {candidate.url} failed: {last_error}")
+                
+                if queue and (not running or self.hedge_policy.should_hedge(list(running.values()), time.monotonic())):
+                    if running:
+                        self.stats['hedged_downloads'] += 1
+                        logger.info(f"Launching hedge request on {queue[0].url}")
+                    launch()
+            raise last_error
+        finally:
+            # Cancel the loser(s)
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            # Cancelled or never launched: a half-open host is free to be probed by another job
+            for candidate in list(running.values()) + queue:
+                self._breaker(candidate.host).release_probe()
+    
+    async def _download_attempt(self, candidate: DownloadCandidate, timeout: Optional[int], chunk_size: int):
+        """Single download attempt of one candidate URL; raises DownloadError on failure."""
+        url = candidate.url
+        breaker = self._breaker(candidate.host)
+        # Waiting for a slot is not part of the attempt (nor of its timeouts)
+        async with self.concurrency.slot(candidate.host):
+            candidate.start_attempt()
+            flow = self.bandwidth.open_flow(url, candidate.host, candidate.weight)
+            
+            try:
+                async with TransferWatchdog(self.timeouts, url, first_byte=timeout) as watchdog:
+                    if candidate.segments:
+                        # Interrupted segmented download: fetch only the missing ranges
+                        logger.info(f"Resuming segmented download: {url}")
+                        await self._download_segments(candidate, watchdog, flow, chunk_size)
+                    else:
+                        await self._download_stream(candidate, watchdog, flow, chunk_size)
+                if candidate.archive_stream is not None:
+                    # The whole body has arrived; the wait for the extraction to end is not timed as a transfer
+                    await candidate.archive_stream.finish()
+                
+                breaker.record_success()
+                self.hedge_policy.record_throughput(candidate.host, candidate.throughput(time.monotonic()))
+            
+            except asyncio.CancelledError:
+                # Lost a hedge race: says nothing about the host
+                breaker.release_probe()
+                raise
+            
+            except (ArchiveStreamError, DiskBudgetExceeded):
+                breaker.record_success()
+                raise
             
             except Exception as e:
-                error_msg = f"Error downloading {url}: {str(e)}"
-                logger.error(error_msg)
-                if attempt == retries - 1:
-                    self.stats['errors'].append(error_msg)
-                    return False
-                await asyncio.sleep(2 ** attempt)
+                if isinstance(e, DownloadError):
+                    error = e
+                elif isinstance(e, PROXY_EXCEPTIONS):
+                    error = DownloadError(ErrorType.PROXY_ERROR, f"Proxy error downloading {url}: {str(e)}")
+                elif isinstance(e, asyncio.TimeoutError):
+                    error = DownloadError(ErrorType.TIMEOUT, f"Timeout downloading {url}")
+                elif isinstance(e, InsufficientDiskError):
+                    error = DownloadError(ErrorType.INSUFFICIENT_DISK, e.strerror)
+                elif is_disk_full(e):
+                    error = DownloadError(ErrorType.INSUFFICIENT_DISK, f"Insufficient disk space downloading {url}: {e.strerror}")
+                else:
+                    error = DownloadError(classify_exception(e), f"Error downloading {url}: {str(e)}")
+                
+                # Only failures that reflect host health count towards opening the circuit
+                if error.error_type in HOST_FAILURES:
+                    breaker.record_failure()
+                    self.concurrency.record_error(candidate.host)
+                else:
+                    breaker.record_success()
+                raise error
+            
+            finally:
+                self.bandwidth.close_flow(flow, candidate.bytes_received)
+    
+    async def _download_stream(self, candidate: DownloadCandidate, watchdog: TransferWatchdog, flow, chunk_size: int):
+        """Fetch the whole body (or its remainder) in one request, switching to segments when possible."""
+        url = candidate.url
+        output_path = candidate.path
+        resume_from = 0
+        if candidate.resumable and candidate.archive_stream is not None:
+            # The extraction continues where the interrupted body stopped
+            resume_from = candidate.archive_stream.position
+        elif candidate.resumable and candidate.sink is not None:
+            resume_from = min(candidate.resume_offset, candidate.sink.size)
+        elif candidate.resumable and os.path.exists(output_path):
+            resume_from = min(candidate.resume_offset, os.path.getsize(output_path))
+        
+        headers = {}
+        if resume_from:
+            headers['Range'] = f"bytes={resume_from}-"
+            if candidate.validator:
+                headers['If-Range'] = candidate.validator
+            logger.info(f"Resuming download: {url} from byte {resume_from:,}")
+        
+        endpoint = self.proxy_pool.select(candidate.host) if self.proxy_pool else None
+        response = await self._open_response(candidate, endpoint, watchdog, headers)
+        try:
+            offset = 0
+            if response.status == 206:
+                range_start, range_total = self._parse_content_range(response.headers.get('Content-Range'))
+                if not resume_from or range_start != resume_from or (
+                        not candidate.validator and range_total != candidate.expected_total):
+                    candidate.resumable = False
+                    raise DownloadError(ErrorType.TRANSIENT_NETWORK, f"Unusable partial response for {url}")
+                offset = resume_from
+            
+            # Reject login/error pages before anything is written to disk
+            head = b''
+            archive_format = None
+            if offset:
+                if is_non_archive_content_type(response.content_type):
+                    raise DownloadError(
+                        ErrorType.NOT_A_ZIP,
+                        f"Resumed response from {url} is {response.content_type}, not an archive",
+                    )
+            else:
+                # A tar header is only recognizable from its whole first block
+                head = await read_head(response.content, TAR_BLOCK_SIZE)
+                archive_format = detect_format(head)
+                if archive_format is None and (
+                        is_non_archive_content_type(response.content_type) or looks_like_document(head)):
+                    head += await response.content.read(SNIFF_LIMIT - len(head))
+                    raise DownloadError(
+                        ErrorType.NOT_A_ZIP,
+                        f"Response from {url} is not a ZIP or tar archive "
+                        f"({describe_non_archive(head, response.content_type)})",
+                    )
+                if archive_format is None:
+                    # Possibly a self-extracting or prefixed ZIP, recognizable only from its end
+                    logger.info(f"No archive signature at the start of {url}, looking for a ZIP directory once downloaded")
+            
+            content_length = (offset + response.content_length) if response.content_length else 0
+            if not offset:
+                # Fresh transfer: remember what is needed to resume it safely
+                candidate.validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                candidate.resumable = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                candidate.expected_total = content_length
+                # Digests given by the user take precedence over those announced by the server
+                expected = {**parse_digest_headers(response.headers), **candidate.expected_digests}
+                candidate.hasher = StreamingHasher(expected) if expected else None
+            candidate.downloaded = offset
+            
+            # Ensure directory exists
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            
+            if not offset:
+                # A restarted body replaces whatever a previous attempt extracted
+                await self._discard_archive_stream(candidate)
+            if candidate.stream_extract is not None and (
+                    candidate.archive_stream is not None or archive_format in STREAM_FORMATS):
+                await self._stream_to_archive(candidate, response, endpoint, head, archive_format, watchdog, flow, chunk_size)
+                return
+            
+            if not offset:
+                if candidate.sink is not None:
+                    candidate.sink.close()
+                    candidate.sink = None
+                # Small archives skip the disk round trip; a body of unknown length goes to disk
+                memory_limit = self.memory.allowance(candidate.memory_limit)
+                if memory_limit and content_length and content_length <= memory_limit:
+                    candidate.sink = MemorySink(memory_limit, os.path.dirname(output_path), self.buffer_pool)
+                elif content_length and self.disk_budget.covers(output_path):
+                    await self._reserve_download(candidate, content_length)
+            if candidate.sink is not None:
+                stream = candidate.sink.open_stream(offset, candidate.hasher)
+                segment = [offset + len(head), None]
+                try:
+                    await stream.write(head)
+                    candidate.downloaded += len(head)
+                    watchdog.progress(len(head))
+                    await self._stream_range(candidate, response, endpoint, stream, segment, watchdog, flow, chunk_size)
+                finally:
+                    await stream.close()
+                    candidate.resume_offset = segment[0]
+                candidate.sink.truncate(segment[0])
+                return
+            
+            segments = self._plan_segments(candidate) if not offset else None
+            if segments:
+                # Segment 0 continues on this response; the others go through other proxies
+                candidate.segments = segments
+                fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    # Segments are written at their offsets, so the file needs its full size up front
+                    if not preallocate(fd, content_length, url):
+                        os.ftruncate(fd, content_length)
+                finally:
+                    os.close(fd)
+                await self._download_segments(candidate, watchdog, flow, chunk_size, first=(response, endpoint, head))
+                return
+            
+            flags = os.O_WRONLY | os.O_CREAT | (0 if offset else os.O_TRUNC)
+            fd = os.open(output_path, flags, 0o644)
+            segment = [offset + len(head), None]
+            try:
+                # Claim the space now so a full disk fails the job before the transfer starts
+                preallocated = content_length >= PREALLOCATE_MIN_SIZE and preallocate(fd, content_length, url)
+                writer = WriteBehindWriter(fd, self.buffer_pool, hasher=candidate.hasher)
+                stream = writer.open_stream(offset)
+                try:
+                    await stream.write(head)
+                    candidate.downloaded += len(head)
+                    watchdog.progress(len(head))
+                    await self._stream_range(candidate, response, endpoint, stream, segment, watchdog, flow, chunk_size)
+                finally:
+                    stream.flush()
+                    await self._close_writer(candidate, writer)
+                    candidate.resume_offset = segment[0]
+                if preallocated and segment[0] != content_length:
+                    # The body was shorter than announced: drop the unused tail
+                    os.ftruncate(fd, segment[0])
+            finally:
+                os.close(fd)
+        finally:
+            response.release()
+    
+    async def _stream_to_archive(
+        self,
+        candidate: DownloadCandidate,
+        response: aiohttp.ClientResponse,
+        endpoint: Optional[ProxyEndpoint],
+        head: bytes,
+        archive_format: Optional[str],
+        watchdog: TransferWatchdog,
+        flow,
+        chunk_size: int
+    ):
+        """Hand the body to the candidate's archive extractor (started here for a fresh body) as it arrives.
         
-        return False
+        The caller waits for the extractor to finish, outside of the transfer's timeouts.
+        """
+        if candidate.archive_stream is None:
+            extract = candidate.stream_extract
+            candidate.archive_stream = ArchiveStream(
+                lambda fileobj, created: extract(archive_format, fileobj, created), candidate.hasher)
+            logger.info(f"Extracting {archive_format} archive from {candidate.url} while it downloads")
+        stream = candidate.archive_stream
+        segment = [stream.position + len(head), None]
+        await stream.write(head)
+        candidate.downloaded += len(head)
+        watchdog.progress(len(head))
+        await self._stream_range(candidate, response, endpoint, stream, segment, watchdog, flow, chunk_size)
+    
+    @staticmethod
+    async def _discard_archive_stream(candidate: DownloadCandidate):
+        """Stop an unfinished streaming extraction and remove the files it wrote."""
+        stream = candidate.archive_stream
+        if stream is None:
+            return
+        candidate.archive_stream = None
+        await stream.abort()
+        for path in stream.created:
+            if os.path.isfile(path):
+                os.remove(path)
+    
+    async def _reserve_download(self, candidate: DownloadCandidate, content_length: int):
+        """Reserve disk budget for a fresh body; keep it in memory or raise DiskBudgetExceeded if it does not fit."""
+        # A restarted body replaces what the previous attempt reserved
+        await self.disk_budget.release(candidate.budget_key, candidate.reserved)
+        candidate.reserved = 0
+        if self.disk_budget.try_reserve(candidate.budget_key, content_length):
+            candidate.reserved = content_length
+        elif content_length <= self.memory.allowance(MEMORY_FALLBACK_LIMIT):
+            logger.warning(f"⚠️ {candidate.url} does not fit in the disk budget, downloading it into memory")
+            candidate.sink = MemorySink(content_length, os.path.dirname(candidate.path), self.buffer_pool)
+        else:
+            raise DiskBudgetExceeded(candidate.budget_key, content_length)
+    
+    def _plan_segments(self, candidate: DownloadCandidate) -> Optional[List[List[int]]]:
+        """Split a large, range-capable download across healthy proxies ([next_pos, end) per segment)."""
+        pool = self.proxy_pool
+        total = candidate.expected_total
+        if not pool or not candidate.resumable or not candidate.segmentable or not total:
+            return None
+        count = min(pool.max_segments, len(pool.available(candidate.host)), total // pool.min_segment_size)
+        if count < 2:
+            return None
+        size = -(-total // count)
+        return [[start, min(start + size, total)] for start in range(0, total, size)]
+    
+    async def _download_segments(
+        self,
+        candidate: DownloadCandidate,
+        watchdog: TransferWatchdog,
+        flow,
+        chunk_size: int,
+        first=None
+    ):
+        """Fetch the remaining byte ranges of `candidate.segments` in parallel through distinct proxies."""
+        url = candidate.url
+        in_use = []
+        if first is not None:
+            in_use.append(first[1])
+        
+        async def fetch(segment: List[int], stream: WriteStream, response=None, endpoint=None):
+            if response is None:
+                endpoint = self.proxy_pool.select(candidate.host, exclude=tuple(in_use))
+                in_use.append(endpoint)
+                headers = {'Range': f"bytes={segment[0]}-{segment[1] - 1}"}
+                if candidate.validator:
+                    headers['If-Range'] = candidate.validator
+                response = await self._open_response(candidate, endpoint, watchdog, headers)
+                range_start, _ = self._parse_content_range(response.headers.get('Content-Range'))
+                if response.status != 206 or range_start != segment[0]:
+                    # Changed content or no range support: start over in a single stream
+                    response.release()
+                    candidate.segments = None
+                    candidate.resumable = False
+                    candidate.segmentable = False
+                    raise DownloadError(ErrorType.TRANSIENT_NETWORK, f"Server did not honor range request for {url}")
+            try:
+                await self._stream_range(candidate, response, endpoint, stream, segment, watchdog, flow, chunk_size)
+            finally:
+                stream.flush()
+                response.release()
+        
+        if candidate.hasher is not None:
+            # Segments arrive out of order: the digests are computed from the finished file
+            candidate.hasher.complete = False
+        fd = os.open(candidate.path, os.O_WRONLY)
+        writer = WriteBehindWriter(fd, self.buffer_pool)
+        tasks = []
+        try:
+            candidate.downloaded = candidate.expected_total - sum(end - pos for pos, end in candidate.segments)
+            pending = [segment for segment in candidate.segments if segment[0] < segment[1]]
+            if first is not None:
+                response, endpoint, head = first
+                stream = writer.open_stream(0)
+                await stream.write(head)
+                pending[0][0] += len(head)
+                candidate.downloaded += len(head)
+                watchdog.progress(len(head))
+                tasks.append(asyncio.create_task(fetch(pending[0], stream, response, endpoint)))
+                pending = pending[1:]
+            tasks.extend(asyncio.create_task(fetch(segment, writer.open_stream(segment[0]))) for segment in pending)
+            logger.info(f"Downloading {url} in {len(candidate.segments)} segments through {len(tasks)} proxies")
+            await asyncio.gather(*tasks)
+            candidate.segments = None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await self._close_writer(candidate, writer)
+            finally:
+                os.close(fd)
+    
+    @staticmethod
+    async def _verify_checksums(candidate: DownloadCandidate):
+        """Compare the body of a finished download with its expected digests; raises DownloadError on mismatch."""
+        hasher = candidate.hasher
+        if candidate.archive_stream is not None:
+            # Extracted while downloading: nothing was stored, and the stream was hashed in order
+            size = candidate.archive_stream.position
+            if not hasher.complete or hasher.position != size:
+                raise DownloadError(
+                    ErrorType.CHECKSUM_MISMATCH, f"Checksum of {candidate.url} could not be computed while extracting it")
+        elif candidate.sink is not None:
+            size = candidate.sink.size
+        else:
+            size = os.path.getsize(candidate.path)
+        if not hasher.complete or hasher.position != size:
+            # Out-of-order (segmented) body: one sequential pass over the result
+            if candidate.sink is not None:
+                await asyncio.to_thread(hasher.rehash, candidate.sink.file)
+            else:
+                with open(candidate.path, 'rb') as f:
+                    await asyncio.to_thread(hasher.rehash, f)
+        mismatched = hasher.mismatches()
+        if mismatched:
+            details = ', '.join(
+                f"{algorithm} expected {hasher.expected[algorithm]}, got {actual}"
+                for algorithm, actual in sorted(mismatched.items())
+            )
+            raise DownloadError(ErrorType.CHECKSUM_MISMATCH, f"Checksum mismatch for {candidate.url}: {details}")
+        logger.info(f"✓ Verified {', '.join(sorted(hasher.expected))} of {candidate.url}")
+    
+    @staticmethod
+    async def _close_writer(candidate: DownloadCandidate, writer: WriteBehindWriter):
+        """Drain the write-behind queue; after a write error the partial file cannot be resumed."""
+        try:
+            await writer.close()
+        except OSError:
+            candidate.segments = None
+            candidate.resumable = False
+            raise
+    
+    async def _open_response(
+        self,
+        candidate: DownloadCandidate,
+        endpoint: Optional[ProxyEndpoint],
+        watchdog: TransferWatchdog,
+        headers: Dict[str, str]
+    ) -> aiohttp.ClientResponse:
+        """Send the request (directly or through `endpoint`) and check the status; caller releases it."""
+        url = candidate.url
+        session = endpoint.get_session(self._client_timeout(), [trace_config()]) if endpoint else await self._get_session()
+        try:
+            response = await session.get(
+                url, allow_redirects=True, headers=headers, proxy=endpoint.url if endpoint else None
+            )
+        except Exception:
+            if endpoint:
+                endpoint.record_failure()
+            raise
+        
+        watchdog.headers_received()
+        if candidate.first_byte_at is None:
+            candidate.first_byte_at = time.monotonic()
+            self.hedge_policy.record_first_byte(candidate.host, candidate.first_byte_at - candidate.started_at)
+        if response.status in (200, 206):
+            return response
+        
+        response.release()
+        if endpoint and response.status in (403, 429):
+            # Most likely this proxy's IP is throttled: rotate instead of waiting
+            self.proxy_pool.record_blocked(endpoint, candidate.host)
+            can_rotate = bool(self.proxy_pool.available(candidate.host))
+            raise DownloadError(
+                ErrorType.PROXY_BLOCKED,
+                f"HTTP {response.status} for {url} via proxy {endpoint.label}",
+                retry_after=0 if can_rotate else parse_retry_after(response.headers.get('Retry-After')),
+            )
+        raise DownloadError(
+            classify_status(response.status),
+            f"HTTP {response.status} for {url}",
+            retry_after=parse_retry_after(response.headers.get('Retry-After')),
+        )
+    
+    async def _stream_range(
+        self,
+        candidate: DownloadCandidate,
+        response: aiohttp.ClientResponse,
+        endpoint: Optional[ProxyEndpoint],
+        stream: Union[WriteStream, MemoryStream, ArchiveStream],
+        segment: List[int],
+        watchdog: TransferWatchdog,
+        flow,
+        chunk_size: int
+    ):
+        """Queue the response body for writing at `segment[0]` onwards, advancing it, until `segment[1]` (None: EOF).
+        
+        The loop only reads from the network and copies into write-behind buffers; the read size
+        grows with throughput, starting from `chunk_size`.
+        """
+        url = candidate.url
+        limiter = self.bandwidth
+        content_length = candidate.expected_total
+        minimum = min(chunk_size, 16 * 1024)
+        sizer = ChunkSizer(initial=chunk_size, minimum=minimum, maximum=max(minimum, self.memory.allowance(1024 * 1024)))
+        started = time.monotonic()
+        received = 0
+        try:
+            while True:
+                chunk = await response.content.read(sizer.size)
+                if not chunk:
+                    break
+                if segment[1] is not None:
+                    chunk = chunk[:segment[1] - segment[0]]
+                # Waiting for the writer or the extractor to catch up is not a stall of the server
+                watchdog.pause()
+                try:
+                    await stream.write(chunk)
+                finally:
+                    watchdog.resume()
+                sizer.update(len(chunk))
+                segment[0] += len(chunk)
+                received += len(chunk)
+                candidate.downloaded += len(chunk)
+                candidate.bytes_received += len(chunk)
+                self.concurrency.record(candidate.host, len(chunk))
+                watchdog.progress(len(chunk))
+                if limiter.enabled:
+                    watchdog.pause()
+                    try:
+                        await limiter.consume(flow, len(chunk))
+                    finally:
+                        watchdog.resume()
+                
+                # Push real-time progress, once per 10% step
+                if content_length:
+                    progress = min(100, int((candidate.downloaded / content_length) * 100)) // 10 * 10
+                    if progress > candidate.reported_progress:
+                        candidate.reported_progress = progress
+                        with self.tracer.span('push_data', 'dataset', progress=progress):
+                            await self.actor.push_data({
+                                'type': 'progress',
+                                'status': 'downloading',
+                                'url': url,
+                                'progress_percent': progress,
+                                'bytes_downloaded': candidate.downloaded,
+                                'total_bytes': content_length,
+                                'timestamp': datetime.now().isoformat(),
+                            })
+                
+                if segment[1] is not None and segment[0] >= segment[1]:
+                    break
+        except Exception as e:
+            if endpoint and not isinstance(e, ArchiveStreamError):
+                endpoint.record_failure()
+            raise
+        
+        if segment[1] is not None and segment[0] < segment[1]:
+            if endpoint:
+                endpoint.record_failure()
+            raise DownloadError(ErrorType.TRANSIENT_NETWORK, f"Connection closed early downloading {url}")
+        if endpoint:
+            endpoint.record_success(received, time.monotonic() - started)
+    
+    def _breaker(self, host: str) -> CircuitBreaker:
+        return self.circuit_breakers.setdefault(host, CircuitBreaker())
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Shared download session, so connections are reused across downloads and retries."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(ssl=True, limit=self.profile.connections)  # SECURITY FIX: SSL enabled
+            self.session = aiohttp.ClientSession(
+                timeout=self._client_timeout(), connector=connector, trace_configs=[trace_config()])
+        return self.session
+    
+    def _client_timeout(self) -> aiohttp.ClientTimeout:
+        # No total limit: progressing transfers are policed by TransferWatchdog instead
+        return aiohttp.ClientTimeout(total=None, sock_connect=self.timeouts.connect)
+    
+    def _release_budget_later(self, key: str, kept: int) -> Callable[[], None]:
+        """Callback for the cleanup thread releasing the disk budget of `key` on the event loop."""
+        loop = asyncio.get_running_loop()
+        
+        def release():
+            task = asyncio.create_task(self.disk_budget.release(key, kept=kept))
+            self._budget_releases.add(task)
+            task.add_done_callback(self._budget_releases.discard)
+        
+        return lambda: loop.call_soon_threadsafe(release)
+    
+    def _on_memory_pressure(self, level: int):
+        # Pooled buffers are only worth keeping while memory is plentiful
+        self.buffer_pool.resize(0 if self.memory.under_pressure else POOL_MAX_FREE)
+    
+    async def close(self):
+        """Close the shared download session and the per-proxy sessions, and finish pending cleanup."""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        if self.proxy_pool:
+            await self.proxy_pool.close()
+        await self.memory.stop()
+        await self.concurrency.stop()
+        await asyncio.to_thread(self.workspaces.drain)
+        await asyncio.gather(*self._budget_releases)
+    
+    @staticmethod
+    def _parse_content_range(value: Optional[str]):
+        """Parse `bytes start-end/total` into (start, total); unknown parts are None."""
+        try:
+            _, _, spec = (value or '').partition(' ')
+            byte_range, _, total = spec.partition('/')
+            start = int(byte_range.split('-')[0])
+            return start, (int(total) if total.isdigit() else None)
+        except ValueError:
+            return None, None
+    
+    def _record_error(self, key: str, error_type: str, error_msg: str):
+        """Log an error and remember its category for the result of the job identified by `key`."""
+        logger.error(f"{error_msg} [{error_type}]")
+        self.stats['errors'].append(error_msg)
+        self.stats['error_types'][error_type] = self.stats['error_types'].get(error_type, 0) + 1
+        self.error_types[(current_job_id(), key)] = error_type
+    
+    def _error_type(self, key: str) -> Optional[str]:
+        """Category of the current job's last error for `key`."""
+        return self.error_types.get((current_job_id(), key))
+    
+    def _pop_error_type(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return self.error_types.pop((current_job_id(), key), default)
     
     def extract_zip(
         self,
         zip_path: str,
         extract_path: str,
-        handle_duplicates: str = 'rename',
-        password: Optional[str] = None,
-        max_extraction_size: int = 10 * 1024 * 1024 * 1024  # 10GB default limit
+        options: Optional[ExtractionOptions] = None,
+        archive: Optional[BinaryIO] = None
     ) -> bool:
-        """Extract ZIP with advanced features and safety checks."""
+        """Extract ZIP with advanced features and safety checks (from `archive` instead of `zip_path` if given).
+        
+        The central directory is read into a compact ZipIndex; with `options.file_types`, only entries
+        with those extensions are extracted, and the size limit applies to what is actually extracted.
+        Inflated output is counted as it is written, so ZIP bombs are stopped even when their
+        headers lie about the sizes. Inner `.zip` entries are unpacked recursively up to
+        `options.max_depth` levels, each into a directory named after it, and listed in
+        `nested_archives[zip_path]`. The password candidates are tried on the smallest encrypted
+        entry before anything is extracted; the position of the one that fits is stored in
+        `password_indexes[zip_path]`.
+        """
+        options = options or ExtractionOptions()
         try:
-            logger.info(f"Extracting {zip_path} to {extract_path}")
+            logger.info(f"Extracting {zip_path}{' from download buffer' if archive is not None else ''} to {extract_path}")
             os.makedirs(extract_path, exist_ok=True)
             
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                # Validate ZIP integrity
-                bad_file = zip_ref.testzip()
-                if bad_file:
-                    logger.warning(f"ZIP integrity check failed on: {bad_file}")
-                
-                file_list = zip_ref.namelist()
-                total_files = len(file_list)
-                total_size = sum(zip_ref.getinfo(name).file_size for name in file_list)
-                
-                # Check extraction size
-                if total_size > max_extraction_size:
-                    error_msg = f"Extraction size {total_size:,} bytes exceeds limit {max_extraction_size:,} bytes"
-                    logger.error(error_msg)
-                    self.stats['errors'].append(error_msg)
-                    return False
-                
-                logger.info(f"ZIP contains {total_files} files ({total_size:,} bytes)")
-                
-                # Set password if provided
-                if password:
-                    zip_ref.setpassword(password.encode())
-                
-                # Extract with progress and error handling
-                for idx, file_info in enumerate(zip_ref.infolist()):
-                    try:
-                        # Security: Prevent path traversal attacks
-                        normalized_path = os.path.normpath(file_info.filename)
-                        if normalized_path.startswith('..') or os.path.isabs(normalized_path):
-                            logger.warning(f"Skipping suspicious path: {file_info.filename}")
-                            self.stats['skipped_files'] += 1
-                            continue
-                        
-                        target_path = os.path.join(extract_path, normalized_path)
-                        
-                        # Handle duplicates - FIXED LOGIC
-                        if os.path.exists(target_path):
-                            if handle_duplicates == 'skip':
-                                logger.info(f"Skipping duplicate: {file_info.filename}")
-                                self.stats['skipped_files'] += 1
-                                continue
-                            elif handle_duplicates == 'rename':
-                                # Handle full path with subdirectories correctly
-                                dir_path = os.path.dirname(target_path)
-                                filename = os.path.basename(target_path)
-                                base, ext = os.path.splitext(filename)
-                                counter = 1
-                                while os.path.exists(target_path):
-                                    new_filename = f"{base}_{counter}{ext}"
-                                    target_path = os.path.join(dir_path, new_filename)
-                                    counter += 1
-                                logger.info(f"Renamed duplicate to: {os.path.basename(target_path)}")
-                            # else: overwrite (default behavior)
-                        
-                        # Extract file
-                        if file_info.is_dir():
-                            os.makedirs(target_path, exist_ok=True)
-                        else:
-                            os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                            try:
-                                with zip_ref.open(file_info) as source, open(target_path, 'wb') as target:
-                                    shutil.copyfileobj(source, target)
-                            except RuntimeError as e:
-                                if 'Bad password' in str(e):
-                                    error_msg = f"Bad password for encrypted file: {file_info.filename}"
-                                    logger.error(error_msg)
-                                    self.stats['errors'].append(error_msg)
-                                    self.stats['corrupted_files'] += 1
-                                    continue
-                                raise
-                        
-                        # Progress tracking
-                        progress = int(((idx + 1) / total_files) * 100)
-                        if (idx + 1) % max(1, total_files // 10) == 0:  # Log every 10%
-                            logger.info(f"Extraction progress: {progress}% ({idx + 1}/{total_files} files)")
-                        
-                        self.stats['total_extracted'] += 1
-                    
-                    except Exception as e:
-                        error_msg = f"Error extracting {file_info.filename}: {str(e)}"
-                        logger.error(error_msg)
-                        self.stats['errors'].append(error_msg)
-                        self.stats['corrupted_files'] += 1
+            # Archives on disk are read through a shared, readahead-hinted memory map
+            mapped = MappedArchive(zip_path) if archive is None else None
+            with mapped or contextlib.nullcontext(), self.tracer.span('extract_zip', 'extract', archive=zip_path):
+                # CRCs are verified while entries are extracted, so there is no separate testzip() pass
+                with self.tracer.span('index', 'extract'):
+                    index = ZipIndex.parse(mapped if mapped else archive)
+                run = ExtractionRun(options, zip_path, extract_path, options.guard())
+                self.nested_archives[zip_path] = run.nested
+                candidates = options.password_candidates()
+                probe = index.smallest_encrypted() if candidates else None
+                if probe is not None:
+                    with self.tracer.span('select_password', 'extract', candidates=len(candidates)):
+                        match = self._select_password(index, probe, candidates, self.profile.password_workers)
+                    if match is None:
+                        error_msg = f"None of the {len(candidates)} password(s) opens {zip_path}"
+                        self._record_error(zip_path, ErrorType.BAD_PASSWORD, error_msg)
+                        return False
+                    logger.info(f"🔑 Password #{match + 1} of {len(candidates)} opens {zip_path}")
+                    self.password_indexes[zip_path] = match
+                    run.pwd = candidates[match]
+                with self.tracer.span('entries', 'extract', entries=len(index)):
+                    if not self._extract_archive(run, index, extract_path, 0):
+                        return False
             
             logger.info(f"✓ Successfully extracted {self.stats['total_extracted']} files")
             return True
         
+        except ZipBombError as e:
+            error_msg = f"Refusing to extract {zip_path}: {e}"
+            self._record_error(zip_path, ErrorType.ZIP_BOMB, error_msg)
+            return False
         except zipfile.BadZipFile:
             error_msg = f"Invalid or corrupted zip file: {zip_path}"
-            logger.error(error_msg)
-            self.stats['errors'].append(error_msg)
+            self._record_error(zip_path, ErrorType.BAD_ZIP, error_msg)
             return False
         except PermissionError:
             error_msg = f"Permission denied: {zip_path}"
-            logger.error(error_msg)
-            self.stats['errors'].append(error_msg)
+            self._record_error(zip_path, ErrorType.PERMISSION_DENIED, error_msg)
+            return False
+        except Exception as e:
+            error_msg = f"Unexpected error extracting {zip_path}: {str(e)}"
+            self._record_error(zip_path, ErrorType.EXTRACTION_ERROR, error_msg)
+            return False
+    
+    def extract_tar(
+        self,
+        zip_path: str,
+        extract_path: str,
+        options: Optional[ExtractionOptions] = None,
+        archive: Optional[BinaryIO] = None,
+        archive_format: str = 'tar',
+        created: Optional[List[str]] = None
+    ) -> bool:
+        """Extract a tar (plain or gzip/bzip2/xz compressed) or a single compressed file, strictly sequentially.
+
+        `archive` (instead of `zip_path`) may be a pipe fed by a running download: nothing is read
+        twice. Filtering, duplicate handling and path checks are those of `extract_zip`; a
+        compressed stream that holds no tarball is written out as one file named after the archive.
+        Paths of written files are appended to `created`. Passwords and nesting do not apply.
+        """
+        options = options or ExtractionOptions()
+        file_types = options.file_types
+        handle_duplicates = options.handle_duplicates
+        max_extraction_size = options.max_extraction_size
+        created = created if created is not None else []
+        try:
+            logger.info(f"Extracting {archive_format} archive {zip_path} to {extract_path}")
+            os.makedirs(extract_path, exist_ok=True)
+            guard = options.guard()
+            
+            span = self.tracer.span('extract_tar', 'extract', archive=zip_path, format=archive_format)
+            with open(zip_path, 'rb') if archive is None else contextlib.nullcontext(archive) as raw, span:
+                # Decompression runs here, in the extraction thread, counted for the bomb limits
+                stream = TappedReader(raw, guard.compressed)
+                if archive_format != 'tar':
+                    stream = io.BufferedReader(open_decompressed(archive_format, stream), self.profile.copy_buffer_size)
+                if archive_format != 'tar' and not is_tar_header(stream.peek(TAR_BLOCK_SIZE)[:TAR_BLOCK_SIZE]):
+                    # e.g. data.csv.gz: a single compressed file
+                    name = os.path.basename(zip_path)
+                    base, ext = os.path.splitext(name)
+                    name = base if ext.lower() in COMPRESSED_SUFFIXES else name
+                    if file_types and not name.lower().endswith(tuple(file_types)):
+                        logger.info(f"{name} does not match {', '.join(file_types)}, nothing to extract")
+                        return True
+                    target_path = self._resolve_duplicate(os.path.join(extract_path, name), name, handle_duplicates)
+                    if target_path is not None:
+                        created.append(target_path)
+                        self._write_entry(stream, target_path, 0, name, guard)
+                        self.stats['total_extracted'] += 1
+                else:
+                    extracted = 0
+                    with tarfile.open(fileobj=stream, mode='r|') as tar:
+                        for member in tar:
+                            if not (member.isfile() or member.isdir()):
+                                # Links and device nodes could point anywhere on the system
+                                logger.warning(f"Skipping {member.name}: not a regular file or directory")
+                                self.stats['skipped_files'] += 1
+                                current_job().skipped_files += 1
+                                continue
+                            if member.isfile() and file_types and not member.name.lower().endswith(tuple(file_types)):
+                                continue
+                            normalized_path = self._safe_path(member.name)
+                            if normalized_path is None:
+                                continue
+                            if guard.total_out + member.size > max_extraction_size:
+                                error_msg = f"Extraction size exceeds limit {max_extraction_size:,} bytes at {member.name}"
+                                self._record_error(zip_path, ErrorType.SIZE_LIMIT, error_msg)
+                                return False
+                            target_path = self._resolve_duplicate(
+                                os.path.join(extract_path, normalized_path), member.name, handle_duplicates)
+                            if target_path is None:
+                                continue
+                            if member.isdir():
+                                os.makedirs(target_path, exist_ok=True)
+                                continue
+                            created.append(target_path)
+                            self._write_entry(tar.extractfile(member), target_path, member.size, member.name, guard)
+                            self.stats['total_extracted'] += 1
+                            extracted += 1
+                            if extracted % 1000 == 0:
+                                logger.info(f"Extraction progress: {extracted} files")
+                    # tarfile stops at the end-of-archive marker: read on so a truncated or corrupted
+                    # compressed stream is still reported
+                    while stream.read(self.profile.copy_buffer_size):
+                        pass
+            
+            logger.info(f"✓ Successfully extracted {self.stats['total_extracted']} files")
+            return True
+        
+        except StreamAborted:
+            raise
+        except ZipBombError as e:
+            error_msg = f"Refusing to extract {zip_path}: {e}"
+            self._record_error(zip_path, ErrorType.ZIP_BOMB, error_msg)
+            return False
+        except (tarfile.ReadError, EOFError, zlib.error, lzma.LZMAError, gzip.BadGzipFile) as e:
+            error_msg = f"Invalid or corrupted {archive_format} archive: {zip_path} ({e})"
+            self._record_error(zip_path, ErrorType.BAD_ZIP, error_msg)
+            return False
+        except PermissionError:
+            error_msg = f"Permission denied: {zip_path}"
+            self._record_error(zip_path, ErrorType.PERMISSION_DENIED, error_msg)
             return False
         except Exception as e:
+            if is_disk_full(e):
+                error_msg = f"Insufficient disk space extracting {zip_path}"
+                self._record_error(zip_path, ErrorType.INSUFFICIENT_DISK, error_msg)
+                return False
             error_msg = f"Unexpected error extracting {zip_path}: {str(e)}"
+            self._record_error(zip_path, ErrorType.EXTRACTION_ERROR, error_msg)
+            return False
+    
+    @staticmethod
+    def _select_password(index: ZipIndex, entry: int, candidates: List[bytes], workers: int) -> Optional[int]:
+        """Position of the first candidate that opens encrypted `entry`, or None."""
+        if len(candidates) == 1 or not isinstance(index.source, MappedArchive):
+            # A plain file object has a single cursor, so candidates are tried one after another
+            return next((i for i, pwd in enumerate(candidates) if index.check_password(entry, pwd)), None)
+        # AES key derivation (PBKDF2) releases the GIL, so candidates are tried in parallel
+        with ThreadPoolExecutor(max_workers=min(len(candidates), workers)) as executor:
+            results = list(executor.map(lambda pwd: index.check_password(entry, pwd), candidates))
+        return results.index(True) if True in results else None
+    
+    def _extract_archive(self, run: ExtractionRun, index: ZipIndex, extract_path: str, depth: int) -> bool:
+        """Extract the entries of one archive (the downloaded one at depth 0); False aborts the whole extraction."""
+        zip_path, guard = run.zip_path, run.guard
+        file_types = run.options.file_types
+        max_extraction_size = run.options.max_extraction_size
+        # Inner archives are selected whatever the filter while they can still be unpacked
+        recurse = depth < run.options.max_depth
+        entries = index.select(file_types + ['.zip'] if file_types and recurse else file_types)
+        total_files = len(entries)
+        total_size = index.total_size(entries if file_types else None)
+        label = zip_path if depth == 0 else os.path.relpath(extract_path, run.extract_root)
+        
+        # Check extraction size (nested archives share what is left of the limit)
+        if total_size > max_extraction_size - guard.total_out:
+            error_msg = f"Extraction size {total_size:,} bytes exceeds limit {max_extraction_size:,} bytes"
+            if depth == 0:
+                self._record_error(zip_path, ErrorType.SIZE_LIMIT, error_msg)
+                return False
+            error_msg = f"Skipping nested archive {label}: {error_msg}"
             logger.error(error_msg)
             self.stats['errors'].append(error_msg)
-            return False
+            self.stats['skipped_files'] += 1
+            current_job().skipped_files += 1
+            return True
+        
+        guard.check_index(index)
+        
+        if file_types:
+            logger.info(f"ZIP contains {len(index)} entries, {total_files} matching {', '.join(file_types)} ({total_size:,} bytes)")
+        else:
+            logger.info(f"ZIP contains {total_files} files ({total_size:,} bytes)")
+        
+        # Extract with progress and error handling
+        for idx, entry in enumerate(entries):
+            entry_name = index.name(entry)
+            try:
+                # Security: Prevent path traversal attacks
+                normalized_path = self._safe_path(entry_name)
+                if normalized_path is None:
+                    continue
+                
+                target_path = os.path.join(extract_path, normalized_path)
+                
+                # Inner archives are unpacked straight from the outer one instead of being written out
+                if recurse and not index.is_dir(entry) and normalized_path.lower().endswith('.zip'):
+                    try:
+                        if not self._extract_nested(run, index, entry, target_path, depth):
+                            return False
+                        continue
+                    except zipfile.BadZipFile as e:
+                        if file_types and '.zip' not in file_types:
+                            # Only selected to be unpacked
+                            logger.warning(f"Skipping {entry_name}: not a readable ZIP archive ({e})")
+                            self.stats['skipped_files'] += 1
+                            current_job().skipped_files += 1
+                            continue
+                        logger.warning(f"{entry_name} is not a readable ZIP archive ({e}), extracting it as a file")
+                
+                target_path = self._resolve_duplicate(target_path, entry_name, run.options.handle_duplicates)
+                if target_path is None:
+                    continue
+                
+                # Extract file
+                if index.is_dir(entry):
+                    os.makedirs(target_path, exist_ok=True)
+                else:
+                    try:
+                        with index.open(entry, run.pwd, tap=guard.compressed) as source:
+                            self._write_entry(source, target_path, index.file_sizes[entry], entry_name, guard)
+                    except RuntimeError as e:
+                        if 'Bad password' in str(e):
+                            error_msg = f"Bad password for encrypted file: {entry_name}"
+                            logger.error(error_msg)
+                            self.stats['errors'].append(error_msg)
+                            self.stats['corrupted_files'] += 1
+                            current_job().corrupted_files += 1
+                            continue
+                        raise
+                
+                # Progress tracking
+                progress = int(((idx + 1) / total_files) * 100)
+                if (idx + 1) % max(1, total_files // 10) == 0:  # Log every 10%
+                    logger.info(f"Extraction progress: {progress}% ({idx + 1}/{total_files} files)")
+                
+                self.stats['total_extracted'] += 1
+            
+            except ZipBombError:
+                raise
+            except Exception as e:
+                # _write_entry has already removed the entry's partial file
+                if is_disk_full(e):
+                    # Every further entry would fail the same way
+                    error_msg = f"Insufficient disk space extracting {entry_name} from {label}"
+                    self._record_error(zip_path, ErrorType.INSUFFICIENT_DISK, error_msg)
+                    return False
+                error_msg = f"Error extracting {entry_name}: {str(e)}"
+                logger.error(error_msg)
+                self.stats['errors'].append(error_msg)
+                self.stats['corrupted_files'] += 1
+                current_job().corrupted_files += 1
+        return True
+    
+    def _safe_path(self, entry_name: str) -> Optional[str]:
+        """Normalized relative path of an archive entry, or None (counted as skipped) if it would escape."""
+        normalized_path = os.path.normpath(entry_name)
+        if normalized_path.startswith('..') or os.path.isabs(normalized_path):
+            logger.warning(f"Skipping suspicious path: {entry_name}")
+            self.stats['skipped_files'] += 1
+            current_job().skipped_files += 1
+            return None
+        return normalized_path
     
-    async def process_zip(
+    def _resolve_duplicate(self, target_path: str, entry_name: str, handle_duplicates: str) -> Optional[str]:
+        """Path to write an entry to when `target_path` may already exist, or None to skip the entry."""
+        # Handle duplicates - FIXED LOGIC
+        if os.path.exists(target_path):
+            if handle_duplicates == 'skip':
+                logger.info(f"Skipping duplicate: {entry_name}")
+                self.stats['skipped_files'] += 1
+                current_job().skipped_files += 1
+                return None
+            elif handle_duplicates == 'rename':
+                # Handle full path with subdirectories correctly
+                dir_path = os.path.dirname(target_path)
+                filename = os.path.basename(target_path)
+                base, ext = os.path.splitext(filename)
+                counter = 1
+                while os.path.exists(target_path):
+                    new_filename = f"{base}_{counter}{ext}"
+                    target_path = os.path.join(dir_path, new_filename)
+                    counter += 1
+                logger.info(f"Renamed duplicate to: {os.path.basename(target_path)}")
+            # else: overwrite (default behavior)
+        return target_path
+    
+    def _write_entry(self, source: BinaryIO, target_path: str, file_size: int, entry_name: str, guard: BombGuard):
+        """Write one decompressing entry to `target_path` under the ZIP bomb limits.
+        
+        If reading the entry fails (bad CRC or HMAC, wrong password, truncated data, limits, full
+        disk), the partial file is removed: only entries that were read completely and passed
+        their checks stay on disk and in the manifest.
+        """
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        guard.start_entry(entry_name)
+        span = self.tracer.sampled_span('write_entry', 'entry', entry=entry_name, size=file_size)
+        try:
+            with open(target_path, 'wb') as target, span:
+                # Reserve the space up front; a full disk aborts the whole extraction
+                preallocated = file_size >= PREALLOCATE_MIN_SIZE and preallocate(target.fileno(), file_size, entry_name)
+                try:
+                    self._copy_entry(source, target, guard)
+                finally:
+                    if preallocated:
+                        # Never leave zero padding behind a short or failed copy
+                        target.truncate()
+        except BaseException:
+            if os.path.isfile(target_path):
+                os.remove(target_path)
+            raise
+    
+    def _extract_nested(self, run: ExtractionRun, index: ZipIndex, entry: int, archive_path: str, depth: int) -> bool:
+        """Extract inner archive `entry` into a directory next to where it would have been written."""
+        nested_path = os.path.splitext(archive_path)[0]
+        record = {
+            'path': os.path.relpath(archive_path, run.extract_root),
+            'extracted_to': os.path.relpath(nested_path, run.extract_root),
+            'depth': depth + 1,
+        }
+        logger.info(f"📦 Extracting nested archive {record['path']} (depth {depth + 1})")
+        with self._open_nested(index, entry, run.pwd, run.guard, os.path.dirname(run.extract_root)) as source:
+            inner = ZipIndex.parse(source)
+            os.makedirs(nested_path, exist_ok=True)
+            run.nested.append(record)
+            return self._extract_archive(run, inner, nested_path, depth + 1)
+    
+    def _open_nested(self, index: ZipIndex, entry: int, pwd: Optional[bytes], guard: BombGuard, spill_dir: str) -> BinaryIO:
+        """Seekable file of inner archive `entry`: a view of the outer archive if stored, else a spooled copy."""
+        if index.methods[entry] == zipfile.ZIP_STORED and not index.is_encrypted(entry):
+            return index.open_stored(entry)
+        # Inflated into memory; only archives larger than NESTED_SPOOL_SIZE spill to a temporary file
+        spool = tempfile.SpooledTemporaryFile(max_size=max(1, self.memory.allowance(NESTED_SPOOL_SIZE)), dir=spill_dir)
+        try:
+            guard.start_entry(index.name(entry))
+            with index.open(entry, pwd, tap=guard.compressed) as source:
+                self._copy_entry(source, spool, guard)
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+    
+    def _copy_entry(self, source: BinaryIO, target: BinaryIO, guard: BombGuard):
+        """Copy an inflating entry, accounting for every block before it is written."""
+        block_size = self.profile.copy_buffer_size
+        while True:
+            data = source.read(block_size)
+            if not data:
+                break
+            guard.inflated(len(data))
+            target.write(data)
+    
+    @staticmethod
+    def _build_manifest(extract_path: str, nested: List[Dict]) -> List[Dict]:
+        """Files under `extract_path`; files of nested archives are listed inside their archive's entry."""
+        archives = {
+            record['extracted_to']: {
+                'path': record['path'],
+                'type': Path(record['path']).suffix,
+                'nested_depth': record['depth'],
+                'extracted_to': record['extracted_to'],
+                'files_extracted': 0,
+                'extracted_files': [],
+            }
+            for record in nested
+        }
+        
+        def owner(rel_path: str) -> List[Dict]:
+            # Innermost nested archive extracted into a parent directory of `rel_path`
+            parent = os.path.dirname(rel_path)
+            while parent and parent not in archives:
+                parent = os.path.dirname(parent)
+            return archives[parent]['extracted_files'] if parent else extracted_files
+        
+        extracted_files = []
+        if os.path.exists(extract_path):
+            for root, dirs, files in os.walk(extract_path):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(file_path, extract_path)
+                    file_size = os.path.getsize(file_path)
+                    owner(rel_path).append({
+                        'path': rel_path,
+                        'size': file_size,
+                        'type': Path(file_path).suffix,
+                        'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
+                    })
+        # Innermost archives first, so each one is complete when it is attached to its parent
+        for key, archive in sorted(archives.items(), key=lambda item: -item[1]['nested_depth']):
+            archive['files_extracted'] = sum(item.get('files_extracted', 1) for item in archive['extracted_files'])
+            owner(key).append(archive)
+        return extracted_files
+    
+    @classmethod
+    def _manifest_size(cls, extracted_files: List[Dict]) -> int:
+        """Bytes of the files listed in a manifest, including those of nested archives."""
+        return sum(
+            item['size'] if 'size' in item else cls._manifest_size(item['extracted_files'])
+            for item in extracted_files
+        )
+    
+    @staticmethod
+    def _has_zip_directory(zip_path: str, source: Optional[BinaryIO]) -> bool:
+        """Whether a body without a known signature at its start ends like a ZIP."""
+        if source is None:
+            with open(zip_path, 'rb') as f:
+                return has_zip_directory(f)
+        try:
+            return has_zip_directory(source)
+        finally:
+            source.seek(0)
+    
+    @staticmethod
+    def _extraction_size(zip_path: str, source: Optional[BinaryIO], archive_format: Optional[str], file_types: Optional[List[str]]) -> int:
+        """Bytes an extraction will write: the central directory total of a ZIP, the size of a plain tar.
+        
+        Compressed tars do not announce it and count as 0 (the extraction size limit still applies).
+        """
+        try:
+            if archive_format == 'tar':
+                if source is None:
+                    return os.path.getsize(zip_path)
+                size = source.seek(0, os.SEEK_END)
+                source.seek(0)
+                return size
+            if archive_format not in (None, 'zip'):
+                return 0
+            with MappedArchive(zip_path) if source is None else contextlib.nullcontext(source) as archive:
+                index = ZipIndex.parse(archive)
+                return index.total_size(index.select(file_types) if file_types else None)
+        except (zipfile.BadZipFile, OSError, ValueError):
+            # Reported by the extraction itself
+            return 0
+    
+    @staticmethod
+    def _kept_size(archive_path: Optional[str], extract_path: Optional[str]) -> int:
+        """Bytes a finished job leaves on disk."""
+        size = os.path.getsize(archive_path) if archive_path and os.path.isfile(archive_path) else 0
+        if extract_path:
+            for root, dirs, files in os.walk(extract_path):
+                size += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+        return size
+    
+    async def process_zip(self, url: str, **options) -> Dict:
+        """Process one archive URL (see `_process_zip` for the options); the result includes the job's metrics."""
+        with track_job(JobMetrics(self.tracer)) as job, self.tracer.span('job', 'job', url=url):
+            result = await self._process_zip(url, **options)
+        job.finish()
+        self.metrics.add(job)
+        result['processing_time_seconds'] = round(job.total_seconds, 2)
+        result['metrics'] = job.report()
+        phases = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in result['metrics']['phases_seconds'].items())
+        logger.info(f"⏱️ {url} took {job.total_seconds:.2f}s ({phases or 'no phases'})")
+        return result
+    
+    async def _process_zip(
         self,
         url: str,
         extract_to_memory: bool = False,
         keep_zip: bool = False,
-        password: Optional[str] = None,
-        handle_duplicates: str = 'rename',
-        timeout: int = 300
+        timeout: int = 300,
+        mirrors: Optional[List[str]] = None,
+        weight: float = 1.0,
+        in_memory_threshold: int = 0,
+        sha256: Optional[str] = None,
+        extraction: Optional[ExtractionOptions] = None
     ) -> Dict:
-        """Main processing function with comprehensive error handling."""
-        self.stats['start_time'] = asyncio.get_event_loop().time()
+        """Main processing function with comprehensive error handling (`extraction`: how the archive is unpacked)."""
+        options = extraction or ExtractionOptions()
+        job = current_job()
         self.stats['files_processed'] += 1
+        self.memory.start()
+        self.concurrency.start()
         
-        # Use Apify storage for better reliability - FIXED
-        # Use actor's temporary directory instead of hardcoded path
-        temp_dir = os.path.join(os.getcwd(), 'apify_storage', 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
+        workspace = None
+        zip_path = None
+        archive = None
+        cached_archive = None
+        extracted = False
         
         try:
             # Extract filename from URL
@@ -255,69 +1393,142 @@ class ZipDownloadExtractor:
             # Sanitize filename
             filename = "".join(c for c in filename if c.isalnum() or c in ('.', '_', '-'))
             
-            zip_path = os.path.join(temp_dir, filename)
-            extract_path = os.path.join(temp_dir, 'extracted')
+            # Each job downloads and extracts in its own directory; archives that are not kept may go to tmpfs
+            workspace = await asyncio.to_thread(
+                self.workspaces.create, filename or 'downloaded.zip', stage_archive=self.tmpfs_staging and not keep_zip)
+            zip_path = workspace.archive_path
+            extract_path = workspace.extract_path
+            
+            # An archive with a known digest may already be in the local cache
+            cached_path = await asyncio.to_thread(self.archive_cache.lookup, sha256) if sha256 else None
+            if cached_path:
+                logger.info(f"♻️ Using cached archive {cached_path} for {url}, skipping download")
+                cached_archive = MappedArchive(cached_path)
+            
+            # Tar archives that need not be kept are extracted while they download
+            stream_extract = None
+            if not keep_zip and not mirrors and cached_archive is None:
+                def stream_extract(archive_format: str, fileobj: BinaryIO, created: List[str]) -> bool:
+                    return self.extract_tar(
+                        zip_path, extract_path, options, archive=fileobj, archive_format=archive_format, created=created)
+            
+            # Download (small archives into memory, unless the ZIP has to be kept)
+            memory_limit = 0 if keep_zip else in_memory_threshold
+            async def download() -> bool:
+                return await self.download_file(
+                    url, zip_path, timeout=timeout, mirrors=mirrors, weight=weight, memory_limit=memory_limit,
+                    expected_digests={'sha256': sha256} if sha256 else None, stream_extract=stream_extract)
             
-            # Download
-            if not await self.download_file(url, zip_path, timeout=timeout):
+            with job.phase('download'):
+                downloaded = cached_archive is not None or await download()
+                if not downloaded and workspace.staged and self._error_type(url) == ErrorType.INSUFFICIENT_DISK:
+                    # The archive outgrew tmpfs: fall back to the job directory on disk
+                    logger.warning(f"Not enough room on {self.workspaces.tmpfs_dir} for {filename}, downloading to disk instead")
+                    self._pop_error_type(url)
+                    workspace = self.workspaces.unstage(workspace)
+                    zip_path = workspace.archive_path
+                    downloaded = await download()
+            if not downloaded:
+                error_type = self._pop_error_type(url)
                 return {
                     'success': False,
                     'url': url,
-                    'error': 'Failed to download file',
+                    'error': 'Failed to download file' if error_type else 'Failed to extract archive',
+                    'error_type': error_type or self._pop_error_type(zip_path, ErrorType.UNKNOWN),
                     'filename': filename,
                     'timestamp': datetime.now().isoformat(),
                 }
             
-            # Extract
-            if not self.extract_zip(zip_path, extract_path, handle_duplicates, password):
+            archive = self.memory_archives.pop(zip_path, None)
+            if sha256 and keep_zip and cached_archive is None:
+                # Verified and kept on disk anyway: reuse it next time instead of downloading
+                await asyncio.to_thread(self.archive_cache.add, sha256, zip_path)
+            source = cached_archive.reader() if cached_archive is not None else (archive.file if archive else None)
+            streamed = zip_path in self.streamed_archives
+            self.streamed_archives.discard(zip_path)
+            if source is not None:
+                head = source.read(TAR_BLOCK_SIZE)
+                source.seek(0)
+            elif not streamed:
+                with open(zip_path, 'rb') as f:
+                    head = f.read(TAR_BLOCK_SIZE)
+            archive_format = None if streamed else detect_format(head)
+            if not streamed and archive_format is None:
+                if not await asyncio.to_thread(self._has_zip_directory, zip_path, source):
+                    self._record_error(
+                        zip_path, ErrorType.NOT_A_ZIP,
+                        f"{url} is not a ZIP or tar archive ({describe_non_archive(head, None)})")
+                    return {
+                        'success': False,
+                        'url': url,
+                        'error': 'Failed to extract archive',
+                        'error_type': self._pop_error_type(zip_path),
+                        'filename': filename,
+                        'bytes_downloaded': job.bytes_downloaded,
+                        'timestamp': datetime.now().isoformat(),
+                    }
+                archive_format = 'zip'
+            # Wait until what the extraction will write fits in the disk budget
+            if not streamed and self.disk_budget.covers(extract_path):
+                with job.phase('validation'):
+                    needed = await asyncio.to_thread(self._extraction_size, zip_path, source, archive_format, options.file_types)
+                try:
+                    with job.phase('queued'):
+                        await self.disk_budget.reserve(zip_path, needed)
+                except InsufficientDiskError as e:
+                    self._record_error(zip_path, ErrorType.INSUFFICIENT_DISK, f"{e.strerror} to extract {zip_path}")
+                    return {
+                        'success': False,
+                        'url': url,
+                        'error': 'Failed to extract archive',
+                        'error_type': self._pop_error_type(zip_path),
+                        'filename': filename,
+                        'timestamp': datetime.now().isoformat(),
+                    }
+            # Extract in a worker thread so other downloads keep flowing (waiting for a slot counts as queued)
+            if streamed:
+                extracted = True
+            elif archive_format in (None, 'zip'):
+                with job.phase('queued'):
+                    async with self.memory.extractions:
+                        with job.phase('extraction'):
+                            extracted = await asyncio.to_thread(self.extract_zip, zip_path, extract_path, options, source)
+            else:
+                with job.phase('queued'):
+                    async with self.memory.extractions:
+                        with job.phase('extraction'):
+                            extracted = await asyncio.to_thread(
+                                self.extract_tar, zip_path, extract_path, options, source, archive_format)
+            if not extracted:
                 return {
                     'success': False,
                     'url': url,
-                    'error': 'Failed to extract zip',
+                    'error': 'Failed to extract archive',
+                    'error_type': self._pop_error_type(zip_path, ErrorType.EXTRACTION_ERROR),
                     'filename': filename,
-                    'bytes_downloaded': os.path.getsize(zip_path),
+                    'bytes_downloaded': job.bytes_downloaded,
                     'timestamp': datetime.now().isoformat(),
                 }
             
             # Prepare result with detailed file information
-            extracted_files = []
-            if os.path.exists(extract_path):
-                for root, dirs, files in os.walk(extract_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        rel_path = os.path.relpath(file_path, extract_path)
-                        file_size = os.path.getsize(file_path)
-                        extracted_files.append({
-                            'path': rel_path,
-                            'size': file_size,
-                            'type': Path(file_path).suffix,
-                            'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
-                        })
-            
-            # Cleanup
-            try:
-                if not keep_zip and os.path.exists(zip_path):
-                    os.remove(zip_path)
-                    logger.info(f"Deleted temporary ZIP: {zip_path}")
-                
-                if extract_to_memory and os.path.exists(extract_path):
-                    shutil.rmtree(extract_path)
-                    logger.info(f"Deleted extraction folder: {extract_path}")
-            except Exception as e:
-                logger.warning(f"Cleanup error: {str(e)}")
-            
-            self.stats['end_time'] = asyncio.get_event_loop().time()
+            with job.phase('manifest'):
+                extracted_files = self._build_manifest(extract_path, self.nested_archives.get(zip_path, []))
+            job.files_extracted = sum(item.get('files_extracted', 1) for item in extracted_files)
+            job.bytes_extracted = self._manifest_size(extracted_files)
             
             return {
                 'success': True,
                 'url': url,
                 'filename': filename,
-                'files_extracted': len(extracted_files),
+                'files_extracted': job.files_extracted,
                 'extracted_files': extracted_files,
-                'bytes_downloaded': self.stats['total_downloaded'],
-                'processing_time_seconds': round(self.stats['end_time'] - self.stats['start_time'], 2),
-                'skipped_files': self.stats['skipped_files'],
-                'corrupted_files': self.stats['corrupted_files'],
+                'bytes_downloaded': job.bytes_downloaded,
+                'from_cache': cached_archive is not None,
+                'extract_path': None if extract_to_memory else extract_path,
+                # Which password candidate opened the archive (None if nothing was encrypted)
+                'password_index': self.password_indexes.get(zip_path),
+                'skipped_files': job.skipped_files,
+                'corrupted_files': job.corrupted_files,
                 'timestamp': datetime.now().isoformat(),
             }
         
@@ -328,8 +1539,29 @@ class ZipDownloadExtractor:
                 'success': False,
                 'url': url,
                 'error': str(e),
+                'error_type': ErrorType.UNKNOWN,
                 'timestamp': datetime.now().isoformat(),
             }
+        
+        finally:
+            with job.phase('cleanup'):
+                if archive is not None:
+                    archive.close()
+                if cached_archive is not None:
+                    cached_archive.close()
+                if workspace is not None:
+                    # Deleted in the background; a failed job keeps nothing but a kept archive
+                    keep_extracted = extracted and not extract_to_memory
+                    kept = await asyncio.to_thread(
+                        self._kept_size, zip_path if keep_zip else None, extract_path if keep_extracted else None
+                    ) if self.disk_budget.covers(workspace.root) else 0
+                    # The reserved space is only free once the deletion has actually happened
+                    self.workspaces.release(
+                        workspace, keep_archive=keep_zip, keep_extracted=keep_extracted,
+                        on_deleted=self._release_budget_later(zip_path, kept))
+                self.streamed_archives.discard(zip_path)
+                self.nested_archives.pop(zip_path, None)
+                self.password_indexes.pop(zip_path, None)
 
 
 async def main():
@@ -342,13 +1574,16 @@ async def main():
             if not actor_input:
                 actor_input = {}
             
-            logger.info(f"Received input: {json.dumps(actor_input, indent=2)}")
+            # Passwords never reach the log
+            logged_input = {k: '***' if k in SECRET_INPUTS and v else v for k, v in actor_input.items()}
+            logger.info(f"Received input: {json.dumps(logged_input, indent=2)}")
             
             # Validate input - Enhanced empty input handling with default fallback
             urls_raw = actor_input.get('urls', [])
             
             # Extract URLs from requestListSources format
             urls = []
+            url_options: Dict[str, Dict] = {}
             if isinstance(urls_raw, list):
                 for item in urls_raw:
                     if isinstance(item, dict) and 'url' in item:
@@ -356,6 +1591,24 @@ async def main():
                         url_str = item.get('url')
                         if url_str and isinstance(url_str, str):
                             urls.append(url_str.strip())
+                            # Per-item options, top-level or in userData
+                            user_data = item.get('userData') or {}
+                            mirrors = item.get('mirrors') or user_data.get('mirrors') or []
+                            if isinstance(mirrors, str):
+                                mirrors = [mirrors]
+                            weight = item.get('weight', user_data.get('weight', 1))
+                            sha256_raw = item.get('sha256') or user_data.get('sha256')
+                            sha256 = normalize_sha256(sha256_raw)
+                            if sha256_raw and not sha256:
+                                logger.warning(f"Ignoring invalid sha256 for {url_str.strip()}: {sha256_raw}")
+                            url_options[url_str.strip()] = {
+                                # Alternate URLs of the same archive
+                                'mirrors': [m.strip() for m in mirrors if isinstance(m, str) and m.strip()],
+                                # Share of the global bandwidth cap
+                                'weight': float(weight) if isinstance(weight, (int, float)) and weight > 0 else 1.0,
+                                # Expected SHA-256 of the archive
+                                'sha256': sha256,
+                            }
                     elif isinstance(item, str):
                         # Direct string URL
                         urls.append(item.strip())
@@ -380,39 +1633,152 @@ async def main():
             
             logger.info(f"Processing {len(urls)} URL(s): {urls}")
             
+            # Worker counts, buffer sizes and thresholds not given explicitly follow the container's resources
+            probe = await asyncio.to_thread(probe_system, os.path.join(os.getcwd(), 'apify_storage'))
+            profile = derive_profile(probe, actor_input.get('performance_profile', 'balanced'))
+            logger.info(
+                f"⚙️ Performance profile '{profile.name}' for {probe.cpus:g} CPU(s), "
+                f"{probe.memory_limit // 1024 // 1024:,} MB memory, disk writes at "
+                f"{probe.disk_write_bytes_per_sec / 1024 / 1024:,.0f} MB/s: {json.dumps(profile._asdict())}")
+            
             # Process options with defaults
             extract_to_memory = actor_input.get('extract_to_memory', False)
             keep_zip = actor_input.get('keep_zip', False)
             password = actor_input.get('password')
+            # Candidates tried after `password`; the result reports which one fit, by position
+            passwords = [p for p in actor_input.get('passwords') or [] if isinstance(p, str) and p]
             handle_duplicates = actor_input.get('handle_duplicates', 'rename')
+            # Accepts ".pdf,.csv" as well as "pdf,csv"
+            file_types = [
+                f".{ext.strip().lstrip('.').lower()}"
+                for ext in (actor_input.get('file_type_filter') or '').split(',')
+                if ext.strip().lstrip('.')
+            ]
             timeout = actor_input.get('timeout', 300)
+            in_memory_threshold_mb = actor_input.get('in_memory_threshold_mb')
+            in_memory_threshold = profile.in_memory_threshold if in_memory_threshold_mb is None else in_memory_threshold_mb * 1024 * 1024
+            max_compression_ratio = actor_input.get('max_compression_ratio', 1000)
+            max_nesting_depth = actor_input.get('max_nesting_depth', 0)
+            retry_failed_downloads = actor_input.get('retry_failed_downloads', 3)
+            concurrent_downloads = max(1, actor_input.get('concurrent_downloads') or profile.concurrent_downloads)
+            # Adaptive: `concurrent_downloads` is where the controller starts, not a fixed value
+            adaptive_concurrency = actor_input.get('adaptive_concurrency', True)
+            max_concurrent_downloads = max(
+                concurrent_downloads, actor_input.get('max_concurrent_downloads') or profile.max_concurrent_downloads)
+            # Explicit inputs override the profile (which then reports what is actually used)
+            profile = profile._replace(
+                concurrent_downloads=concurrent_downloads,
+                max_concurrent_downloads=max_concurrent_downloads,
+                in_memory_threshold=in_memory_threshold,
+                connections=max(profile.connections, 2 * max_concurrent_downloads),
+            )
+            concurrency = AdaptiveConcurrency(
+                initial=concurrent_downloads,
+                maximum=max_concurrent_downloads,
+                host_maximum=max(1, actor_input.get('max_downloads_per_host', 6)),
+                adaptive=adaptive_concurrency,
+            )
+            # Opt-in span tracing, saved to the key-value store at the end of the run
+            tracer = Tracer(enabled=actor_input.get('enable_tracing', False))
+            trace_format = actor_input.get('trace_format', 'chrome')
+            if trace_format not in TRACE_FORMATS:
+                trace_format = 'chrome'
+                logger.warning(f"Invalid trace_format value, using default: {trace_format}")
+            timeouts = TransferTimeouts(
+                connect=actor_input.get('connect_timeout', 15),
+                first_byte=timeout,
+                read_stall=actor_input.get('read_stall_timeout', 30),
+                min_throughput=actor_input.get('min_throughput_kbps', 1) * 1024,
+            )
             
             # Validate handle_duplicates option
             if handle_duplicates not in ['rename', 'skip', 'overwrite']:
                 handle_duplicates = 'rename'
                 logger.warning(f"Invalid handle_duplicates value, using default: {handle_duplicates}")
+            # The same for every URL of the run
+            extraction = ExtractionOptions(
+                handle_duplicates=handle_duplicates,
+                file_types=file_types,
+                password=password,
+                passwords=passwords,
+                max_compression_ratio=max_compression_ratio,
+                max_depth=max_nesting_depth,
+            )
+            
+            # Proxy pool (Apify Proxy sessions or custom proxy URLs)
+            proxy_pool = None
+            if actor_input.get('enable_proxy', False):
+                proxy_pool = await create_proxy_pool(Actor, actor_input.get('proxy_configuration'))
+                if proxy_pool:
+                    logger.info(f"Using {len(proxy_pool)} proxies for downloads")
+                else:
+                    logger.warning("Proxy enabled but no proxy configuration available, downloading directly")
             
             # Create processor
-            processor = ZipDownloadExtractor(Actor)
+            processor = ZipDownloadExtractor(
+                Actor,
+                retry_policy=RetryPolicy(max_retries=retry_failed_downloads),
+                timeouts=timeouts,
+                bandwidth=BandwidthLimiter(
+                    global_rate=actor_input.get('max_bandwidth_mbps', 0) * 125_000,
+                    host_rate=actor_input.get('max_host_bandwidth_mbps', 0) * 125_000,
+                ),
+                proxy_pool=proxy_pool,
+                tmpfs_staging=actor_input.get('tmpfs_staging', False),
+                # 0: the free space at start, minus some headroom
+                disk_budget=DiskBudget(
+                    os.path.join(os.getcwd(), 'apify_storage'),
+                    capacity=actor_input.get('disk_budget_mb', 0) * 1024 * 1024,
+                ),
+                memory_governor=MemoryGovernor(
+                    concurrency=max_concurrent_downloads if adaptive_concurrency else concurrent_downloads,
+                    extraction_concurrency=profile.extraction_workers,
+                ),
+                concurrency=concurrency,
+                profile=profile,
+                tracer=tracer,
+            )
+            # The platform's own memory measurements, next to the governor's samples
+            Actor.on(Event.SYSTEM_INFO, processor.memory.on_system_info)
             
-            # Process each URL
-            results = []
+            # A fixed pool of workers takes the URLs in order; each job is admitted while memory
+            # allows, and its transfers then wait for a download slot
             start_time = datetime.now()
             
-            for idx, url in enumerate(urls, 1):
-                logger.info(f"Processing URL {idx}/{len(urls)}: {url}")
-                
-                result = await processor.process_zip(
-                    url=url,
-                    extract_to_memory=extract_to_memory,
-                    keep_zip=keep_zip,
-                    password=password,
-                    handle_duplicates=handle_duplicates,
-                    timeout=timeout,
-                )
-                results.append(result)
-                await Actor.push_data(result)
+            async def process_url(idx: int, url: str) -> Dict:
+                async with processor.memory.downloads:
+                    with tracer.track(url):
+                        logger.info(f"Processing URL {idx}/{len(urls)}: {url}")
+                        options = url_options.get(url, {})
+                        result = await processor.process_zip(
+                            url=url,
+                            extract_to_memory=extract_to_memory,
+                            keep_zip=keep_zip,
+                            timeout=timeout,
+                            mirrors=options.get('mirrors'),
+                            weight=options.get('weight', 1.0),
+                            in_memory_threshold=in_memory_threshold,
+                            sha256=options.get('sha256'),
+                            extraction=extraction,
+                        )
+                        with tracer.span('push_data', 'dataset'):
+                            await Actor.push_data(result)
+                        return result
             
+            pending: asyncio.Queue = asyncio.Queue()
+            for item in enumerate(urls, 1):
+                pending.put_nowait(item)
+            results: List[Optional[Dict]] = [None] * len(urls)
+            
+            async def worker():
+                while not pending.empty():
+                    idx, url = pending.get_nowait()
+                    results[idx - 1] = await process_url(idx, url)
+            
+            # No more workers than jobs can run at once
+            workers = min(len(urls), processor.memory.downloads.maximum)
+            await asyncio.gather(*(worker() for _ in range(workers)))
+            await processor.close()
             end_time = datetime.now()
             
             # Push comprehensive summary
@@ -426,6 +1792,16 @@ async def main():
                 'total_skipped_files': processor.stats['skipped_files'],
                 'total_corrupted_files': processor.stats['corrupted_files'],
                 'total_errors': len(processor.stats['errors']),
+                'hedged_downloads': processor.stats['hedged_downloads'],
+                'errors_by_type': processor.stats['error_types'],
+                'bandwidth': processor.bandwidth.report(),
+                'concurrency': processor.concurrency.report(),
+                'tuning': profile_report(probe, profile),
+                'disk_budget': processor.disk_budget.report(),
+                'memory': processor.memory.report(),
+                'proxies': proxy_pool.report() if proxy_pool else [],
+                'metrics': processor.metrics.report(),
+                'tracing': tracer.report(),
                 'errors': processor.stats['errors'][:10],  # Limit to 10 most recent errors
                 'processing_duration_seconds': round((end_time - start_time).total_seconds(), 2),
                 'results': results,
@@ -433,7 +1809,16 @@ async def main():
             }
             
             logger.info(f"Final summary: {json.dumps(summary, indent=2)}")
-            await Actor.push_data(summary)
+            with tracer.span('push_data', 'dataset', report_type='summary'):
+                await Actor.push_data(summary)
+            
+            if tracer.enabled:
+                if trace_format == 'jsonl':
+                    await Actor.set_value('TRACE', tracer.jsonl(), content_type='text/plain; charset=utf-8')
+                else:
+                    await Actor.set_value('TRACE', tracer.chrome_trace(), content_type='application/json')
+                logger.info(f"🔍 Saved {len(tracer.events):,} trace spans to the key-value store as TRACE "
+                            f"({trace_format}; open Chrome traces in https://ui.perfetto.dev)")
         
         except Exception as e:
             logger.error(f"Critical error in main: {str(e)}", exc_info=True)
@@ -0,0 +1,219 @@
+import contextlib
+import contextvars
+import itertools
+import resource
+import time
+from typing import Dict, Iterator, List, Optional
+
+import aiohttp
+
+from .tracing import Tracer
+
+# Phases of a job, in the order they run. DNS and connect happen during (and are included in) download;
+# "queued" is time spent waiting for disk budget or an extraction slot.
+PHASES = ('dns', 'connect', 'download', 'validation', 'queued', 'extraction', 'manifest', 'cleanup')
+PERCENTILES = (50, 90, 95, 99)
+
+_current_job: contextvars.ContextVar[Optional['JobMetrics']] = contextvars.ContextVar('job_metrics', default=None)
+_NO_TRACER = Tracer()
+_job_ids = itertools.count(1)
+
+
+def resource_usage() -> Dict[str, Optional[float]]:
+    """CPU time, peak RSS and storage I/O of this process so far (I/O is None where /proc/self/io is unreadable)."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    io_counters = {}
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                io_counters[name] = int(value)
+    except (OSError, ValueError):
+        pass
+    return {
+        'cpu_user_seconds': usage.ru_utime,
+        'cpu_system_seconds': usage.ru_stime,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_bytes': usage.ru_maxrss * 1024,
+        'disk_read_bytes': io_counters.get('read_bytes'),
+        'disk_write_bytes': io_counters.get('write_bytes'),
+    }
+
+
+def _usage_delta(start: Dict, end: Dict) -> Dict:
+    delta = {}
+    for key, value in end.items():
+        if key == 'peak_rss_bytes' or value is None or start.get(key) is None:
+            delta[key] = value
+        elif isinstance(value, float):
+            delta[key] = round(value - start[key], 3)
+        else:
+            delta[key] = value - start[key]
+    return delta
+
+
+def percentiles(values: List[float]) -> Dict:
+    """Count, mean, percentiles (linear interpolation) and maximum of `values`."""
+    ordered = sorted(values)
+    stats = {'count': len(ordered)}
+    if not ordered:
+        return stats
+    stats['mean'] = round(sum(ordered) / len(ordered), 3)
+    for p in PERCENTILES:
+        rank = (len(ordered) - 1) * p / 100
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        stats[f'p{p}'] = round(ordered[low] + (ordered[high] - ordered[low]) * (rank - low), 3)
+    stats['max'] = round(ordered[-1], 3)
+    return stats
+
+
+class JobMetrics:
+    """Timings, throughput and resource usage of one job.
+
+    Phases are timed with `phase()`; a nested phase is not counted in its enclosing one. With an
+    enabled `tracer`, every phase, DNS lookup and connection setup is also recorded as a span.
+    CPU time and disk I/O are the process's during the job, so concurrent jobs share them;
+    peak RSS is the process's high-water mark when the job finished.
+    """
+
+    def __init__(self, tracer: Optional[Tracer] = None):
+        self.id = next(_job_ids)
+        self.tracer = tracer or _NO_TRACER
+        self.phases: Dict[str, float] = {}
+        self.bytes_downloaded = 0
+        self.bytes_extracted = 0
+        self.files_extracted = 0
+        # Entries of this job's archives left out, and those that failed their integrity check
+        self.skipped_files = 0
+        self.corrupted_files = 0
+        self.total_seconds = 0.0
+        self.resources: Dict = {}
+        self._started = time.perf_counter()
+        self._usage = resource_usage()
+        self._nested: List[float] = []
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + max(0.0, seconds)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            with self.tracer.span(name, 'phase'):
+                yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.add(name, elapsed - self._nested.pop())
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self._started
+        self.resources = _usage_delta(self._usage, resource_usage())
+
+    def rates(self) -> Dict[str, Optional[float]]:
+        download = self.phases.get('download')
+        extraction = self.phases.get('extraction')
+        return {
+            'download_bytes_per_sec': round(self.bytes_downloaded / download) if download else None,
+            'extraction_bytes_per_sec': round(self.bytes_extracted / extraction) if extraction else None,
+            'extraction_files_per_sec': round(self.files_extracted / extraction, 2) if extraction else None,
+        }
+
+    def report(self) -> Dict:
+        return {
+            'total_seconds': round(self.total_seconds, 3),
+            'phases_seconds': {name: round(self.phases[name], 3) for name in PHASES if name in self.phases},
+            'bytes_downloaded': self.bytes_downloaded,
+            'bytes_extracted': self.bytes_extracted,
+            'files_extracted': self.files_extracted,
+            **self.rates(),
+            **self.resources,
+        }
+
+
+@contextlib.contextmanager
+def track_job(metrics: JobMetrics) -> Iterator[JobMetrics]:
+    """Make `metrics` the current job's for the block (and for the tasks and threads it starts)."""
+    token = _current_job.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_job.reset(token)
+
+
+def current_job() -> JobMetrics:
+    """Metrics of the job being processed; a detached instance outside of one."""
+    return _current_job.get() or JobMetrics()
+
+
+def current_job_id() -> int:
+    """Id of the job being processed; 0 outside of one."""
+    job = _current_job.get()
+    return job.id if job is not None else 0
+
+
+async def _on_dns_start(session, context, params):
+    context.dns_started = time.perf_counter()
+
+
+async def _on_dns_end(session, context, params):
+    elapsed = time.perf_counter() - context.dns_started
+    context.dns_seconds = getattr(context, 'dns_seconds', 0.0) + elapsed
+    job = current_job()
+    job.add('dns', elapsed)
+    job.tracer.complete('dns', 'network', context.dns_started, elapsed, host=params.host)
+
+
+async def _on_connect_start(session, context, params):
+    context.connect_started = time.perf_counter()
+    context.dns_seconds = 0.0
+
+
+async def _on_connect_end(session, context, params):
+    # Connection setup resolves the host first; that part is reported as DNS
+    elapsed = time.perf_counter() - context.connect_started
+    job = current_job()
+    job.add('connect', elapsed - context.dns_seconds)
+    job.tracer.complete('connect', 'network', context.connect_started, elapsed)
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """Request tracing that charges DNS resolution and connection setup to the current job."""
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(_on_dns_start)
+    config.on_dns_resolvehost_end.append(_on_dns_end)
+    config.on_connection_create_start.append(_on_connect_start)
+    config.on_connection_create_end.append(_on_connect_end)
+    return config
+
+
+class RunMetrics:
+    """Per-job metrics of the run, aggregated into percentiles for the summary."""
+
+    def __init__(self):
+        self.jobs: List[JobMetrics] = []
+        self._usage = resource_usage()
+
+    def add(self, job: JobMetrics):
+        self.jobs.append(job)
+
+    def report(self) -> Dict:
+        phases = {
+            name: percentiles([job.phases[name] for job in self.jobs if name in job.phases])
+            for name in PHASES
+            if any(name in job.phases for job in self.jobs)
+        }
+        rates = [job.rates() for job in self.jobs]
+        return {
+            'jobs': len(self.jobs),
+            'total_seconds': percentiles([job.total_seconds for job in self.jobs]),
+            'phases_seconds': phases,
+            **{
+                key: percentiles([rate[key] for rate in rates if rate[key] is not None])
+                for key in ('download_bytes_per_sec', 'extraction_bytes_per_sec', 'extraction_files_per_sec')
+            },
+            'resources': _usage_delta(self._usage, resource_usage()),
+        }
@@ -0,0 +1,136 @@
+import statistics
+import time
+from collections import deque
+from typing import BinaryIO, Callable, Deque, Dict, List, Optional
+from urllib.parse import urlparse
+
+from .checksum import StreamingHasher
+from .tarstream import ArchiveStream
+from .writer import MemorySink
+
+
+class DownloadCandidate:
+    """One URL an archive can be fetched from, with its resume state and live progress."""
+
+    def __init__(self, url: str, path: str):
+        self.url = url
+        self.host = urlparse(url).netloc
+        self.path = path
+        self.weight = 1.0
+        # Resume state carried across attempts
+        self.validator: Optional[str] = None
+        self.resumable = False
+        self.expected_total = 0
+        # Length of the valid prefix of a single-stream download (the file may be preallocated)
+        self.resume_offset = 0
+        # Small bodies go to an in-memory sink instead of `path` (0: never)
+        self.memory_limit = 0
+        self.sink: Optional[MemorySink] = None
+        # Disk budget held for the body, under the key of the job (its output path)
+        self.budget_key = path
+        self.reserved = 0
+        # Consumer of sequential archives (tar family), which are then extracted while they download
+        self.stream_extract: Optional[Callable[[str, BinaryIO, List[str]], bool]] = None
+        self.archive_stream: Optional[ArchiveStream] = None
+        # Digests the body must match (hashlib name -> hex) and the hasher of the current body
+        self.expected_digests: Dict[str, str] = {}
+        self.hasher: Optional[StreamingHasher] = None
+        # [next_pos, end) byte ranges of an unfinished segmented download
+        self.segments: Optional[List[List[int]]] = None
+        # Cleared once the server answers a segment's range request with something else
+        self.segmentable = True
+        # Progress of the attempt currently running
+        self.started_at = 0.0
+        self.first_byte_at: Optional[float] = None
+        self.bytes_received = 0
+        self.downloaded = 0
+        # Last 10% step pushed as a progress record
+        self.reported_progress = -1
+
+    def start_attempt(self):
+        self.started_at = time.monotonic()
+        self.first_byte_at = None
+        self.bytes_received = 0
+
+    def throughput(self, now: float) -> float:
+        """Average body throughput of the current attempt in bytes/s."""
+        if self.first_byte_at is None:
+            return 0.0
+        return self.bytes_received / max(now - self.first_byte_at, 1e-6)
+
+
+class HedgePolicy:
+    """Ranks mirrors by observed latency/throughput and decides when to launch a hedge request.
+
+    A hedge is started on the next mirror when the running request has not produced its first
+    byte within the `first_byte_percentile` of latencies seen so far in the run, or when its
+    throughput stays below `min_throughput` for `throughput_window` seconds.
+    """
+
+    def __init__(
+        self,
+        first_byte_percentile: float = 0.95,
+        default_first_byte_delay: float = 2.0,
+        min_throughput: float = 256 * 1024,
+        throughput_window: float = 5.0,
+        max_parallel: int = 2,
+        history: int = 200
+    ):
+        self.first_byte_percentile = first_byte_percentile
+        self.default_first_byte_delay = default_first_byte_delay
+        self.min_throughput = min_throughput
+        self.throughput_window = throughput_window
+        self.max_parallel = max_parallel
+        self.first_byte_latencies: Deque[float] = deque(maxlen=history)
+        self.host_latency: Dict[str, Deque[float]] = {}
+        self.host_throughput: Dict[str, Deque[float]] = {}
+
+    def record_first_byte(self, host: str, seconds: float):
+        self.first_byte_latencies.append(seconds)
+        self.host_latency.setdefault(host, deque(maxlen=20)).append(seconds)
+
+    def record_throughput(self, host: str, bytes_per_second: float):
+        self.host_throughput.setdefault(host, deque(maxlen=20)).append(bytes_per_second)
+
+    def hedge_delay(self) -> float:
+        """First-byte latency after which a request is considered slow."""
+        if len(self.first_byte_latencies) < 10:
+            return self.default_first_byte_delay
+        ordered = sorted(self.first_byte_latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.first_byte_percentile))
+        return max(ordered[index], 0.05)
+
+    def rank(self, candidates: List[DownloadCandidate]) -> List[DownloadCandidate]:
+        """Order candidates best first by estimated fetch time; ties keep the input order."""
+        estimates = {}
+        for candidate in candidates:
+            latency = self.host_latency.get(candidate.host)
+            throughput = self.host_throughput.get(candidate.host)
+            if not latency and not throughput:
+                continue
+            # Estimated time to move 8 MB: first-byte latency plus transfer time
+            estimate = statistics.median(latency) if latency else self.default_first_byte_delay
+            if throughput:
+                estimate += 8 * 1024 * 1024 / max(statistics.median(throughput), 1.0)
+            estimates[candidate.host] = estimate
+        # Hosts without history are assumed to be average
+        neutral = statistics.median(estimates.values()) if estimates else 0.0
+        order = sorted(
+            range(len(candidates)),
+            key=lambda i: (estimates.get(candidates[i].host, neutral), i),
+        )
+        return [candidates[i] for i in order]
+
+    def should_hedge(self, running: List[DownloadCandidate], now: float) -> bool:
+        """True if none of the running requests is making acceptable progress."""
+        if len(running) >= self.max_parallel:
+            return False
+        for candidate in running:
+            if candidate.first_byte_at is None:
+                if now - candidate.started_at < self.hedge_delay():
+                    return False
+            elif now - candidate.first_byte_at < self.throughput_window:
+                return False
+            elif candidate.throughput(now) >= self.min_throughput:
+                return False
+        return True
@@ -0,0 +1,138 @@
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Exceptions that point at the proxy rather than at the target host
+PROXY_EXCEPTIONS = (aiohttp.ClientProxyConnectionError, aiohttp.ClientHttpProxyError)
+
+
+class ProxyEndpoint:
+    """One proxy with its own pooled connector and observed health."""
+
+    def __init__(self, url: str, connections: int = 10, smoothing: float = 0.3):
+        self.url = url
+        self.smoothing = smoothing
+        self.connections = connections
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Exponentially weighted throughput (bytes/s) and error rate (0..1)
+        self.throughput: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.bytes = 0
+        # Hosts that answered 403/429 through this proxy, with the time they may be retried
+        self.blocked_until: Dict[str, float] = {}
+
+    @property
+    def label(self) -> str:
+        """Proxy URL without credentials, safe for logs and results."""
+        parsed = urlparse(self.url)
+        return f"{parsed.scheme}://{parsed.hostname}:{parsed.port}" if parsed.port else f"{parsed.scheme}://{parsed.hostname}"
+
+    def get_session(self, timeout: aiohttp.ClientTimeout, trace_configs: Optional[List] = None) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(ssl=True, limit=self.connections)
+            self.session = aiohttp.ClientSession(timeout=timeout, connector=connector, trace_configs=trace_configs)
+        return self.session
+
+    def is_available(self, host: str, now: float) -> bool:
+        return self.blocked_until.get(host, 0.0) <= now
+
+    def score(self) -> float:
+        """Higher is better; untried proxies get an optimistic score so they are explored."""
+        throughput = self.throughput if self.throughput is not None else 10 * 1024 * 1024
+        return max(throughput * (1.0 - self.error_rate), 1.0)
+
+    def record_success(self, nbytes: int, seconds: float):
+        self.requests += 1
+        self.bytes += nbytes
+        self.error_rate *= 1 - self.smoothing
+        if nbytes and seconds > 0:
+            rate = nbytes / seconds
+            self.throughput = rate if self.throughput is None else (
+                self.smoothing * rate + (1 - self.smoothing) * self.throughput)
+
+    def record_failure(self):
+        self.requests += 1
+        self.error_rate = self.smoothing + (1 - self.smoothing) * self.error_rate
+
+
+class ProxyPool:
+    """Pool of proxies scored by throughput and error rate, rotated away from blocking hosts."""
+
+    def __init__(
+        self,
+        proxy_urls: List[str],
+        connections_per_proxy: int = 10,
+        block_cooldown: float = 120.0,
+        max_segments: int = 4,
+        min_segment_size: int = 8 * 1024 * 1024
+    ):
+        self.endpoints = [ProxyEndpoint(url, connections_per_proxy) for url in dict.fromkeys(proxy_urls)]
+        self.block_cooldown = block_cooldown
+        # Large range-capable downloads are split into segments fetched through different proxies
+        self.max_segments = max_segments
+        self.min_segment_size = min_segment_size
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def available(self, host: str) -> List[ProxyEndpoint]:
+        now = time.monotonic()
+        return [endpoint for endpoint in self.endpoints if endpoint.is_available(host, now)]
+
+    def select(self, host: str, exclude: Tuple[ProxyEndpoint, ...] = ()) -> Optional[ProxyEndpoint]:
+        """Pick a proxy for `host`, weighted by score, preferring ones not in `exclude`."""
+        candidates = self.available(host)
+        if not candidates:
+            # Everything is cooling down for this host: use the one that recovers first
+            candidates = sorted(self.endpoints, key=lambda e: e.blocked_until.get(host, 0.0))[:1]
+        preferred = [endpoint for endpoint in candidates if endpoint not in exclude]
+        candidates = preferred or candidates
+        if not candidates:
+            return None
+        return random.choices(candidates, weights=[endpoint.score() for endpoint in candidates])[0]
+
+    def record_blocked(self, endpoint: ProxyEndpoint, host: str):
+        """The host refused this proxy (403/429): rotate away from it for a while."""
+        endpoint.record_failure()
+        endpoint.blocked_until[host] = time.monotonic() + self.block_cooldown
+        logger.warning(f"Proxy {endpoint.label} blocked by {host}, rotating for {self.block_cooldown:.0f}s")
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            if endpoint.session is not None and not endpoint.session.closed:
+                await endpoint.session.close()
+
+    def report(self) -> List[Dict]:
+        return [
+            {
+                'proxy': endpoint.label,
+                'requests': endpoint.requests,
+                'bytes': endpoint.bytes,
+                'throughput_bytes_per_sec': round(endpoint.throughput or 0),
+                'error_rate': round(endpoint.error_rate, 3),
+            }
+            for endpoint in self.endpoints
+        ]
+
+
+async def create_proxy_pool(actor, proxy_input: Optional[Dict], pool_size: int = 10) -> Optional[ProxyPool]:
+    """Build a pool from the Actor proxy input (Apify Proxy sessions or custom `proxyUrls`)."""
+    proxy_input = proxy_input or {}
+    proxy_urls = [url for url in proxy_input.get('proxyUrls') or [] if isinstance(url, str) and url.strip()]
+    if proxy_urls and not proxy_input.get('useApifyProxy'):
+        # Plain proxy list, also handy for local testing without Apify Proxy access
+        return ProxyPool([url.strip() for url in proxy_urls])
+
+    configuration = await actor.create_proxy_configuration(actor_proxy_input=proxy_input)
+    if configuration is None:
+        return None
+    # Distinct session IDs map to distinct upstream IPs
+    urls = [await configuration.new_url(session_id=f"zip_{idx}") for idx in range(pool_size)]
+    return ProxyPool([url for url in urls if url])
@@ -0,0 +1,200 @@
+import asyncio
+import errno
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import aiohttp
+
+
+class ErrorType:
+    """Error categories reported in the `error_type` field of each result."""
+
+    TRANSIENT_NETWORK = 'transient_network'
+    TIMEOUT = 'timeout'
+    SERVER_ERROR = 'server_error'
+    RATE_LIMITED = 'rate_limited'
+    CLIENT_ERROR = 'client_error'
+    NOT_A_ZIP = 'not_a_zip'
+    CHECKSUM_MISMATCH = 'checksum_mismatch'
+    CIRCUIT_OPEN = 'circuit_open'
+    PROXY_BLOCKED = 'proxy_blocked'
+    PROXY_ERROR = 'proxy_error'
+    IO_ERROR = 'io_error'
+    INSUFFICIENT_DISK = 'insufficient_disk'
+    BAD_ZIP = 'bad_zip'
+    BAD_PASSWORD = 'bad_password'
+    ZIP_BOMB = 'zip_bomb'
+    SIZE_LIMIT = 'size_limit_exceeded'
+    PERMISSION_DENIED = 'permission_denied'
+    EXTRACTION_ERROR = 'extraction_error'
+    UNKNOWN = 'unknown'
+
+
+# Errors worth another attempt: the same request may well succeed later
+RETRYABLE_ERRORS = frozenset({
+    ErrorType.TRANSIENT_NETWORK,
+    ErrorType.TIMEOUT,
+    ErrorType.SERVER_ERROR,
+    ErrorType.RATE_LIMITED,
+    ErrorType.PROXY_BLOCKED,
+    ErrorType.PROXY_ERROR,
+    ErrorType.UNKNOWN,
+})
+
+# Errors that say something about the health of the host (feed the circuit breaker)
+HOST_FAILURES = frozenset({
+    ErrorType.TRANSIENT_NETWORK,
+    ErrorType.TIMEOUT,
+    ErrorType.SERVER_ERROR,
+    ErrorType.RATE_LIMITED,
+})
+
+
+class DownloadError(Exception):
+    """Download failure with an error category and optional server-provided retry delay."""
+
+    def __init__(self, error_type: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.retry_after = retry_after
+
+
+class InsufficientDiskError(OSError):
+    """Not enough free space to store a download or an extracted file."""
+
+
+# errno values meaning the disk (or the quota on it) is full
+DISK_FULL_ERRNOS = frozenset({errno.ENOSPC, errno.EDQUOT, errno.EFBIG})
+
+
+def is_disk_full(exc: BaseException) -> bool:
+    return isinstance(exc, InsufficientDiskError) or (
+        isinstance(exc, OSError) and exc.errno in DISK_FULL_ERRNOS)
+
+
+def classify_status(status: int) -> str:
+    """Map a non-200 HTTP status to an error category."""
+    if status == 429:
+        return ErrorType.RATE_LIMITED
+    if status in (408, 425):
+        return ErrorType.TRANSIENT_NETWORK
+    if status >= 500:
+        return ErrorType.SERVER_ERROR
+    return ErrorType.CLIENT_ERROR
+
+
+def classify_exception(exc: BaseException) -> str:
+    """Map an exception raised while downloading to an error category."""
+    if isinstance(exc, DownloadError):
+        return exc.error_type
+    if isinstance(exc, asyncio.TimeoutError):
+        return ErrorType.TIMEOUT
+    if isinstance(exc, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)):
+        return ErrorType.TRANSIENT_NETWORK
+    if isinstance(exc, aiohttp.InvalidURL):
+        return ErrorType.CLIENT_ERROR
+    if is_disk_full(exc):
+        return ErrorType.INSUFFICIENT_DISK
+    if isinstance(exc, OSError):
+        return ErrorType.IO_ERROR
+    return ErrorType.UNKNOWN
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a `Retry-After` header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Decides whether and when a failed download is retried (full-jitter exponential backoff)."""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        max_retry_after: float = 300.0
+    ):
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, error_type: str, attempt: int, max_retries: Optional[int] = None) -> bool:
+        """Return True if another attempt is allowed after `attempt` (0-based) failed."""
+        limit = self.max_retries if max_retries is None else max_retries
+        return error_type in RETRYABLE_ERRORS and attempt < limit
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before the next attempt; a server `Retry-After` takes precedence."""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker: stops sending requests to a host that keeps failing.
+
+    Once `reset_timeout` has passed, the circuit half-opens and lets a single probe through;
+    other callers are refused until the probe's outcome is recorded. A probe that is released
+    without an outcome, or outstanding for longer than `probe_timeout`, makes way for another.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, probe_timeout: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent to the host right now."""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self.probe_started = None
+        if self.state == self.HALF_OPEN:
+            if self.probe_started is not None and now - self.probe_started < self.probe_timeout:
+                return False
+            # This caller is the probe; its outcome closes or re-opens the circuit
+            self.probe_started = now
+        return True
+
+    def release_probe(self):
+        """Give up the probe without an outcome (it was cancelled or never sent)."""
+        if self.state == self.HALF_OPEN:
+            self.probe_started = None
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.probe_started = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_started = None
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
@@ -0,0 +1,107 @@
+from typing import BinaryIO, Optional
+
+import aiohttp
+
+# Local file header, empty archive (end of central directory) and split-archive marker
+ZIP_SIGNATURES = (b'PK\x03\x04', b'PK\x05\x06', b'PK\x07\x08')
+EOCD_SIGNATURE = b'PK\x05\x06'
+# End of central directory record plus the longest comment that may follow it
+EOCD_SEARCH_SIZE = 22 + 0xFFFF
+
+# Compressed streams (usually a tarball, possibly a single file)
+COMPRESSION_SIGNATURES = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bzip2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+)
+
+# Formats that are read strictly sequentially, so they can be extracted while downloading
+STREAM_FORMATS = ('tar', 'gzip', 'bzip2', 'xz')
+
+TAR_BLOCK_SIZE = 512
+
+# Content types that are never an archive, only an error or login page
+NON_ARCHIVE_CONTENT_TYPES = (
+    'text/html',
+    'application/xhtml+xml',
+    'application/json',
+    'application/problem+json',
+    'text/xml',
+    'application/xml',
+)
+
+# How HTML, XML and JSON documents start (after whitespace and a UTF-8 byte order mark)
+DOCUMENT_STARTS = (b'<', b'{', b'[')
+
+SNIFF_LIMIT = 1024
+
+
+async def read_head(content: aiohttp.StreamReader, size: int = 4) -> bytes:
+    """Read the first `size` bytes of a response body (fewer only at end of stream)."""
+    head = b''
+    while len(head) < size:
+        chunk = await content.read(size - len(head))
+        if not chunk:
+            break
+        head += chunk
+    return head
+
+
+def is_zip_signature(head: bytes) -> bool:
+    return head[:4] in ZIP_SIGNATURES
+
+
+def is_tar_header(block: bytes) -> bool:
+    """True if `block` is a tar header with a valid checksum (ustar, GNU and old v7 tars alike)."""
+    if len(block) < TAR_BLOCK_SIZE:
+        return False
+    field = block[148:156].replace(b'\0', b' ').strip()
+    try:
+        stored = int(field, 8)
+    except ValueError:
+        return False
+    # The checksum is computed with its own field read as spaces
+    return stored == sum(block[:148]) + 8 * ord(' ') + sum(block[156:TAR_BLOCK_SIZE])
+
+
+def detect_format(head: bytes) -> Optional[str]:
+    """Archive format from the first TAR_BLOCK_SIZE bytes of a body: `zip`, `tar`, `gzip`, `bzip2`, `xz` or None."""
+    if is_zip_signature(head):
+        return 'zip'
+    for signature, archive_format in COMPRESSION_SIGNATURES:
+        if head.startswith(signature):
+            return archive_format
+    if is_tar_header(head[:TAR_BLOCK_SIZE]):
+        return 'tar'
+    return None
+
+
+def looks_like_document(head: bytes) -> bool:
+    """True if a body without an archive signature is evidently a page or an API answer."""
+    return head.lstrip(b'\xef\xbb\xbf').lstrip().startswith(DOCUMENT_STARTS)
+
+
+def has_zip_directory(fileobj: BinaryIO) -> bool:
+    """True if the tail of `fileobj` holds an end-of-central-directory record.
+
+    Self-extracting ZIPs and ZIPs with prepended data start with something else (an
+    executable, a script) and are only recognizable from their end.
+    """
+    fileobj.seek(0, 2)
+    size = fileobj.tell()
+    fileobj.seek(max(0, size - EOCD_SEARCH_SIZE))
+    return EOCD_SIGNATURE in fileobj.read()
+
+
+def describe_non_archive(head: bytes, content_type: Optional[str]) -> str:
+    """Short description of a rejected body for the error message."""
+    preview = head[:80].decode('utf-8', errors='replace').strip()
+    preview = ' '.join(preview.split())
+    kind = content_type or 'unknown content type'
+    if not head:
+        return f"empty body ({kind})"
+    return f"{kind}, starts with {preview!r}"
+
+
+def is_non_archive_content_type(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.lower() in NON_ARCHIVE_CONTENT_TYPES
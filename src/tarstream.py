@@ -0,0 +1,153 @@
+import asyncio
+import bz2
+import contextvars
+import gzip
+import io
+import lzma
+import queue
+import threading
+from typing import BinaryIO, Callable, List, Optional
+
+from .checksum import StreamingHasher
+
+_EOF = object()
+_ABORT = object()
+
+
+def open_decompressed(archive_format: str, raw: BinaryIO) -> BinaryIO:
+    """Sequential reader of the decompressed content of a `gzip`, `bzip2`, `xz` or plain `tar` stream.
+
+    The stdlib readers inflate with a bounded output per call, so a bomb cannot balloon in memory.
+    """
+    if archive_format == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if archive_format == 'bzip2':
+        return bz2.BZ2File(raw)
+    if archive_format == 'xz':
+        return lzma.LZMAFile(raw)
+    return raw
+
+
+class ArchiveStreamError(Exception):
+    """The extraction fed by an ArchiveStream failed; the consumer has already recorded why."""
+
+
+class StreamAborted(Exception):
+    """Raised inside the consumer when the download feeding it is abandoned."""
+
+
+class ArchiveStream:
+    """Feeds an archive body, as it downloads, to a blocking consumer running in a worker thread.
+
+    Has the same `write`/`flush` interface as WriteStream, so it can take the place of a file in
+    the download loop. At most `max_in_flight` chunks wait for the consumer; further writes block,
+    which slows the download down to the extraction speed. `consume(fileobj, created)` reads the
+    raw body from `fileobj`, appends every file it writes to `created` and returns False on failure.
+    """
+
+    def __init__(
+        self,
+        consume: Callable[[BinaryIO, List[str]], bool],
+        hasher: Optional[StreamingHasher] = None,
+        max_in_flight: int = 16
+    ):
+        self.position = 0
+        self.hasher = hasher
+        self.created: List[str] = []
+        self._max_in_flight = max_in_flight
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._queue: queue.Queue = queue.Queue()
+        self._result = self._loop.create_future()
+        # The consumer runs in the context of the job that started it (for its metrics and trace spans)
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._run, consume), name='archive-stream', daemon=True)
+        self._thread.start()
+
+    async def write(self, data: bytes):
+        if not data:
+            return
+        if not self._result.done():
+            await self._slots.acquire()
+        if self._result.done():
+            # The consumer stopped early: failed, or done before trailing padding
+            self._check()
+        else:
+            self._queue.put(bytes(data))
+        if self.hasher is not None:
+            self.hasher.update(self.position, data)
+        self.position += len(data)
+
+    def flush(self):
+        pass
+
+    async def finish(self):
+        """Signal the end of the body and wait for the consumer; raises ArchiveStreamError if it failed."""
+        self._queue.put(_EOF)
+        await asyncio.shield(self._result)
+        self._check()
+
+    async def abort(self):
+        """Stop the consumer wherever it is and wait for its thread to exit."""
+        self._queue.put(_ABORT)
+        await asyncio.wait([self._result])
+
+    def _check(self):
+        if self._result.exception() is not None:
+            raise ArchiveStreamError(str(self._result.exception())) from self._result.exception()
+        if not self._result.result():
+            raise ArchiveStreamError("Extraction failed")
+
+    def _run(self, consume: Callable[[BinaryIO, List[str]], bool]):
+        error = None
+        ok = False
+        try:
+            ok = consume(_PipeReader(self._queue, self._release), self.created)
+        except StreamAborted:
+            pass
+        except BaseException as e:
+            error = e
+        self._loop.call_soon_threadsafe(self._done, ok, error)
+
+    def _release(self):
+        self._loop.call_soon_threadsafe(self._slots.release)
+
+    def _done(self, ok: bool, error: Optional[BaseException]):
+        if error is not None:
+            self._result.set_exception(error)
+        else:
+            self._result.set_result(ok)
+        # Wake up a producer waiting for a slot; it will see the result
+        for _ in range(self._max_in_flight):
+            self._slots.release()
+
+
+class _PipeReader(io.RawIOBase):
+    """Blocking file object over the chunks queued by an ArchiveStream (consumer side)."""
+
+    def __init__(self, chunks: queue.Queue, release: Callable[[], None]):
+        super().__init__()
+        self._chunks = chunks
+        self._release = release
+        self._pending = memoryview(b'')
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._pending:
+            if self._eof:
+                return 0
+            item = self._chunks.get()
+            if item is _ABORT:
+                raise StreamAborted()
+            if item is _EOF:
+                self._eof = True
+                return 0
+            self._release()
+            self._pending = memoryview(item)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
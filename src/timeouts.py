@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from .retry import DownloadError, ErrorType
+
+
+class TransferTimeouts:
+    """Timeout settings for one download attempt (all values in seconds, throughput in bytes/s)."""
+
+    def __init__(
+        self,
+        connect: float = 15.0,
+        first_byte: float = 300.0,
+        read_stall: float = 30.0,
+        min_throughput: float = 1024.0,
+        throughput_window: float = 30.0
+    ):
+        self.connect = connect
+        self.first_byte = first_byte
+        self.read_stall = read_stall
+        self.min_throughput = min_throughput
+        self.throughput_window = throughput_window
+
+
+class TransferWatchdog:
+    """Aborts a download that stops making progress instead of capping its total duration.
+
+    A small monitor task samples the byte counter once per `check_interval`; the read loop
+    only calls `progress()`, so a healthy transfer pays no per-chunk timer cost. Time spent
+    between `pause()` and `resume()` (waiting on our own back-pressure rather than on the
+    server) is left out of every timeout.
+    """
+
+    def __init__(
+        self,
+        timeouts: TransferTimeouts,
+        label: str,
+        first_byte: Optional[float] = None,
+        check_interval: float = 1.0
+    ):
+        self.timeouts = timeouts
+        self.label = label
+        self.first_byte = timeouts.first_byte if first_byte is None else first_byte
+        self.check_interval = check_interval
+        self.bytes_received = 0
+        self.reason: Optional[str] = None
+        self._active = False
+        self._task: Optional[asyncio.Task] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self._samples: Deque[Tuple[float, int]] = deque()
+        self._started = 0.0
+        self._first_byte_at: Optional[float] = None
+        self._last_progress = 0.0
+        # Nested pauses, when the outermost one started, and the total time spent paused
+        self._paused = 0
+        self._paused_at = 0.0
+        self._idle = 0.0
+
+    async def __aenter__(self) -> 'TransferWatchdog':
+        self._task = asyncio.current_task()
+        self._started = self._last_progress = self._clock()
+        self._active = True
+        self._monitor = asyncio.create_task(self._watch())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._active = False
+        self._monitor.cancel()
+        if self.reason and exc_type is asyncio.CancelledError:
+            # The cancellation came from us: turn it into a retryable timeout
+            self._task.uncancel()
+            raise DownloadError(ErrorType.TIMEOUT, self.reason) from None
+        return False
+
+    def _clock(self) -> float:
+        # Monotonic time without the pauses
+        return time.monotonic() - self._idle
+
+    def headers_received(self):
+        self._last_progress = self._clock()
+        if self._first_byte_at is None:
+            self._first_byte_at = self._last_progress
+
+    def progress(self, nbytes: int):
+        self.bytes_received += nbytes
+        self._last_progress = self._clock()
+
+    def pause(self):
+        """Stop the clocks while the transfer waits on this side (a full queue, the bandwidth cap)."""
+        if not self._paused:
+            self._paused_at = time.monotonic()
+        self._paused += 1
+
+    def resume(self):
+        self._paused -= 1
+        if not self._paused:
+            self._idle += time.monotonic() - self._paused_at
+
+    async def _watch(self):
+        while self._active:
+            await asyncio.sleep(self.check_interval)
+            if self._paused:
+                continue
+            reason = self._check(self._clock())
+            if reason and self._active:
+                self.reason = f"{reason} for {self.label}"
+                self._task.cancel()
+                return
+
+    def _check(self, now: float) -> Optional[str]:
+        if self._first_byte_at is None:
+            if now - self._started > self.first_byte:
+                return f"No response within {self.first_byte:.0f}s"
+            return None
+
+        if now - self._last_progress > self.timeouts.read_stall:
+            return f"Read stalled for {now - self._last_progress:.0f}s"
+
+        if self.timeouts.min_throughput <= 0:
+            return None
+
+        # Throughput floor over a sliding window, checked only once a full window has elapsed
+        self._samples.append((now, self.bytes_received))
+        while self._samples and now - self._samples[0][0] > self.timeouts.throughput_window:
+            self._samples.popleft()
+        if now - self._first_byte_at < self.timeouts.throughput_window or len(self._samples) < 2:
+            return None
+        oldest_time, oldest_bytes = self._samples[0]
+        rate = (self.bytes_received - oldest_bytes) / max(now - oldest_time, 1e-6)
+        if rate < self.timeouts.min_throughput:
+            return f"Throughput {rate:,.0f} B/s below floor {self.timeouts.min_throughput:,.0f} B/s"
+        return None
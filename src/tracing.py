@@ -0,0 +1,134 @@
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List
+
+TRACE_FORMATS = ('chrome', 'jsonl')
+# Recording stops here, so a run over millions of entries cannot exhaust memory with spans
+MAX_EVENTS = 200_000
+# One in this many per-entry spans is recorded
+ENTRY_SAMPLE_EVERY = 10
+# Tracks of worker threads are numbered from here, after those of jobs
+WORKER_TRACK_BASE = 10_000
+
+_current_track: contextvars.ContextVar[int] = contextvars.ContextVar('trace_track', default=0)
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """Records spans of the pipeline as Chrome trace events (loadable in Perfetto or chrome://tracing).
+
+    Every job has its own track, holding its phases, DNS lookups, connection setup and dataset
+    pushes; work done in extraction threads goes to one track per worker thread, with the job
+    in its arguments. Per-entry spans are sampled. A disabled tracer records nothing and its
+    spans cost a single attribute check.
+    """
+
+    def __init__(self, enabled: bool = False, sample_every: int = ENTRY_SAMPLE_EVERY, max_events: int = MAX_EVENTS):
+        self.enabled = enabled
+        self.sample_every = max(1, sample_every)
+        self.max_events = max_events
+        self.events: List[Dict] = []
+        self.dropped = 0
+        self._origin = time.perf_counter()
+        self._loop_thread = threading.get_ident()
+        self._track_ids = itertools.count(1)
+        self._workers: Dict[int, int] = {}
+        self._sampled = itertools.count()
+        self._lock = threading.Lock()
+        self._metadata: List[Dict] = [self._name_event('process_name', 0, 'zip-extractor'),
+                                      self._name_event('thread_name', 0, 'main')]
+
+    @staticmethod
+    def _name_event(kind: str, tid: int, name: str) -> Dict:
+        return {'name': kind, 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+
+    def _now(self) -> float:
+        # Microseconds since the tracer was created
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    def _tid(self) -> int:
+        """Track of the caller: its job's on the event loop, its own in a worker thread."""
+        ident = threading.get_ident()
+        if ident == self._loop_thread:
+            return _current_track.get()
+        worker = self._workers.get(ident)
+        if worker is None:
+            with self._lock:
+                worker = self._workers[ident] = WORKER_TRACK_BASE + len(self._workers)
+                self._metadata.append(self._name_event('thread_name', worker, f"worker {len(self._workers)}"))
+        return worker
+
+    @contextlib.contextmanager
+    def track(self, label: str) -> Iterator[int]:
+        """Give the block (and the tasks and threads it starts) a track of its own, named `label`."""
+        if not self.enabled:
+            yield 0
+            return
+        tid = next(self._track_ids)
+        self._metadata.append(self._name_event('thread_name', tid, f"job {tid}: {label}"))
+        token = _current_track.set(tid)
+        try:
+            yield tid
+        finally:
+            _current_track.reset(token)
+
+    def span(self, name: str, category: str, **args):
+        """Context manager recording the block as a span (does nothing when disabled)."""
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(name, category, args)
+
+    def sampled_span(self, name: str, category: str, **args):
+        """Like `span`, but only one call in `sample_every` is recorded."""
+        if not self.enabled or next(self._sampled) % self.sample_every:
+            return _NO_SPAN
+        return self._span(name, category, args)
+
+    @contextlib.contextmanager
+    def _span(self, name: str, category: str, args: Dict) -> Iterator[None]:
+        started = self._now()
+        try:
+            yield
+        finally:
+            self._record(name, category, started, self._now() - started, args)
+
+    def complete(self, name: str, category: str, started: float, seconds: float, **args):
+        """Record a span measured elsewhere (`started` from time.perf_counter())."""
+        if self.enabled:
+            self._record(name, category, (started - self._origin) * 1_000_000, seconds * 1_000_000, args)
+
+    def _record(self, name: str, category: str, ts: float, dur: float, args: Dict):
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        tid = self._tid()
+        if tid >= WORKER_TRACK_BASE:
+            args['job'] = _current_track.get()
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'X', 'ts': round(ts, 1), 'dur': round(max(0.0, dur), 1),
+            'pid': os.getpid(), 'tid': tid, 'args': args,
+        })
+
+    def chrome_trace(self) -> bytes:
+        """Trace event JSON of everything recorded."""
+        return json.dumps({
+            'traceEvents': self._metadata + self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'dropped_spans': self.dropped},
+        }, default=str).encode('utf-8')
+
+    def jsonl(self) -> bytes:
+        """One span per line (metadata lines name the tracks)."""
+        return ''.join(json.dumps(event, default=str) + '\n' for event in self._metadata + self.events).encode('utf-8')
+
+    def report(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'spans': len(self.events),
+            'dropped_spans': self.dropped,
+        }
@@ -0,0 +1,173 @@
+import math
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, NamedTuple
+
+from .governor import MB, detect_memory_limit
+
+PRESETS = ('balanced', 'throughput', 'memory', 'cost')
+# CPU quota files of cgroup v2 ("<quota> <period>" or "max <period>") and v1 (-1: unlimited)
+CGROUP_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+CGROUP_V1_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+CGROUP_V1_PERIOD = '/sys/fs/cgroup/cpu/cpu.cfs_period_us'
+# Size of the disk write microbenchmark (fsynced, then deleted)
+BENCHMARK_SIZE = 8 * MB
+# Below this write speed, keeping archives in memory saves more than it costs
+SLOW_DISK_BYTES_PER_SEC = 100 * MB
+MAX_IN_MEMORY_THRESHOLD = 256 * MB
+
+
+class SystemProbe(NamedTuple):
+    cpus: float
+    memory_limit: int
+    free_disk: int
+    disk_write_bytes_per_sec: float
+
+
+class TuningProfile(NamedTuple):
+    """Worker counts, buffer sizes and thresholds of a run (the defaults are the untuned values)."""
+    name: str = 'default'
+    concurrent_downloads: int = 3
+    max_concurrent_downloads: int = 16
+    extraction_workers: int = 3
+    password_workers: int = 8
+    # Initial network read size (it adapts to throughput from there)
+    read_chunk_size: int = 8192
+    # Size of the pooled write-behind buffers
+    write_buffer_size: int = 2 * MB
+    # Block size of the extraction copy loop
+    copy_buffer_size: int = 64 * 1024
+    # Connections of the shared HTTP session
+    connections: int = 10
+    in_memory_threshold: int = 64 * MB
+
+
+def cpu_quota() -> float:
+    """CPUs the container may use: the cgroup quota, else the CPUs this process may run on."""
+    cpus = float(len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1)
+    try:
+        with open(CGROUP_CPU_MAX) as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return min(cpus, int(quota) / int(period))
+        return cpus
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(CGROUP_V1_QUOTA) as f:
+            quota = int(f.read())
+        with open(CGROUP_V1_PERIOD) as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return min(cpus, quota / period)
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def disk_write_speed(path: str, size: int = BENCHMARK_SIZE) -> float:
+    """Bytes per second of a short fsynced sequential write into `path` (0 if it fails)."""
+    block = os.urandom(MB)
+    try:
+        fd, name = tempfile.mkstemp(prefix='disk-probe-', dir=path)
+    except OSError:
+        return 0.0
+    try:
+        started = time.perf_counter()
+        for _ in range(max(1, size // MB)):
+            os.write(fd, block)
+        os.fsync(fd)
+        return max(1, size // MB) * MB / max(time.perf_counter() - started, 1e-6)
+    except OSError:
+        return 0.0
+    finally:
+        os.close(fd)
+        os.remove(name)
+
+
+def probe_system(path: str) -> SystemProbe:
+    """Resources of the container, measured once at startup (takes a fraction of a second)."""
+    try:
+        os.makedirs(path, exist_ok=True)
+        free_disk = shutil.disk_usage(path).free
+    except OSError:
+        free_disk = 0
+    return SystemProbe(cpu_quota(), detect_memory_limit(), free_disk, disk_write_speed(path))
+
+
+def _clamp(value: float, low: int, high: int) -> int:
+    return int(max(low, min(high, value)))
+
+
+def derive_profile(probe: SystemProbe, preset: str = 'balanced') -> TuningProfile:
+    """Settings for the probed container under `preset`.
+
+    `balanced` gives a quarter of the memory to per-download buffers and in-memory archives,
+    `throughput` half of it with more and larger transfers, `memory` an eighth with small
+    buffers and everything on disk, and `cost` keeps parallelism to what the CPUs it pays for
+    can keep busy.
+    """
+    if preset not in PRESETS:
+        preset = 'balanced'
+    cpus = max(probe.cpus, 0.25)
+    memory = probe.memory_limit
+    share = {'throughput': 0.5, 'memory': 0.125}.get(preset, 0.25)
+
+    if preset == 'memory':
+        write_buffer = 256 * 1024
+    elif memory >= 4096 * MB and preset == 'throughput':
+        write_buffer = 4 * MB
+    elif memory >= 1024 * MB:
+        write_buffer = 2 * MB
+    else:
+        write_buffer = 512 * 1024
+
+    # A download holds up to 4 write buffers in flight plus one being filled
+    fits = int(memory * share // (write_buffer * 5))
+    per_cpu = {'throughput': 16, 'memory': 4, 'cost': 4}.get(preset, 8)
+    max_concurrent = _clamp(min(cpus * per_cpu, fits), 2, {'throughput': 64, 'memory': 8}.get(preset, 32))
+    concurrent = _clamp(cpus * (4 if preset == 'throughput' else 2), 1 if preset == 'memory' else 2, max_concurrent)
+
+    workers = math.ceil(cpus)
+    extraction_workers = {
+        'throughput': _clamp(workers + 1, 2, 16),
+        'memory': 1,
+        'cost': _clamp(int(cpus), 1, 8),
+    }.get(preset, _clamp(workers, 1, 8))
+
+    if preset == 'memory':
+        in_memory = 0
+    else:
+        in_memory = memory * share / max_concurrent
+        if 0 < probe.disk_write_bytes_per_sec < SLOW_DISK_BYTES_PER_SEC:
+            # A slow disk costs more time than RAM costs money
+            in_memory *= 2
+        in_memory = _clamp(in_memory // MB * MB, 0, MAX_IN_MEMORY_THRESHOLD)
+
+    return TuningProfile(
+        name=preset,
+        concurrent_downloads=concurrent,
+        max_concurrent_downloads=max_concurrent,
+        extraction_workers=extraction_workers,
+        password_workers=_clamp(workers * 2, 2, 4 if preset == 'memory' else 8),
+        read_chunk_size={'throughput': 256 * 1024, 'memory': 16 * 1024}.get(preset, 64 * 1024),
+        write_buffer_size=write_buffer,
+        copy_buffer_size={'throughput': MB, 'memory': 64 * 1024}.get(preset, 256 * 1024 if memory >= 1024 * MB else 64 * 1024),
+        connections=max_concurrent * 2,
+        in_memory_threshold=in_memory,
+    )
+
+
+def profile_report(probe: SystemProbe, profile: TuningProfile) -> Dict:
+    """The probe and the profile chosen from it, for the run summary."""
+    return {
+        'probe': {
+            'cpus': round(probe.cpus, 2),
+            'memory_limit_bytes': probe.memory_limit,
+            'free_disk_bytes': probe.free_disk,
+            'disk_write_bytes_per_sec': round(probe.disk_write_bytes_per_sec),
+        },
+        'profile': profile._asdict(),
+    }
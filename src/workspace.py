@@ -0,0 +1,116 @@
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# RAM-backed filesystem used to stage archives that are not kept
+TMPFS_DIR = '/dev/shm'
+# Archives are only staged on tmpfs while both it and the RAM behind it have this much room left
+TMPFS_MIN_FREE = 512 * 1024 * 1024
+
+
+class Workspace:
+    """Private directories of one job: where its archive is downloaded and where it is extracted."""
+
+    def __init__(self, root: str, filename: str, staging_root: Optional[str] = None):
+        self.root = root
+        self.staging_root = staging_root
+        self.archive_path = os.path.join(staging_root or root, filename)
+        self.extract_path = os.path.join(root, 'extracted')
+
+    @property
+    def staged(self) -> bool:
+        return self.staging_root is not None
+
+
+class WorkspaceManager:
+    """Hands out a unique workspace per job and deletes released ones in a background thread.
+
+    Jobs never share a directory, so concurrent extractions need no lock and cleaning up one
+    job cannot touch another's files. Deleting a large extraction tree can take a while; it is
+    queued to the cleanup thread so the job finishes (and the next one starts) right away.
+    """
+
+    def __init__(self, base_dir: str, tmpfs_dir: str = TMPFS_DIR, tmpfs_min_free: int = TMPFS_MIN_FREE):
+        self.base_dir = base_dir
+        self.tmpfs_dir = tmpfs_dir
+        self.tmpfs_min_free = tmpfs_min_free
+        self._trash: queue.Queue = queue.Queue()
+        self._cleaner = threading.Thread(target=self._clean, name='workspace-cleanup', daemon=True)
+        self._cleaner.start()
+
+    def create(self, filename: str, stage_archive: bool = False) -> Workspace:
+        """New workspace for a job downloading `filename`; the archive goes to tmpfs if staged and RAM allows."""
+        os.makedirs(self.base_dir, exist_ok=True)
+        prefix = f"{os.path.splitext(filename)[0][:40]}-"
+        root = tempfile.mkdtemp(prefix=prefix, dir=self.base_dir)
+        staging_root = None
+        if stage_archive and self._tmpfs_has_room():
+            staging_root = tempfile.mkdtemp(prefix=prefix, dir=self._tmpfs_base())
+        return Workspace(root, filename, staging_root)
+
+    def unstage(self, workspace: Workspace) -> Workspace:
+        """Move a job's archive from tmpfs back to its directory on disk (e.g. after tmpfs filled up)."""
+        if workspace.staging_root is not None:
+            self._trash.put(workspace.staging_root)
+        return Workspace(workspace.root, os.path.basename(workspace.archive_path))
+
+    def release(
+        self,
+        workspace: Workspace,
+        keep_archive: bool = False,
+        keep_extracted: bool = False,
+        on_deleted: Optional[Callable[[], None]] = None
+    ):
+        """Queue whatever the job does not keep for deletion; `on_deleted` is called from the cleanup thread once it is gone."""
+        if workspace.staging_root is not None:
+            self._trash.put(workspace.staging_root)
+        if keep_archive or keep_extracted:
+            if not keep_archive:
+                self._trash.put(workspace.archive_path)
+            if not keep_extracted:
+                self._trash.put(workspace.extract_path)
+        else:
+            self._trash.put(workspace.root)
+        if on_deleted is not None:
+            # Deletions run in order, so this comes after the job's own
+            self._trash.put(on_deleted)
+
+    def drain(self):
+        """Block until every queued deletion is done (before the run exits)."""
+        self._trash.join()
+
+    def _tmpfs_base(self) -> str:
+        path = os.path.join(self.tmpfs_dir, 'zip-extractor')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _tmpfs_has_room(self) -> bool:
+        try:
+            if shutil.disk_usage(self.tmpfs_dir).free < self.tmpfs_min_free:
+                return False
+            # tmpfs pages come out of RAM, which its size limit does not account for
+            available = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            return False
+        return available >= self.tmpfs_min_free and os.access(self.tmpfs_dir, os.W_OK)
+
+    def _clean(self):
+        while True:
+            item = self._trash.get()
+            try:
+                if callable(item):
+                    item()
+                elif os.path.isdir(item):
+                    shutil.rmtree(item, ignore_errors=True)
+                elif os.path.exists(item):
+                    os.remove(item)
+            except Exception as e:
+                logger.warning(f"Cleanup error: {str(e)}")
+            finally:
+                self._trash.task_done()
@@ -0,0 +1,290 @@
+import asyncio
+import errno
+import io
+import os
+import queue
+import tempfile
+import threading
+import time
+from typing import BinaryIO, List, Optional
+
+from .checksum import StreamingHasher
+from .retry import InsufficientDiskError, is_disk_full
+
+# Below this size preallocation is not worth a syscall
+PREALLOCATE_MIN_SIZE = 1024 * 1024
+# Free buffers a BufferPool keeps for reuse
+POOL_MAX_FREE = 16
+
+
+def preallocate(fd: int, size: int, label: str) -> bool:
+    """Reserve `size` bytes for the file behind `fd` (the file size becomes `size`).
+
+    Returns False when the platform or filesystem cannot preallocate, in which case nothing is
+    changed. A full disk raises InsufficientDiskError before any data is written.
+    """
+    if size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return False
+    try:
+        os.posix_fallocate(fd, 0, size)
+        return True
+    except OSError as e:
+        if is_disk_full(e):
+            raise InsufficientDiskError(e.errno, f"Insufficient disk space for {label} ({size:,} bytes needed)") from None
+        if e.errno in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+            return False
+        raise
+
+
+def _write_flushed(file: BinaryIO, data: bytes):
+    # Flushed, since later writes go straight to the descriptor
+    file.write(data)
+    file.flush()
+
+
+class BufferPool:
+    """Free list of equally sized bytearrays shared by all downloads of a run."""
+
+    def __init__(self, buffer_size: int = 2 * 1024 * 1024, max_free: int = POOL_MAX_FREE):
+        self.buffer_size = buffer_size
+        self.max_free = max_free
+        self._free: List[bytearray] = []
+
+    def get(self) -> bytearray:
+        return self._free.pop() if self._free else bytearray(self.buffer_size)
+
+    def put(self, buffer: bytearray):
+        if len(self._free) < self.max_free:
+            self._free.append(buffer)
+
+    def resize(self, max_free: int):
+        """Keep at most `max_free` free buffers from now on, dropping the surplus."""
+        self.max_free = max_free
+        del self._free[max_free:]
+
+
+class WriteBehindWriter:
+    """Coalesces downloaded chunks into large pooled buffers written by a background thread.
+
+    The event loop only copies chunks into a buffer; full buffers are handed to a writer thread
+    through a bounded queue and go back to the pool once written. With `max_in_flight` buffers
+    outstanding, `WriteStream.write()` waits for one to come back, which slows the reader down
+    to disk speed without blocking the loop.
+    """
+
+    def __init__(self, fd: int, pool: BufferPool, max_in_flight: int = 4, hasher: Optional[StreamingHasher] = None):
+        self.fd = fd
+        self.pool = pool
+        # Digests are updated by the writer thread, off the event loop
+        self.hasher = hasher
+        self.error: Optional[BaseException] = None
+        self.bytes_written = 0
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._pending: queue.Queue = queue.Queue(maxsize=max_in_flight + 1)
+        self._done = self._loop.create_future()
+        self._thread = threading.Thread(target=self._run, name='zip-write-behind', daemon=True)
+        self._thread.start()
+
+    def open_stream(self, position: int) -> 'WriteStream':
+        """A sequential writer starting at file offset `position`."""
+        return WriteStream(self, position)
+
+    async def _acquire(self) -> bytearray:
+        self._raise_if_failed()
+        await self._slots.acquire()
+        if self.error is not None:
+            self._slots.release()
+            raise self.error
+        return self.pool.get()
+
+    def _submit(self, buffer: bytearray, length: int, position: int):
+        # Never blocks: a slot was taken for every buffer, so the queue always has room
+        self._pending.put_nowait((buffer, length, position))
+
+    def _release(self, buffer: bytearray):
+        self.pool.put(buffer)
+        self._slots.release()
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            buffer, length, position = item
+            if self.error is None:
+                try:
+                    view = memoryview(buffer)[:length]
+                    if self.hasher is not None:
+                        self.hasher.update(position, view)
+                    while view:
+                        written = os.pwrite(self.fd, view, position)
+                        view = view[written:]
+                        position += written
+                        self.bytes_written += written
+                except BaseException as e:
+                    self.error = e
+            self._loop.call_soon_threadsafe(self._release, buffer)
+        self._loop.call_soon_threadsafe(self._finish)
+
+    def _finish(self):
+        if not self._done.done():
+            self._done.set_result(None)
+
+    def _raise_if_failed(self):
+        if self.error is not None:
+            raise self.error
+
+    async def close(self):
+        """Wait until everything submitted is on disk; re-raises a write error."""
+        self._pending.put_nowait(None)
+        await asyncio.shield(self._done)
+        self._raise_if_failed()
+
+
+class WriteStream:
+    """Sequential writer into a WriteBehindWriter at a moving file offset."""
+
+    def __init__(self, writer: WriteBehindWriter, position: int):
+        self.writer = writer
+        self.position = position
+        self._buffer: Optional[bytearray] = None
+        self._buffer_start = position
+        self._length = 0
+
+    async def write(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            if self._buffer is None:
+                self._buffer = await self.writer._acquire()
+                self._buffer_start = self.position
+                self._length = 0
+            take = min(len(view), len(self._buffer) - self._length)
+            self._buffer[self._length:self._length + take] = view[:take]
+            self._length += take
+            self.position += take
+            view = view[take:]
+            if self._length == len(self._buffer):
+                self.flush()
+
+    def flush(self):
+        """Hand the partially filled buffer to the writer thread."""
+        if self._buffer is not None:
+            if self._length:
+                self.writer._submit(self._buffer, self._length, self._buffer_start)
+            else:
+                self.writer._release(self._buffer)
+            self._buffer = None
+            self._length = 0
+
+
+class MemorySink:
+    """In-memory download target for small archives; spills to a temp file in `spill_dir` above `max_size`.
+
+    Once spilled, the body is written through a WriteBehindWriter like any other download.
+    """
+
+    def __init__(self, max_size: int, spill_dir: Optional[str] = None, pool: Optional[BufferPool] = None):
+        self.max_size = max_size
+        self.spill_dir = spill_dir
+        self.pool = pool or BufferPool()
+        self.file: BinaryIO = io.BytesIO()
+        self.size = 0
+        self._spilled = False
+
+    @property
+    def in_memory(self) -> bool:
+        return not self._spilled
+
+    def open_stream(self, position: int, hasher: Optional[StreamingHasher] = None) -> 'MemoryStream':
+        return MemoryStream(self, position, hasher)
+
+    async def open_writer(self, hasher: Optional[StreamingHasher] = None) -> WriteBehindWriter:
+        """Move the body to a temp file (once) and return a write-behind writer into it."""
+        if not self._spilled:
+            spilled = tempfile.TemporaryFile(dir=self.spill_dir)
+            data = self.file.getvalue()[:self.size]
+            await asyncio.to_thread(_write_flushed, spilled, data)
+            self.file.close()
+            self.file = spilled
+            self._spilled = True
+        return WriteBehindWriter(self.file.fileno(), self.pool, hasher=hasher)
+
+    def truncate(self, size: int):
+        self.file.truncate(size)
+        self.size = size
+
+    def close(self):
+        self.file.close()
+
+
+class MemoryStream:
+    """Sequential writer into a MemorySink, with the same interface as WriteStream.
+
+    A write past the sink's `max_size` spills it, and from then on writes are queued to a
+    WriteBehindWriter; `close()` waits until they are on disk.
+    """
+
+    def __init__(self, sink: MemorySink, position: int, hasher: Optional[StreamingHasher] = None):
+        self.sink = sink
+        self.position = position
+        self.hasher = hasher
+        self._writer: Optional[WriteBehindWriter] = None
+        self._stream: Optional[WriteStream] = None
+
+    async def write(self, data: bytes):
+        if self._stream is None and (not self.sink.in_memory or self.position + len(data) > self.sink.max_size):
+            self._writer = await self.sink.open_writer(self.hasher)
+            self._stream = self._writer.open_stream(self.position)
+        if self._stream is not None:
+            await self._stream.write(data)
+        else:
+            if self.hasher is not None:
+                self.hasher.update(self.position, data)
+            self.sink.file.seek(self.position)
+            self.sink.file.write(data)
+        self.position += len(data)
+        self.sink.size = max(self.sink.size, self.position)
+
+    def flush(self):
+        if self._stream is not None:
+            self._stream.flush()
+
+    async def close(self):
+        """Wait until spilled writes are on disk; re-raises a write error."""
+        if self._writer is not None:
+            self._stream.flush()
+            writer, self._writer, self._stream = self._writer, None, None
+            await writer.close()
+
+
+class ChunkSizer:
+    """Adapts the network read size to observed throughput (about `target_latency` worth of data)."""
+
+    def __init__(
+        self,
+        initial: int = 64 * 1024,
+        minimum: int = 16 * 1024,
+        maximum: int = 1024 * 1024,
+        target_latency: float = 0.02,
+        interval: float = 0.25
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = max(minimum, min(initial, maximum))
+        self.target_latency = target_latency
+        self.interval = interval
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+
+    def update(self, nbytes: int) -> int:
+        self._window_bytes += nbytes
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= self.interval:
+            rate = self._window_bytes / elapsed
+            target = int(rate * self.target_latency)
+            self.size = max(self.minimum, min(self.maximum, target))
+            self._window_start = now
+            self._window_bytes = 0
+        return self.size
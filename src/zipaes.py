@@ -0,0 +1,188 @@
+import hashlib
+import hmac
+import struct
+import sys
+import threading
+import zipfile
+from array import array
+from collections import OrderedDict
+from typing import BinaryIO, NamedTuple, Optional, Tuple
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # AES entries are then reported as unsupported
+    Cipher = None
+
+# Compression method of WinZip AES entries; the real method is in the 0x9901 extra field
+ZIP_AES = 99
+AES_EXTRA_ID = 0x9901
+AES_EXTRA = struct.Struct('<HHH2sBH')
+# Key length in bytes by AES strength (1 = AES-128, 2 = AES-192, 3 = AES-256)
+AES_KEY_LENGTHS = {1: 16, 2: 24, 3: 32}
+PASSWORD_VERIFIER_SIZE = 2
+AUTH_CODE_SIZE = 10
+KDF_ITERATIONS = 1000
+AES_BLOCK = 16
+# Derived keys an AesKeyCache keeps (least recently used ones are dropped)
+KEY_CACHE_SIZE = 256
+# Counter blocks built by one big-integer operation (1 MB of keystream)
+COUNTER_RUN = 65536
+
+
+class AesExtra(NamedTuple):
+    version: int  # 1 = AE-1 (CRC stored), 2 = AE-2 (CRC zeroed, the HMAC alone authenticates)
+    strength: int
+    method: int
+
+    @property
+    def key_length(self) -> int:
+        return AES_KEY_LENGTHS[self.strength]
+
+    @property
+    def salt_size(self) -> int:
+        return self.key_length // 2
+
+    @property
+    def overhead(self) -> int:
+        """Bytes of salt, password verifier and authentication code around the encrypted data."""
+        return self.salt_size + PASSWORD_VERIFIER_SIZE + AUTH_CODE_SIZE
+
+
+class AesKeys(NamedTuple):
+    encryption: bytes
+    authentication: bytes
+    verifier: bytes
+
+
+def parse_aes_extra(extra: bytes) -> Optional[AesExtra]:
+    """The WinZip AES extra field (0x9901) of an entry, or None if it has none."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag, size = struct.unpack_from('<HH', extra, pos)
+        if tag == AES_EXTRA_ID:
+            if size < AES_EXTRA.size - 4 or pos + AES_EXTRA.size > len(extra):
+                raise zipfile.BadZipFile(f"Corrupt extra field {AES_EXTRA_ID:04x} (WinZip AES)")
+            _, _, version, vendor, strength, method = AES_EXTRA.unpack_from(extra, pos)
+            if vendor != b'AE' or strength not in AES_KEY_LENGTHS:
+                raise zipfile.BadZipFile(f"Corrupt extra field {AES_EXTRA_ID:04x} (WinZip AES)")
+            return AesExtra(version, strength, method)
+        pos += 4 + size
+    return None
+
+
+class AesKeyCache:
+    """Derived keys by (password, salt): PBKDF2 runs once per distinct salt in an archive.
+
+    WinZip writes a random salt per entry, but archivers that reuse one salt (and the
+    re-opens of nested archives) then pay the 1000 HMAC-SHA1 rounds only once. At most
+    `max_size` keys are kept, so an archive with a salt per entry does not hold them all.
+    """
+
+    def __init__(self, max_size: int = KEY_CACHE_SIZE):
+        self.max_size = max_size
+        self._keys: 'OrderedDict[Tuple[bytes, bytes], AesKeys]' = OrderedDict()
+        # Password candidates are checked from several threads; PBKDF2 itself runs unlocked
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def derive(self, pwd: bytes, salt: bytes, key_length: int) -> AesKeys:
+        with self._lock:
+            keys = self._keys.get((pwd, salt))
+            if keys is not None:
+                self._keys.move_to_end((pwd, salt))
+                return keys
+        material = hashlib.pbkdf2_hmac('sha1', pwd, salt, KDF_ITERATIONS, 2 * key_length + PASSWORD_VERIFIER_SIZE)
+        keys = AesKeys(material[:key_length], material[key_length:2 * key_length], material[2 * key_length:])
+        with self._lock:
+            self._keys[(pwd, salt)] = keys
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+        return keys
+
+
+def _counter_offsets(count: int) -> int:
+    words = array('Q', bytes(count * AES_BLOCK))
+    words[0::2] = array('Q', range(count))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return int.from_bytes(words, 'little')
+
+
+# Counter blocks 0, 1, 2, ... and 1, 1, 1, ... of one run, as little-endian integers
+COUNTER_OFFSETS = _counter_offsets(COUNTER_RUN)
+COUNTER_ONES = int.from_bytes((b'\x01' + bytes(AES_BLOCK - 1)) * COUNTER_RUN, 'little')
+
+
+def counter_blocks(first: int, count: int) -> bytes:
+    """`count` little-endian 128-bit counter blocks from `first`.
+
+    A run of blocks is one big-integer expression, offsets + first * ones, so no Python code
+    runs per block. The high 64 bits of a block never carry: an entry would need 2**68 bytes.
+    """
+    runs = []
+    for start in range(0, count, COUNTER_RUN):
+        blocks = min(COUNTER_RUN, count - start)
+        mask = (1 << (blocks * AES_BLOCK * 8)) - 1
+        value = (COUNTER_OFFSETS & mask) + (first + start) * (COUNTER_ONES & mask)
+        runs.append(value.to_bytes(blocks * AES_BLOCK, 'little'))
+    return runs[0] if len(runs) == 1 else b''.join(runs)
+
+
+class AesReader:
+    """Decrypting reader of the data of a WinZip AES entry (the input of the decompressor).
+
+    `fileobj` is positioned at the salt. The keystream comes from OpenSSL (AES-NI where the CPU
+    has it) encrypting whole runs of counter blocks in one call: WinZip's counter is
+    little-endian, which OpenSSL's big-endian CTR mode cannot produce. The HMAC-SHA1 of the
+    ciphertext is updated as data is read and checked once the last byte has been returned.
+    """
+
+    def __init__(self, fileobj: BinaryIO, name: str, compress_size: int, aes: AesExtra, pwd: bytes, key_cache: AesKeyCache):
+        if Cipher is None:
+            raise NotImplementedError("AES-encrypted entries need the 'cryptography' package")
+        self.fileobj = fileobj
+        self.name = name
+        self._left = compress_size - aes.overhead
+        if self._left < 0:
+            raise zipfile.BadZipFile(f"Truncated AES data for file {name!r}")
+        salt = fileobj.read(aes.salt_size)
+        keys = key_cache.derive(pwd, salt, aes.key_length)
+        if not hmac.compare_digest(fileobj.read(PASSWORD_VERIFIER_SIZE), keys.verifier):
+            raise RuntimeError(f"Bad password for file {name!r}")
+        self._encryptor = Cipher(algorithms.AES(keys.encryption), modes.ECB()).encryptor()
+        self._mac = hmac.new(keys.authentication, digestmod=hashlib.sha1)
+        self._counter = 1
+        self._keystream = b''
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self.fileobj.read(size)
+        if not data:
+            return data
+        self._left -= len(data)
+        self._mac.update(data)
+        plain = self._decrypt(data)
+        if not self._left:
+            auth_code = self.fileobj.read(AUTH_CODE_SIZE)
+            if not hmac.compare_digest(self._mac.digest()[:AUTH_CODE_SIZE], auth_code):
+                raise zipfile.BadZipFile(f"Bad HMAC check for file {self.name!r}")
+        return plain
+
+    def _decrypt(self, data: bytes) -> bytes:
+        size = len(data)
+        blocks = -(-(size - len(self._keystream)) // AES_BLOCK)
+        if blocks > 0:
+            counter = self._counter
+            self._counter += blocks
+            self._keystream += self._encryptor.update(counter_blocks(counter, blocks))
+        keystream, self._keystream = self._keystream[:size], self._keystream[size:]
+        return (int.from_bytes(data, 'little') ^ int.from_bytes(keystream, 'little')).to_bytes(size, 'little')
+
+    def seekable(self) -> bool:
+        return False
+
+    def close(self):
+        self.fileobj.close()
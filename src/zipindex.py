@@ -0,0 +1,383 @@
+import struct
+import zipfile
+from array import array
+from typing import BinaryIO, Callable, Iterable, List, Optional, Sequence, Union
+
+from .archive_reader import ArchiveSlice, MappedArchive
+from .zipaes import PASSWORD_VERIFIER_SIZE, ZIP_AES, AesKeyCache, AesReader, parse_aes_extra
+from .zipcrypto import ZipCryptoDecrypter
+
+END_OF_CENTRAL_DIR = struct.Struct('<4s4H2LH')
+ZIP64_LOCATOR = struct.Struct('<4sLQL')
+ZIP64_END_OF_CENTRAL_DIR = struct.Struct('<4sQ2H2L4Q')
+CENTRAL_DIR = struct.Struct('<4s4B4HL2L5H2L')
+LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+
+EOCD_SIGNATURE = b'PK\x05\x06'
+ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+ZIP64_EOCD_SIGNATURE = b'PK\x06\x06'
+CENTRAL_DIR_SIGNATURE = b'PK\x01\x02'
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+FLAG_ENCRYPTED = 0x1
+FLAG_DATA_DESCRIPTOR = 0x8
+FLAG_COMPRESSED_PATCH = 0x20
+FLAG_STRONG_ENCRYPTION = 0x40
+FLAG_UTF8 = 0x800
+
+# The central directory is parsed in blocks, so a huge directory is never held in memory at once
+READ_BLOCK = 16 * 1024 * 1024
+# Largest compressed read handed to decompressors that `zipfile` runs without an output limit;
+# one bzip2 block of a few dozen bytes can inflate to 45 MB, LZMA reaches about 7000:1
+UNBOUNDED_READ_BLOCKS = {
+    zipfile.ZIP_BZIP2: 128,
+    zipfile.ZIP_LZMA: 4096,
+}
+
+
+class ZipIndex:
+    """Column-oriented index of a ZIP central directory.
+
+    One row per entry is kept in typed `array` columns plus a single packed blob of raw names,
+    about 60 bytes per entry instead of a `ZipInfo` object, its strings and its list slot.
+    `ZipInfo` objects are only built (`info()`) for the entries actually opened.
+    """
+
+    def __init__(self, source: Union[MappedArchive, BinaryIO]):
+        self.source = source
+        self.header_offsets = array('q')
+        self.compressed_sizes = array('q')
+        self.file_sizes = array('q')
+        self.crcs = array('I')
+        self.methods = array('H')
+        self.flags = array('H')
+        # Position of each central directory record, to materialize ZipInfo lazily
+        self.record_offsets = array('q')
+        self.name_offsets = array('q', [0])
+        self.names = bytearray()
+        self.concat = 0
+        # Position of the central directory in the source; entry data must end before it
+        self.cd_start = 0
+        self.aes_keys = AesKeyCache()
+
+    @classmethod
+    def parse(cls, source: Union[MappedArchive, BinaryIO]) -> 'ZipIndex':
+        """Read the central directory of `source` (a MappedArchive or a seekable file object)."""
+        index = cls(source)
+        fileobj = index._reader()
+        cd_offset, cd_size, eocd_position, zip64 = _find_central_directory(fileobj)
+        # Data prepended to the archive (e.g. a self-extractor stub) shifts every offset
+        index.concat = eocd_position - cd_size - cd_offset
+        if zip64:
+            index.concat -= ZIP64_END_OF_CENTRAL_DIR.size + ZIP64_LOCATOR.size
+        index.cd_start = cd_offset + index.concat
+        index._parse_records(fileobj, index.cd_start, cd_size)
+        return index
+
+    def _reader(self) -> BinaryIO:
+        if isinstance(self.source, MappedArchive):
+            return self.source.reader()
+        return self.source
+
+    def _parse_records(self, fileobj: BinaryIO, start: int, size: int):
+        unpack = CENTRAL_DIR.unpack_from
+        record_size = CENTRAL_DIR.size
+        header_offsets, compressed_sizes, file_sizes = self.header_offsets, self.compressed_sizes, self.file_sizes
+        crcs, methods, flags = self.crcs, self.methods, self.flags
+        record_offsets, name_offsets, names = self.record_offsets, self.name_offsets, self.names
+        concat = self.concat
+
+        fileobj.seek(start)
+        buffer = fileobj.read(min(size, READ_BLOCK))
+        remaining = size - len(buffer)
+        buffer_start = start
+        pos = 0
+        while True:
+            if len(buffer) - pos < record_size:
+                if not remaining:
+                    break
+                buffer, pos, buffer_start, remaining = _refill(fileobj, buffer, pos, buffer_start, remaining)
+                continue
+            (signature, _, _, _, _, flag_bits, method, _, _, crc, compressed_size, file_size,
+             name_length, extra_length, comment_length, _, _, _, header_offset) = unpack(buffer, pos)
+            if signature != CENTRAL_DIR_SIGNATURE:
+                raise zipfile.BadZipFile("Bad magic number for central directory")
+            total_length = record_size + name_length + extra_length + comment_length
+            if len(buffer) - pos < total_length:
+                if not remaining:
+                    raise zipfile.BadZipFile("Truncated central directory")
+                buffer, pos, buffer_start, remaining = _refill(fileobj, buffer, pos, buffer_start, remaining)
+                continue
+
+            name_start = pos + record_size
+            if 0xFFFFFFFF in (compressed_size, file_size, header_offset):
+                file_size, compressed_size, header_offset = _zip64_values(
+                    buffer, name_start + name_length, extra_length, file_size, compressed_size, header_offset)
+            header_offsets.append(header_offset + concat)
+            compressed_sizes.append(compressed_size)
+            file_sizes.append(file_size)
+            crcs.append(crc)
+            methods.append(method)
+            flags.append(flag_bits)
+            record_offsets.append(buffer_start + pos)
+            names += buffer[name_start:name_start + name_length]
+            name_offsets.append(len(names))
+            pos += total_length
+
+    def __len__(self) -> int:
+        return len(self.header_offsets)
+
+    def raw_name(self, i: int) -> bytes:
+        return bytes(self.names[self.name_offsets[i]:self.name_offsets[i + 1]])
+
+    def name(self, i: int) -> str:
+        """Entry name decoded the way `zipfile` does it (UTF-8 flag, else cp437)."""
+        return self.raw_name(i).decode('utf-8' if self.flags[i] & FLAG_UTF8 else 'cp437')
+
+    def is_dir(self, i: int) -> bool:
+        end = self.name_offsets[i + 1]
+        return end > self.name_offsets[i] and self.names[end - 1] == 0x2F  # '/'
+
+    def is_encrypted(self, i: int) -> bool:
+        return bool(self.flags[i] & FLAG_ENCRYPTED)
+
+    def select(self, extensions: Optional[Sequence[str]] = None) -> List[int]:
+        """Entries to extract, in archive order; with `extensions`, only files with those suffixes.
+
+        Matching works on the raw name bytes, so names are not decoded for entries filtered out.
+        """
+        if not extensions:
+            selected = list(range(len(self)))
+        else:
+            suffixes = tuple(ext.lower().encode() for ext in extensions)
+            names, offsets = self.names, self.name_offsets
+            selected = [
+                i for i in range(len(self))
+                if bytes(names[offsets[i]:offsets[i + 1]]).lower().endswith(suffixes)
+            ]
+        # Reading entries in offset order keeps access to the archive sequential
+        selected.sort(key=self.header_offsets.__getitem__)
+        return selected
+
+    def total_size(self, entries: Optional[Iterable[int]] = None) -> int:
+        if entries is None:
+            return sum(self.file_sizes)
+        file_sizes = self.file_sizes
+        return sum(file_sizes[i] for i in entries)
+
+    def info(self, i: int) -> zipfile.ZipInfo:
+        """Materialize the `ZipInfo` of entry `i` from its central directory record."""
+        fileobj = self._reader()
+        fileobj.seek(self.record_offsets[i])
+        record = fileobj.read(CENTRAL_DIR.size)
+        fields = CENTRAL_DIR.unpack(record)
+        name_length, extra_length, comment_length = fields[12:15]
+        variable = fileobj.read(name_length + extra_length + comment_length)
+        info = zipfile.ZipInfo(self.name(i))
+        info.extra = variable[name_length:name_length + extra_length]
+        info.comment = variable[name_length + extra_length:]
+        (info.create_version, info.create_system, info.extract_version, info.reserved,
+         info.flag_bits, info.compress_type, raw_time, raw_date, info.CRC) = fields[1:10]
+        info.volume, info.internal_attr, info.external_attr = fields[15:18]
+        info._raw_time = raw_time
+        info.date_time = (
+            (raw_date >> 9) + 1980, (raw_date >> 5) & 0xF, raw_date & 0x1F,
+            raw_time >> 11, (raw_time >> 5) & 0x3F, (raw_time & 0x1F) * 2,
+        )
+        # Sizes and offset already resolved (ZIP64, prepended data) while indexing
+        info.compress_size = self.compressed_sizes[i]
+        info.file_size = self.file_sizes[i]
+        info.header_offset = self.header_offsets[i]
+        return info
+
+    def data_offset(self, i: int, fileobj: Optional[BinaryIO] = None) -> int:
+        """Offset of the entry's (possibly encrypted) data, after its local header."""
+        fileobj = fileobj or self._reader()
+        fileobj.seek(self.header_offsets[i])
+        header = fileobj.read(LOCAL_HEADER.size)
+        if len(header) != LOCAL_HEADER.size:
+            raise zipfile.BadZipFile("Truncated file header")
+        fields = LOCAL_HEADER.unpack(header)
+        if fields[0] != LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile("Bad magic number for file header")
+        return self.header_offsets[i] + LOCAL_HEADER.size + fields[10] + fields[11]
+
+    def open_stored(self, i: int) -> ArchiveSlice:
+        """Raw data of stored, unencrypted entry `i` as a seekable view of the archive (nothing is copied)."""
+        if self.methods[i] != zipfile.ZIP_STORED or self.flags[i] & FLAG_ENCRYPTED:
+            raise ValueError(f"Entry {self.name(i)!r} is compressed or encrypted")
+        fileobj = self._reader()
+        return ArchiveSlice(fileobj, self.data_offset(i, fileobj), self.compressed_sizes[i])
+
+    def smallest_encrypted(self) -> Optional[int]:
+        """The encrypted entry with the least data, the cheapest to test a password on."""
+        encrypted = [i for i in range(len(self)) if self.flags[i] & FLAG_ENCRYPTED]
+        return min(encrypted, key=self.compressed_sizes.__getitem__) if encrypted else None
+
+    def check_password(self, i: int, pwd: bytes) -> bool:
+        """True if `pwd` opens encrypted entry `i`.
+
+        The header check (ZipCrypto check byte, AES password verifier) rejects almost every wrong
+        password after a few bytes. The ZipCrypto check byte still lets 1 in 256 through, so a
+        password that passes it is confirmed by reading the whole entry, CRC or HMAC included.
+        """
+        info = self.info(i)
+        fileobj = self._reader()
+        fileobj.seek(self.data_offset(i, fileobj))
+        if self.methods[i] == ZIP_AES:
+            aes = parse_aes_extra(info.extra)
+            if aes is None:
+                raise zipfile.BadZipFile(f"AES-encrypted file {self.name(i)!r} has no AES extra field")
+            salt = fileobj.read(aes.salt_size)
+            keys = self.aes_keys.derive(pwd, salt, aes.key_length)
+            if fileobj.read(PASSWORD_VERIFIER_SIZE) != keys.verifier:
+                return False
+        else:
+            if info.flag_bits & FLAG_DATA_DESCRIPTOR:
+                check_byte = (info._raw_time >> 8) & 0xFF
+            else:
+                check_byte = (info.CRC >> 24) & 0xFF
+            if ZipCryptoDecrypter(pwd)(fileobj.read(12))[11] != check_byte:
+                return False
+        try:
+            with self.open(i, pwd) as source:
+                while source.read(64 * 1024):
+                    pass
+        except (RuntimeError, zipfile.BadZipFile):
+            return False
+        return True
+
+    def open(self, i: int, pwd: Optional[bytes] = None, tap: Optional[Callable[[int], None]] = None) -> 'EntryReader':
+        """Decompressing, CRC-checking reader of entry `i` (like `ZipFile.open`).
+
+        `tap` is called with the size of every compressed block read from the archive. With a tap,
+        bzip2 and LZMA input is fed in small blocks: `zipfile` inflates those without an output
+        limit, so one large block of a bomb could expand to gigabytes before the caller sees it.
+        """
+        flag_bits = self.flags[i]
+        if flag_bits & FLAG_COMPRESSED_PATCH:
+            raise NotImplementedError("compressed patched data (flag bit 5)")
+        if flag_bits & FLAG_STRONG_ENCRYPTION:
+            raise NotImplementedError("strong encryption (flag bit 6)")
+        if flag_bits & FLAG_ENCRYPTED:
+            if not pwd:
+                raise RuntimeError(f"File {self.name(i)!r} is encrypted, password required for extraction")
+        else:
+            pwd = None
+        info = self.info(i)
+        aes = parse_aes_extra(info.extra) if self.methods[i] == ZIP_AES else None
+        if self.methods[i] == ZIP_AES and aes is None:
+            raise zipfile.BadZipFile(f"AES-encrypted file {self.name(i)!r} has no AES extra field")
+        fileobj = self._reader()
+        fileobj.seek(self.data_offset(i, fileobj))
+        if tap is not None:
+            method = aes.method if aes else self.methods[i]
+            fileobj = TappedReader(fileobj, tap, UNBOUNDED_READ_BLOCKS.get(method, -1))
+        if aes is not None:
+            # Decrypted below the decompressor, which then sees a plain entry
+            fileobj = AesReader(fileobj, info.filename, info.compress_size, aes, pwd, self.aes_keys)
+            info.compress_type = aes.method
+            info.compress_size -= aes.overhead
+            if aes.version == 2:
+                # AE-2 zeroes the CRC; the authentication code covers the data instead
+                del info.CRC
+            pwd = None
+        return EntryReader(fileobj, 'r', info, pwd, False)
+
+
+class EntryReader(zipfile.ZipExtFile):
+    """`ZipExtFile` decrypting ZipCrypto entries a buffer at a time instead of byte by byte."""
+
+    def _init_decrypter(self):
+        self._decrypter = ZipCryptoDecrypter(self._pwd)
+        # 12-byte encryption header; its last byte checks the password
+        header = self._fileobj.read(12)
+        self._compress_left -= 12
+        return self._decrypter(header)[11]
+
+
+class TappedReader:
+    """File object wrapper reporting the size of every read, e.g. to count compressed input."""
+
+    def __init__(self, fileobj: BinaryIO, tap: Callable[[int], None], max_read: int = -1):
+        self.fileobj = fileobj
+        self.tap = tap
+        self.max_read = max_read
+
+    def read(self, size: int = -1) -> bytes:
+        if self.max_read > 0 and (size is None or size < 0 or size > self.max_read):
+            size = self.max_read
+        data = self.fileobj.read(size)
+        self.tap(len(data))
+        return data
+
+    def seekable(self) -> bool:
+        return self.fileobj.seekable()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.fileobj.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.fileobj.tell()
+
+    def close(self):
+        self.fileobj.close()
+
+
+def _refill(fileobj: BinaryIO, buffer: bytes, pos: int, buffer_start: int, remaining: int):
+    """Drop the consumed part of `buffer` and append the next block of the central directory."""
+    block = fileobj.read(min(remaining, READ_BLOCK))
+    if not block:
+        raise zipfile.BadZipFile("Truncated central directory")
+    return buffer[pos:] + block, 0, buffer_start + pos, remaining - len(block)
+
+
+def _zip64_values(buffer: bytes, start: int, length: int, file_size: int, compressed_size: int, header_offset: int):
+    """Resolve 0xFFFFFFFF placeholders from the ZIP64 extended information extra field."""
+    end = start + length
+    while start + 4 <= end:
+        tag, size = struct.unpack_from('<HH', buffer, start)
+        if tag == 0x0001:
+            values = iter(struct.unpack_from(f'<{size // 8}Q', buffer, start + 4))
+            try:
+                if file_size == 0xFFFFFFFF:
+                    file_size = next(values)
+                if compressed_size == 0xFFFFFFFF:
+                    compressed_size = next(values)
+                if header_offset == 0xFFFFFFFF:
+                    header_offset = next(values)
+            except StopIteration:
+                raise zipfile.BadZipFile("Corrupt extra field 0001 (ZIP64)") from None
+            break
+        start += 4 + size
+    return file_size, compressed_size, header_offset
+
+
+def _find_central_directory(fileobj: BinaryIO):
+    """Locate the central directory: (offset, size, end-of-central-directory position, is ZIP64)."""
+    fileobj.seek(0, 2)
+    file_size = fileobj.tell()
+    tail_size = min(file_size, END_OF_CENTRAL_DIR.size + 0xFFFF)
+    fileobj.seek(file_size - tail_size)
+    tail = fileobj.read(tail_size)
+    position = tail.rfind(EOCD_SIGNATURE)
+    while position >= 0 and len(tail) - position < END_OF_CENTRAL_DIR.size:
+        position = tail.rfind(EOCD_SIGNATURE, 0, position)
+    if position < 0:
+        raise zipfile.BadZipFile("File is not a zip file")
+    eocd_position = file_size - tail_size + position
+    (_, _, _, _, _, cd_size, cd_offset, _) = END_OF_CENTRAL_DIR.unpack_from(tail, position)
+
+    locator_position = eocd_position - ZIP64_LOCATOR.size
+    if locator_position >= 0:
+        fileobj.seek(locator_position)
+        locator = fileobj.read(ZIP64_LOCATOR.size)
+        if len(locator) == ZIP64_LOCATOR.size and locator[:4] == ZIP64_LOCATOR_SIGNATURE:
+            record_position = locator_position - ZIP64_END_OF_CENTRAL_DIR.size
+            fileobj.seek(record_position)
+            record = fileobj.read(ZIP64_END_OF_CENTRAL_DIR.size)
+            if len(record) != ZIP64_END_OF_CENTRAL_DIR.size or record[:4] != ZIP64_EOCD_SIGNATURE:
+                raise zipfile.BadZipFile("Corrupt ZIP64 end of central directory record")
+            fields = ZIP64_END_OF_CENTRAL_DIR.unpack(record)
+            return fields[9], fields[8], eocd_position, True
+    return cd_offset, cd_size, eocd_position, False
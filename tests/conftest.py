@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory: the extractor keeps its storage under the working directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,113 @@
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import io
+import os
+import struct
+import tarfile
+import zipfile
+import zlib
+from typing import Callable, Dict, List
+
+from aiohttp import web
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+
+class FakeActor:
+    """Collects what the extractor pushes to the dataset."""
+
+    def __init__(self):
+        self.data: List[Dict] = []
+
+    async def push_data(self, data: Dict):
+        self.data.append(data)
+
+
+@contextlib.asynccontextmanager
+async def serve(routes: Dict[str, Callable]):
+    """Run an aiohttp app with `routes` (path -> handler) on a free local port; yields its base URL."""
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_get(path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        await runner.cleanup()
+
+
+def body(data: bytes, headers: Dict[str, str] = None, status: int = 200) -> Callable:
+    """Handler answering every request with `data`."""
+    async def handler(request):
+        return web.Response(body=data, status=status, headers=headers or {})
+    return handler
+
+
+def make_zip(files: Dict[str, bytes], method: int = zipfile.ZIP_DEFLATED) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', method) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def make_tar(files: Dict[str, bytes], compression: str = '') -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:' + compression) as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def make_aes_zip(files: Dict[str, bytes], password: bytes, strength: int = 3, deflate: bool = True) -> bytes:
+    """WinZip AE-2 archive of `files` (AES-128/192/256 for strength 1/2/3), written by hand."""
+    key_length = {1: 16, 2: 24, 3: 32}[strength]
+    method = zipfile.ZIP_DEFLATED if deflate else zipfile.ZIP_STORED
+    local, central = io.BytesIO(), io.BytesIO()
+    for name, data in files.items():
+        if deflate:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+            data = compressor.compress(data) + compressor.flush()
+        salt = os.urandom(key_length // 2)
+        material = hashlib.pbkdf2_hmac('sha1', password, salt, 1000, 2 * key_length + 2)
+        encryptor = Cipher(algorithms.AES(material[:key_length]), modes.ECB()).encryptor()
+        keystream = encryptor.update(b''.join(
+            counter.to_bytes(16, 'little') for counter in range(1, len(data) // 16 + 2)))
+        ciphertext = bytes(a ^ b for a, b in zip(data, keystream))
+        auth_code = hmac.new(material[key_length:2 * key_length], ciphertext, hashlib.sha1).digest()[:10]
+        payload = salt + material[2 * key_length:] + ciphertext + auth_code
+        extra = struct.pack('<HHH2sBH', 0x9901, 7, 2, b'AE', strength, method)
+        encoded = name.encode()
+        offset = local.tell()
+        # AE-2: the CRC is zeroed, the HMAC alone authenticates the data
+        local.write(struct.pack('<4s5H3L2H', b'PK\x03\x04', 51, 1, 99, 0, 0x21, 0,
+                                len(payload), len(files[name]), len(encoded), len(extra)))
+        local.write(encoded + extra + payload)
+        central.write(struct.pack('<4s6H3L5H2L', b'PK\x01\x02', 51, 51, 1, 99, 0, 0x21, 0,
+                                  len(payload), len(files[name]), len(encoded), len(extra), 0, 0, 0, 0, offset))
+        central.write(encoded + extra)
+    directory = central.getvalue()
+    end = struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, len(files), len(files), len(directory), local.tell(), 0)
+    return local.getvalue() + directory + end
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def extracted_paths(result: Dict) -> List[str]:
+    return sorted(item['path'] for item in result.get('extracted_files', []))
+
+
+def files_under(path) -> List[str]:
+    return sorted(
+        os.path.relpath(os.path.join(root, name), path)
+        for root, _, names in os.walk(path) for name in names
+    )
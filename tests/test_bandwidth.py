@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+import src.bandwidth
+from src.bandwidth import BandwidthLimiter, TokenBucket
+
+from .helpers import run
+
+KB = 1024
+MB = 1024 * 1024
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(src.bandwidth.time, 'monotonic', clock)
+    return clock
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(MB, min_capacity=256 * KB)
+    # A full burst is free, after that the debt is repaid at the rate
+    assert bucket.reserve(256 * KB) == 0
+    assert bucket.reserve(512 * KB) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.time_until(256 * KB) == pytest.approx(0.25)
+    clock.now += 10
+    # Never more than the capacity
+    assert bucket.tokens <= bucket.capacity
+    assert bucket.time_until(256 * KB) == 0
+
+
+def test_closed_flows_are_folded_into_usage(clock):
+    limiter = BandwidthLimiter()
+    for i in range(1000):
+        flow = limiter.open_flow(f'job{i}', 'a.example' if i % 2 else 'b.example')
+        clock.now += 1
+        limiter.close_flow(flow, 1000)
+    ongoing = limiter.open_flow('ongoing', 'a.example')
+    assert limiter.flows == [ongoing]
+    clock.now += 1
+    report = limiter.report()
+    assert report['per_host']['a.example'] == {'bytes': 500_000, 'downloads': 501, 'bytes_per_sec': 500_000 // 501}
+    assert report['per_host']['b.example'] == {'bytes': 500_000, 'downloads': 500, 'bytes_per_sec': 1000}
+    assert report['achieved_bytes_per_sec'] == 1_000_000 // 1001
+
+
+async def transfer(limiter: BandwidthLimiter, flow, until: float, chunk: int = 16 * KB) -> int:
+    moved = 0
+    while time.monotonic() < until:
+        await limiter.consume(flow, chunk)
+        moved += chunk
+        # Stands in for the network read between two chunks
+        await asyncio.sleep(0)
+    return moved
+
+
+def test_global_cap_holds_the_rate():
+    limiter = BandwidthLimiter(global_rate=MB)
+
+    async def scenario():
+        flow = limiter.open_flow('a', 'a.example')
+        started = time.monotonic()
+        for _ in range(80):
+            await limiter.consume(flow, 16 * KB)
+        return time.monotonic() - started
+
+    # 1.25 MB: the 256 KB burst, then 1 MB at 1 MB/s
+    assert 0.9 < run(scenario()) < 2.0
+
+
+def test_global_cap_is_shared_by_weight():
+    limiter = BandwidthLimiter(global_rate=2 * MB)
+
+    async def scenario():
+        light = limiter.open_flow('light', 'a.example', weight=1)
+        heavy = limiter.open_flow('heavy', 'b.example', weight=3)
+        until = time.monotonic() + 1.5
+        return await asyncio.gather(transfer(limiter, light, until), transfer(limiter, heavy, until, chunk=64 * KB))
+
+    light, heavy = run(scenario())
+    # Reads of either size are granted in proportion to the weights, not to the chunk size
+    assert 2.5 < heavy / light < 3.5
+    # The burst, the rate, and the reads that were queued before the deadline
+    assert light + heavy <= 2 * MB * 1.5 + 512 * KB + 16 * KB + 64 * KB
@@ -0,0 +1,103 @@
+import io
+import struct
+import zipfile
+
+import pytest
+
+from src.bombguard import BombGuard, ExtractionLimits, ZipBombError
+from src.extraction import ExtractionOptions
+from src.main import ZipDownloadExtractor
+from src.retry import ErrorType
+from src.zipindex import ZipIndex
+
+from .helpers import FakeActor, files_under, make_zip
+
+MB = 1024 * 1024
+
+
+def test_archive_ratio_follows_the_entry_ratio():
+    assert ExtractionLimits().max_archive_ratio == 250
+    assert ExtractionLimits(max_entry_ratio=400).max_archive_ratio == 100
+    assert ExtractionLimits(max_entry_ratio=400, max_archive_ratio=300).max_archive_ratio == 300
+
+
+def test_entry_ratio_is_enforced_only_past_the_grace_output():
+    guard = BombGuard(ExtractionLimits(max_entry_ratio=10, ratio_min_output=1000))
+    guard.start_entry('small')
+    guard.compressed(1)
+    guard.inflated(1000)
+    guard.start_entry('bomb')
+    guard.compressed(10)
+    with pytest.raises(ZipBombError, match='bomb inflates'):
+        guard.inflated(1001)
+
+
+def test_archive_ratio_catches_entries_that_each_stay_under_the_entry_ratio():
+    limits = ExtractionLimits(max_entry_ratio=100, ratio_min_output=1000, archive_ratio_min_output=5000)
+    guard = BombGuard(limits)
+    with pytest.raises(ZipBombError, match='Archive inflates'):
+        for i in range(10):
+            # 90:1 each, under the entry limit but above the archive's 25:1
+            guard.start_entry(f'entry{i}')
+            guard.compressed(10)
+            guard.inflated(900)
+
+
+def test_size_limits():
+    guard = BombGuard(ExtractionLimits(max_entry_size=100, max_total_size=150))
+    guard.start_entry('a')
+    guard.inflated(100)
+    guard.start_entry('b')
+    with pytest.raises(ZipBombError, match='beyond 150'):
+        guard.inflated(60)
+
+
+def overlapping_zip() -> bytes:
+    """Archive whose two central directory records point at the same local header and data."""
+    data = bytearray(make_zip({'a.txt': b'payload ' * 100}))
+    eocd = data.rindex(b'PK\x05\x06')
+    entries, cd_size, cd_offset = struct.unpack_from('<HIL', data, eocd + 10)
+    record = bytes(data[cd_offset:cd_offset + cd_size])
+    duplicate = record.replace(b'a.txt', b'b.txt')
+    struct.pack_into('<HHIL', data, eocd + 8, 2, 2, 2 * cd_size, cd_offset)
+    return bytes(data[:cd_offset]) + record + duplicate + bytes(data[eocd:])
+
+
+def test_overlapping_entries_are_rejected_from_the_index():
+    index = ZipIndex.parse(io.BytesIO(overlapping_zip()))
+    assert len(index) == 2
+    with pytest.raises(ZipBombError, match='overlap'):
+        BombGuard(ExtractionLimits()).check_index(index)
+
+
+def test_overlap_hidden_by_a_long_name_is_rejected():
+    # b.txt's record points into a.txt's 2000-byte local name, past where header + data alone would end
+    data = bytearray(make_zip({'a' * 2000 + '.txt': b'a', 'b.txt': b'b'}, zipfile.ZIP_STORED))
+    eocd = data.rindex(b'PK\x05\x06')
+    cd_offset = struct.unpack_from('<L', data, eocd + 16)[0]
+    second = data.index(b'PK\x01\x02', cd_offset + 4)
+    struct.pack_into('<L', data, second + 42, 100)
+    index = ZipIndex.parse(io.BytesIO(bytes(data)))
+    assert index.header_offsets[1] == 100
+    with pytest.raises(ZipBombError, match='overlap'):
+        BombGuard(ExtractionLimits()).check_index(index)
+
+
+def test_bomb_archive_fails_and_leaves_nothing(workdir):
+    path = workdir / 'bomb.zip'
+    path.write_bytes(make_zip({'fine.txt': b'fine', 'zeros.bin': bytes(64 * MB)}))
+    extractor = ZipDownloadExtractor(FakeActor())
+    out = workdir / 'out'
+    assert not extractor.extract_zip(str(path), str(out), ExtractionOptions(max_compression_ratio=100))
+    assert extractor._error_type(str(path)) == ErrorType.ZIP_BOMB
+    assert 'zeros.bin' not in files_under(out)
+
+
+def test_overlapping_archive_fails_before_writing(workdir):
+    path = workdir / 'overlap.zip'
+    path.write_bytes(overlapping_zip())
+    extractor = ZipDownloadExtractor(FakeActor())
+    out = workdir / 'out'
+    assert not extractor.extract_zip(str(path), str(out))
+    assert extractor._error_type(str(path)) == ErrorType.ZIP_BOMB
+    assert files_under(out) == []
@@ -0,0 +1,92 @@
+import base64
+import hashlib
+import os
+
+from src.checksum import StreamingHasher, normalize_sha256, parse_digest_headers
+from src.main import ZipDownloadExtractor
+from src.retry import ErrorType, RetryPolicy
+
+from .helpers import FakeActor, body, extracted_paths, files_under, make_tar, run, serve
+
+TAR_FILES = {'data/a.csv': b'a,1\n' * 2000, 'data/b.txt': os.urandom(3000)}
+
+
+def content_md5(data: bytes) -> str:
+    return base64.b64encode(hashlib.md5(data).digest()).decode()
+
+
+def test_digest_headers_are_parsed_to_hex():
+    data = b'archive body'
+    headers = {
+        'Digest': 'SHA-256=' + base64.b64encode(hashlib.sha256(data).digest()).decode(),
+        'Content-MD5': content_md5(data),
+    }
+    assert parse_digest_headers(headers) == {
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'md5': hashlib.md5(data).hexdigest(),
+    }
+    assert parse_digest_headers({'Content-MD5': 'not base64!'}) == {}
+
+
+def test_normalize_sha256():
+    digest = hashlib.sha256(b'x').hexdigest()
+    assert normalize_sha256('SHA256:' + digest.upper()) == digest
+    assert normalize_sha256('abc') is None
+
+
+def test_out_of_order_writes_fall_back_to_rehash(tmp_path):
+    data = os.urandom(10000)
+    hasher = StreamingHasher({'sha256': hashlib.sha256(data).hexdigest()})
+    hasher.update(5000, data[5000:])
+    assert not hasher.complete
+    path = tmp_path / 'body'
+    path.write_bytes(data)
+    with open(path, 'rb') as f:
+        hasher.rehash(f)
+    assert hasher.mismatches() == {}
+
+
+async def process(url: str, **options):
+    processor = ZipDownloadExtractor(FakeActor(), retry_policy=RetryPolicy(max_retries=0))
+    try:
+        return await processor.process_zip(url, **options)
+    finally:
+        await processor.close()
+
+
+def test_streamed_tar_with_content_md5_is_verified(workdir):
+    tar = make_tar(TAR_FILES, 'gz')
+
+    async def scenario():
+        async with serve({'/t.tar.gz': body(tar, {'Content-MD5': content_md5(tar)})}) as base:
+            return await process(base + '/t.tar.gz')
+
+    result = run(scenario())
+    assert result['success'], result
+    assert extracted_paths(result) == ['data/a.csv', 'data/b.txt']
+    assert result['bytes_downloaded'] == len(tar)
+
+
+def test_streamed_tar_with_sha256_is_verified(workdir):
+    tar = make_tar(TAR_FILES, 'gz')
+
+    async def scenario():
+        async with serve({'/t.tar.gz': body(tar)}) as base:
+            return await process(base + '/t.tar.gz', sha256=hashlib.sha256(tar).hexdigest())
+
+    result = run(scenario())
+    assert result['success'], result
+    assert extracted_paths(result) == ['data/a.csv', 'data/b.txt']
+
+
+def test_streamed_tar_with_wrong_digest_fails_and_leaves_nothing(workdir):
+    tar = make_tar(TAR_FILES, 'gz')
+
+    async def scenario():
+        async with serve({'/t.tar.gz': body(tar, {'Content-MD5': content_md5(b'something else')})}) as base:
+            return await process(base + '/t.tar.gz')
+
+    result = run(scenario())
+    assert not result['success']
+    assert result['error_type'] == ErrorType.CHECKSUM_MISMATCH
+    assert files_under(workdir / 'apify_storage' / 'temp') == []
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from src.diskbudget import DiskBudget
+from src.main import ZipDownloadExtractor
+from src.retry import InsufficientDiskError
+from src.workspace import WorkspaceManager
+
+from .helpers import FakeActor, body, make_zip, run, serve
+
+
+def test_reservation_that_can_never_fit_fails_at_once(tmp_path):
+    async def scenario():
+        budget = DiskBudget(str(tmp_path), capacity=1000)
+        with pytest.raises(InsufficientDiskError):
+            await budget.reserve('a', 1001)
+        assert budget.reserved == 0
+
+    run(scenario())
+
+
+def test_waits_for_a_release_then_reserves(tmp_path):
+    async def scenario():
+        budget = DiskBudget(str(tmp_path), capacity=1000)
+        assert budget.try_reserve('a', 800)
+        waiter = asyncio.create_task(budget.reserve('b', 500))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await budget.release('a', kept=100)
+        await asyncio.wait_for(waiter, 1)
+        assert budget.capacity == 900 and budget.reserved == 500
+
+    run(scenario())
+
+
+def test_holders_waiting_on_each_other_fail_instead_of_deadlocking(tmp_path):
+    async def scenario():
+        budget = DiskBudget(str(tmp_path), capacity=1000)
+        assert budget.try_reserve('a', 400) and budget.try_reserve('b', 400)
+        first = asyncio.create_task(budget.reserve('a', 500))
+        await asyncio.sleep(0.01)
+        assert not first.done()
+        # 'b' would wait for 'a', which already waits for 'b'
+        with pytest.raises(InsufficientDiskError):
+            await budget.reserve('b', 500)
+        await budget.release('b')
+        await asyncio.wait_for(first, 1)
+        assert budget.reserved == 900
+
+    run(scenario())
+
+
+def test_deletion_callback_runs_after_the_workspace_is_gone(tmp_path):
+    manager = WorkspaceManager(str(tmp_path / 'temp'))
+    workspace = manager.create('a.zip')
+    os.makedirs(workspace.extract_path)
+    with open(os.path.join(workspace.extract_path, 'file'), 'wb') as f:
+        f.write(b'x' * 1000)
+    seen = []
+    deleted = threading.Event()
+
+    def on_deleted():
+        seen.append(os.path.exists(workspace.root))
+        deleted.set()
+
+    manager.release(workspace, on_deleted=on_deleted)
+    assert deleted.wait(5)
+    assert seen == [False]
+
+
+def test_job_releases_its_budget_once_its_workspace_is_deleted(workdir):
+    archive = make_zip({'a.txt': b'a' * 100_000})
+
+    async def scenario():
+        budget = DiskBudget(str(workdir / 'apify_storage'), capacity=10 * 1024 * 1024)
+        processor = ZipDownloadExtractor(FakeActor(), disk_budget=budget)
+        gate = threading.Event()
+        # Hold the cleanup thread so the deletion is still pending when the job returns
+        processor.workspaces._trash.put(gate.wait)
+        try:
+            async with serve({'/a.zip': body(archive)}) as base:
+                result = await processor.process_zip(base + '/a.zip', extract_to_memory=True)
+            assert result['success'], result
+            assert budget.reserved > 0
+        finally:
+            gate.set()
+            await processor.close()
+        assert budget.reserved == 0
+        assert os.listdir(workdir / 'apify_storage' / 'temp') == []
+
+    run(scenario())
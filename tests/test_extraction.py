@@ -0,0 +1,43 @@
+from src.extraction import ExtractionOptions
+from src.main import ZipDownloadExtractor
+
+from .helpers import FakeActor, files_under, make_tar, make_zip
+
+INNER = make_zip({'deep.zip': make_zip({'c.csv': b'c'}), 'b.csv': b'b', 'b.txt': b'b'})
+OUTER = make_zip({'inner.zip': INNER, 'a.csv': b'a', 'a.txt': b'a'})
+
+
+def extract(workdir, data: bytes, options: ExtractionOptions):
+    path = workdir / 'outer.zip'
+    path.write_bytes(data)
+    extractor = ZipDownloadExtractor(FakeActor())
+    out = workdir / 'out'
+    return extractor.extract_zip(str(path), str(out), options), extractor, files_under(out)
+
+
+def test_options_apply_at_every_nesting_level(workdir):
+    ok, extractor, files = extract(workdir, OUTER, ExtractionOptions(file_types=['.csv'], max_depth=1))
+    assert ok
+    # The filter holds inside inner.zip too; deep.zip is past max_depth and filtered out
+    assert files == ['a.csv', 'inner/b.csv']
+    assert [record['depth'] for record in extractor.nested_archives[str(workdir / 'outer.zip')]] == [1]
+
+
+def test_nested_levels_share_one_size_limit(workdir):
+    payload = b'x' * 4096
+    data = make_zip({'inner.zip': make_zip({'big.bin': payload}), 'top.bin': payload})
+    ok, _, _ = extract(workdir, data, ExtractionOptions(max_depth=1, max_extraction_size=6000))
+    # Each file fits on its own, but not both
+    assert not ok
+
+
+def test_tar_uses_the_same_options(workdir):
+    path = workdir / 'a.tar'
+    path.write_bytes(make_tar({'a.csv': b'a', 'a.txt': b'a'}))
+    extractor = ZipDownloadExtractor(FakeActor())
+    out = workdir / 'out'
+    out.mkdir()
+    (out / 'a.csv').write_bytes(b'old')
+    assert extractor.extract_tar(str(path), str(out), ExtractionOptions(file_types=['.csv'], handle_duplicates='skip'))
+    assert files_under(out) == ['a.csv']
+    assert (out / 'a.csv').read_bytes() == b'old'
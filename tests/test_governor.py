@@ -0,0 +1,85 @@
+import asyncio
+
+from src.governor import Throttle
+
+from .helpers import run
+
+
+class CountingCondition(asyncio.Condition):
+    """Condition counting how often its waiters are woken up."""
+
+    def __init__(self):
+        super().__init__()
+        self.wakeups = 0
+
+    async def wait(self):
+        result = await super().wait()
+        self.wakeups += 1
+        return result
+
+
+async def hold(throttle: Throttle, entered: list, release: asyncio.Event):
+    async with throttle:
+        entered.append(asyncio.current_task())
+        await release.wait()
+
+
+def test_released_slot_wakes_one_waiter():
+    async def scenario():
+        throttle = Throttle(1)
+        throttle._changed = condition = CountingCondition()
+        entered = []
+        releases = [asyncio.Event() for _ in range(20)]
+        tasks = [asyncio.create_task(hold(throttle, entered, release)) for release in releases]
+        await asyncio.sleep(0)
+        for count, release in enumerate(releases, 1):
+            assert len(entered) == count and throttle.active == 1
+            release.set()
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+        return condition.wakeups
+
+    # With notify_all every release would wake all the remaining waiters (190 wakeups)
+    assert run(scenario()) == 19
+
+
+def test_raising_the_limit_admits_that_many_waiters():
+    async def scenario():
+        throttle = Throttle(4)
+        await throttle.resize(1)
+        entered = []
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(throttle, entered, release)) for _ in range(6)]
+        await asyncio.sleep(0.01)
+        assert len(entered) == 1
+        await throttle.resize(3)
+        await asyncio.sleep(0.01)
+        assert len(entered) == 3 and throttle.active == 3
+        release.set()
+        await asyncio.gather(*tasks)
+        assert len(entered) == 6 and throttle.active == 0
+
+    run(scenario())
+
+
+def test_cancelled_waiter_hands_its_wakeup_on():
+    async def scenario():
+        throttle = Throttle(1)
+        entered = []
+        first, rest = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(throttle, entered, first))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(hold(throttle, entered, rest))
+        waiting = asyncio.create_task(hold(throttle, entered, rest))
+        await asyncio.sleep(0)
+        # The slot is freed and handed to `cancelled`, which is cancelled before it can take it
+        first.set()
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0.01)
+        assert entered == [holder, waiting]
+        rest.set()
+        await asyncio.gather(holder, waiting)
+        assert cancelled.cancelled()
+
+    run(scenario())
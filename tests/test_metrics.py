@@ -0,0 +1,71 @@
+import io
+import zipfile
+
+from src.main import ZipDownloadExtractor
+from src.metrics import JobMetrics, current_job_id, percentiles, track_job
+from src.retry import ErrorType
+
+from .helpers import FakeActor, body, make_zip, run, serve
+
+
+def test_nested_phases_are_not_counted_twice(monkeypatch):
+    # Job created at 0; download from 0 to 10, with validation from 1 to 3 inside it
+    clock = iter([0.0, 0.0, 1.0, 3.0, 10.0])
+    monkeypatch.setattr('src.metrics.time.perf_counter', lambda: next(clock))
+    job = JobMetrics()
+    with job.phase('download'):
+        with job.phase('validation'):
+            pass
+    assert job.phases == {'validation': 2.0, 'download': 8.0}
+
+
+def test_percentiles_interpolate():
+    stats = percentiles([1, 2, 3, 4])
+    assert stats['count'] == 4 and stats['mean'] == 2.5
+    assert stats['p50'] == 2.5 and stats['max'] == 4
+    assert percentiles([]) == {'count': 0}
+
+
+def test_error_types_of_jobs_with_the_same_key_are_kept_apart():
+    extractor = ZipDownloadExtractor(FakeActor())
+    first, second = JobMetrics(), JobMetrics()
+    with track_job(first):
+        extractor._record_error('http://host/a.zip', ErrorType.CLIENT_ERROR, 'HTTP 404')
+    with track_job(second):
+        extractor._record_error('http://host/a.zip', ErrorType.TIMEOUT, 'Timeout')
+    with track_job(first):
+        assert current_job_id() == first.id
+        assert extractor._pop_error_type('http://host/a.zip') == ErrorType.CLIENT_ERROR
+    with track_job(second):
+        assert extractor._pop_error_type('http://host/a.zip') == ErrorType.TIMEOUT
+    assert extractor.error_types == {}
+
+
+def corrupt(archive: bytes, name: str) -> bytes:
+    """Flip the first data byte of stored entry `name` (its CRC check then fails)."""
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        info = zf.getinfo(name)
+    start = info.header_offset + 30 + len(info.filename.encode()) + len(info.extra)
+    data = bytearray(archive)
+    data[start] ^= 0xFF
+    return bytes(data)
+
+
+def test_results_report_their_own_skipped_and_corrupted_files(workdir):
+    bad = corrupt(make_zip({'../escape.txt': b'x', 'ok.txt': b'fine', 'broken.txt': b'data ' * 100},
+                           zipfile.ZIP_STORED), 'broken.txt')
+    good = make_zip({'a.txt': b'a', 'b.txt': b'b'})
+
+    async def scenario():
+        processor = ZipDownloadExtractor(FakeActor())
+        try:
+            async with serve({'/bad.zip': body(bad), '/good.zip': body(good)}) as base:
+                return [await processor.process_zip(base + path) for path in ('/bad.zip', '/good.zip')], processor.stats
+        finally:
+            await processor.close()
+
+    (bad_result, good_result), stats = run(scenario())
+    assert bad_result['success'] and good_result['success']
+    assert (bad_result['skipped_files'], bad_result['corrupted_files']) == (1, 1)
+    assert (good_result['skipped_files'], good_result['corrupted_files']) == (0, 0)
+    assert (stats['skipped_files'], stats['corrupted_files']) == (1, 1)
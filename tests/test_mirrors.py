@@ -0,0 +1,101 @@
+import asyncio
+
+from src.main import ZipDownloadExtractor
+from src.mirrors import DownloadCandidate, HedgePolicy
+from src.retry import RetryPolicy
+
+from .helpers import FakeActor, body, extracted_paths, make_zip, run, serve
+
+
+def candidate(url: str, started_at: float = 0.0, first_byte_at=None, received: int = 0) -> DownloadCandidate:
+    result = DownloadCandidate(url, '/tmp/unused')
+    result.started_at = started_at
+    result.first_byte_at = first_byte_at
+    result.bytes_received = received
+    return result
+
+
+def test_rank_puts_faster_hosts_first_and_unknown_ones_at_the_median():
+    policy = HedgePolicy()
+    for _ in range(3):
+        policy.record_first_byte('slow', 2.0)
+        policy.record_throughput('slow', 100_000)
+        policy.record_first_byte('fast', 0.1)
+        policy.record_throughput('fast', 50_000_000)
+        policy.record_first_byte('medium', 0.5)
+        policy.record_throughput('medium', 1_000_000)
+    urls = ['http://slow/a.zip', 'http://new/a.zip', 'http://fast/a.zip', 'http://medium/a.zip']
+    ranked = policy.rank([candidate(url) for url in urls])
+    # 'new' ties with the median host ('medium') and keeps its place before it
+    assert [c.host for c in ranked] == ['fast', 'new', 'medium', 'slow']
+
+
+def test_hedge_delay_follows_the_latency_percentile():
+    policy = HedgePolicy(first_byte_percentile=0.9, default_first_byte_delay=2.0)
+    for seconds in range(9):
+        policy.record_first_byte('host', seconds / 10)
+    # Too little history: the default
+    assert policy.hedge_delay() == 2.0
+    policy.record_first_byte('host', 3.0)
+    assert policy.hedge_delay() == 3.0
+    for _ in range(10):
+        policy.record_first_byte('host', 0.1)
+    assert policy.hedge_delay() == 0.8
+
+
+def test_should_hedge_only_without_acceptable_progress():
+    policy = HedgePolicy(default_first_byte_delay=1.0, min_throughput=1000, throughput_window=5.0, max_parallel=2)
+    # Waiting for the first byte, within and past the delay
+    assert not policy.should_hedge([candidate('http://a/')], now=0.5)
+    assert policy.should_hedge([candidate('http://a/')], now=1.5)
+    # Receiving: too early to judge, then fast enough, then too slow
+    assert not policy.should_hedge([candidate('http://a/', first_byte_at=1.0, received=10)], now=3.0)
+    assert not policy.should_hedge([candidate('http://a/', first_byte_at=1.0, received=100_000)], now=10.0)
+    assert policy.should_hedge([candidate('http://a/', first_byte_at=1.0, received=900)], now=10.0)
+    # One request doing well is enough, and the parallel limit holds
+    stalled = candidate('http://a/')
+    assert not policy.should_hedge([stalled, candidate('http://b/', started_at=1.0)], now=1.5)
+    assert not policy.should_hedge([stalled, candidate('http://b/')], now=5.0)
+
+
+def test_slow_primary_is_hedged_and_the_mirror_wins(workdir):
+    data = make_zip({'a.txt': b'a' * 1000})
+
+    async def stuck(request):
+        await asyncio.sleep(2)
+        return await body(data)(request)
+
+    async def scenario():
+        async with serve({'/slow.zip': stuck, '/fast.zip': body(data)}) as base:
+            processor = ZipDownloadExtractor(
+                FakeActor(), retry_policy=RetryPolicy(max_retries=0),
+                hedge_policy=HedgePolicy(default_first_byte_delay=0.2))
+            try:
+                started = asyncio.get_running_loop().time()
+                result = await processor.process_zip(base + '/slow.zip', mirrors=[base + '/fast.zip'])
+                return result, processor.stats, asyncio.get_running_loop().time() - started
+            finally:
+                await processor.close()
+
+    result, stats, elapsed = run(scenario())
+    assert result['success']
+    assert extracted_paths(result) == ['a.txt']
+    assert stats['hedged_downloads'] == 1
+    # The loser was cancelled instead of awaited
+    assert elapsed < 1.5
+
+
+def test_failing_primary_falls_back_to_the_mirror(workdir):
+    data = make_zip({'a.txt': b'a'})
+
+    async def scenario():
+        async with serve({'/gone.zip': body(b'', status=404), '/a.zip': body(data)}) as base:
+            processor = ZipDownloadExtractor(FakeActor(), retry_policy=RetryPolicy(max_retries=0))
+            try:
+                return await processor.process_zip(base + '/gone.zip', mirrors=[base + '/a.zip'])
+            finally:
+                await processor.close()
+
+    result = run(scenario())
+    assert result['success']
+    assert extracted_paths(result) == ['a.txt']
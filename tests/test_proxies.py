@@ -0,0 +1,97 @@
+import hashlib
+import os
+import re
+import time
+
+import pytest
+from aiohttp import web
+
+import src.proxies
+from src.main import ZipDownloadExtractor
+from src.proxies import ProxyPool
+from src.retry import RetryPolicy
+
+from .helpers import FakeActor, extracted_paths, make_zip, run, serve
+
+# The proxies answer for the origin themselves, so it never has to resolve
+URL = 'http://origin.test/a.zip'
+FILES = {'a.bin': os.urandom(300 * 1024), 'b.bin': os.urandom(100 * 1024)}
+DATA = make_zip(FILES)
+
+
+@pytest.fixture(autouse=True)
+def first_choice(monkeypatch):
+    # Proxy selection is weighted-random; take the first candidate so the order is known
+    monkeypatch.setattr(src.proxies.random, 'choices', lambda population, weights: [population[0]])
+
+
+def proxy(name: str, log: list, status: int = 200, ranges: bool = True):
+    """Handler of a fake forward proxy serving DATA, logging (name, Range header) per request."""
+    async def handler(request):
+        requested = request.headers.get('Range')
+        log.append((name, requested))
+        if status != 200:
+            return web.Response(status=status)
+        headers = {'Accept-Ranges': 'bytes'}
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', requested or '')
+        if not match or not ranges:
+            return web.Response(body=DATA, headers=headers)
+        start = int(match.group(1))
+        end = int(match.group(2)) + 1 if match.group(2) else len(DATA)
+        headers['Content-Range'] = f"bytes {start}-{end - 1}/{len(DATA)}"
+        return web.Response(body=DATA[start:end], status=206, headers=headers)
+    return handler
+
+
+async def process(handlers, **pool_options):
+    """Download URL through one fake proxy per handler; returns the result and the pool."""
+    proxies = [serve({'/a.zip': handler}) for handler in handlers]
+    bases = [await proxy_server.__aenter__() for proxy_server in proxies]
+    pool = ProxyPool(bases, **pool_options)
+    processor = ZipDownloadExtractor(
+        FakeActor(), retry_policy=RetryPolicy(max_retries=2, base_delay=0.01), proxy_pool=pool)
+    try:
+        result = await processor.process_zip(URL, sha256=hashlib.sha256(DATA).hexdigest())
+        return result, pool
+    finally:
+        await processor.close()
+        for proxy_server in reversed(proxies):
+            await proxy_server.__aexit__(None, None, None)
+
+
+def test_rate_limited_proxy_is_rotated_out(workdir):
+    log = []
+    result, pool = run(process([proxy('a', log, status=429), proxy('b', log)]))
+    assert result['success']
+    assert [name for name, _ in log] == ['a', 'b']
+    blocked, healthy = pool.endpoints
+    assert blocked.blocked_until['origin.test'] > time.monotonic()
+    assert not healthy.blocked_until
+    assert [pool.select('origin.test') for _ in range(5)] == [healthy] * 5
+
+
+def test_large_body_is_split_across_proxies(workdir):
+    log = []
+    handlers = [proxy(name, log) for name in 'abc']
+    result, pool = run(process(handlers, max_segments=3, min_segment_size=64 * 1024))
+    assert result['success']
+    # The first request becomes segment 0; the others ask for the remaining ranges through other proxies
+    assert log[0] == ('a', None)
+    size = -(-len(DATA) // 3)
+    assert sorted(log[1:]) == [
+        ('b', f"bytes={size}-{2 * size - 1}"),
+        ('c', f"bytes={2 * size}-{len(DATA) - 1}"),
+    ]
+    # The sha256 check passed, so the archive was reassembled byte for byte
+    assert extracted_paths(result) == sorted(FILES)
+    assert all(item['requests'] == 1 for item in pool.report())
+
+
+def test_ignored_range_falls_back_to_one_stream(workdir):
+    log = []
+    handlers = [proxy(name, log, ranges=False) for name in 'ab']
+    result, _ = run(process(handlers, max_segments=2, min_segment_size=64 * 1024))
+    assert result['success']
+    assert extracted_paths(result) == sorted(FILES)
+    # One refused segment request, then the whole body again in a single request
+    assert [requested is not None for _, requested in log] == [False, True, False]
@@ -0,0 +1,119 @@
+import asyncio
+import errno
+
+import aiohttp
+import pytest
+
+import src.retry
+from src.retry import (
+    CircuitBreaker,
+    DownloadError,
+    ErrorType,
+    InsufficientDiskError,
+    RetryPolicy,
+    classify_exception,
+    classify_status,
+    parse_retry_after,
+)
+
+
+@pytest.mark.parametrize('status, error_type', [
+    (429, ErrorType.RATE_LIMITED),
+    (408, ErrorType.TRANSIENT_NETWORK),
+    (425, ErrorType.TRANSIENT_NETWORK),
+    (500, ErrorType.SERVER_ERROR),
+    (503, ErrorType.SERVER_ERROR),
+    (403, ErrorType.CLIENT_ERROR),
+    (404, ErrorType.CLIENT_ERROR),
+])
+def test_status_classification(status, error_type):
+    assert classify_status(status) == error_type
+
+
+@pytest.mark.parametrize('exc, error_type', [
+    (DownloadError(ErrorType.NOT_A_ZIP, 'html'), ErrorType.NOT_A_ZIP),
+    (asyncio.TimeoutError(), ErrorType.TIMEOUT),
+    (aiohttp.ServerDisconnectedError(), ErrorType.TRANSIENT_NETWORK),
+    (aiohttp.ClientPayloadError('truncated'), ErrorType.TRANSIENT_NETWORK),
+    (aiohttp.InvalidURL('nope'), ErrorType.CLIENT_ERROR),
+    (OSError(errno.ENOSPC, 'No space left on device'), ErrorType.INSUFFICIENT_DISK),
+    (InsufficientDiskError(errno.ENOSPC, 'full'), ErrorType.INSUFFICIENT_DISK),
+    (OSError(errno.EIO, 'I/O error'), ErrorType.IO_ERROR),
+    (ValueError('?'), ErrorType.UNKNOWN),
+])
+def test_exception_classification(exc, error_type):
+    assert classify_exception(exc) == error_type
+
+
+def test_only_transient_errors_are_retried_within_the_limit():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry(ErrorType.SERVER_ERROR, 0)
+    assert policy.should_retry(ErrorType.RATE_LIMITED, 1)
+    assert not policy.should_retry(ErrorType.SERVER_ERROR, 2)
+    assert not policy.should_retry(ErrorType.CLIENT_ERROR, 0)
+    assert not policy.should_retry(ErrorType.CHECKSUM_MISMATCH, 0)
+    assert policy.should_retry(ErrorType.TIMEOUT, 4, max_retries=5)
+
+
+def test_backoff_honours_retry_after_up_to_its_cap():
+    policy = RetryPolicy(base_delay=1.0, max_delay=8.0, max_retry_after=60.0)
+    assert policy.backoff(0, retry_after=12) == 12
+    assert policy.backoff(0, retry_after=600) == 60
+    assert all(0 <= policy.backoff(10) <= 8.0 for _ in range(100))
+
+
+def test_retry_after_parsing():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+class Clock:
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(src.retry.time, 'monotonic', lambda: self.now)
+
+
+def open_breaker(clock: Clock) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0, probe_timeout=300.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    clock.now += 31
+    return breaker
+
+
+def test_half_open_circuit_lets_a_single_probe_through(monkeypatch):
+    clock = Clock(monkeypatch)
+    breaker = open_breaker(clock)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_failed_probe_reopens_the_circuit(monkeypatch):
+    clock = Clock(monkeypatch)
+    breaker = open_breaker(clock)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    clock.now += 31
+    assert breaker.allow_request()
+
+
+def test_released_or_abandoned_probe_makes_way_for_another(monkeypatch):
+    clock = Clock(monkeypatch)
+    breaker = open_breaker(clock)
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    clock.now += 301
+    assert breaker.allow_request()
@@ -0,0 +1,75 @@
+import io
+import os
+
+from aiohttp import web
+
+from src.main import ZipDownloadExtractor
+from src.retry import RetryPolicy
+from src.sniff import detect_format, has_zip_directory, looks_like_document
+
+from .helpers import FakeActor, body, extracted_paths, make_tar, make_zip, run, serve
+
+ZIP = make_zip({'a.txt': b'a', 'b.txt': b'b'})
+# A stub executable in front of the archive, as in self-extracting ZIPs
+SFX = b'MZ\x90\x00' + os.urandom(8192) + ZIP
+
+
+def test_detect_format_from_the_head():
+    assert detect_format(ZIP) == 'zip'
+    assert detect_format(make_tar({'a.txt': b'a'})) == 'tar'
+    assert detect_format(make_tar({'a.txt': b'a'}, 'gz')) == 'gzip'
+    assert detect_format(SFX) is None
+
+
+def test_documents_are_recognized():
+    assert looks_like_document(b'\xef\xbb\xbf\r\n  <!DOCTYPE html><html>')
+    assert looks_like_document(b'{"error": "forbidden"}')
+    assert not looks_like_document(SFX[:512])
+    assert not looks_like_document(b'#!/bin/sh\nexec java -jar "$0"\n')
+
+
+def test_zip_directory_is_found_in_the_tail():
+    assert has_zip_directory(io.BytesIO(SFX))
+    # The record is followed by an archive comment of up to 64 KB
+    commented = ZIP[:-2] + (0xFFFF).to_bytes(2, 'little') + b'c' * 0xFFFF
+    assert has_zip_directory(io.BytesIO(os.urandom(100_000) + commented))
+    assert not has_zip_directory(io.BytesIO(os.urandom(100_000)))
+
+
+async def process(handler):
+    requests = []
+
+    async def counting(request):
+        requests.append(request.path)
+        return await handler(request)
+
+    async with serve({'/a.zip': counting}) as base:
+        processor = ZipDownloadExtractor(FakeActor(), retry_policy=RetryPolicy(max_retries=2, base_delay=0.01))
+        try:
+            return await processor.process_zip(base + '/a.zip'), len(requests)
+        finally:
+            await processor.close()
+
+
+def test_self_extracting_zip_is_extracted(workdir):
+    result, _ = run(process(body(SFX, {'Content-Type': 'application/x-msdownload'})))
+    assert result['success']
+    assert extracted_paths(result) == ['a.txt', 'b.txt']
+
+
+def test_login_page_is_rejected_without_retries(workdir):
+    page = b'<html><body>Please log in</body></html>' * 100
+
+    async def handler(request):
+        return web.Response(body=page, content_type='application/octet-stream')
+
+    result, requests = run(process(handler))
+    assert not result['success']
+    assert result['error_type'] == 'not_a_zip'
+    assert requests == 1
+
+
+def test_binary_without_zip_directory_is_not_a_zip(workdir):
+    result, _ = run(process(body(os.urandom(200_000))))
+    assert not result['success']
+    assert result['error_type'] == 'not_a_zip'
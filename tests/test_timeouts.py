@@ -0,0 +1,89 @@
+import asyncio
+import os
+
+import pytest
+
+import src.main
+from src.bandwidth import BandwidthLimiter
+from src.main import ZipDownloadExtractor
+from src.retry import DownloadError, ErrorType, RetryPolicy
+from src.timeouts import TransferTimeouts, TransferWatchdog
+
+from .helpers import FakeActor, body, extracted_paths, make_tar, make_zip, run, serve
+
+
+async def transfer(timeouts: TransferTimeouts, steps: int, wait: float, paused: bool):
+    """Receive `steps` small chunks, waiting `wait` seconds (paused or not) after each."""
+    async with TransferWatchdog(timeouts, 'test', check_interval=0.02) as watchdog:
+        watchdog.headers_received()
+        for _ in range(steps):
+            watchdog.progress(1000)
+            if paused:
+                watchdog.pause()
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                if paused:
+                    watchdog.resume()
+
+
+def test_stall_is_detected():
+    timeouts = TransferTimeouts(read_stall=0.1, min_throughput=0)
+    with pytest.raises(DownloadError) as caught:
+        run(transfer(timeouts, 1, 0.5, paused=False))
+    assert caught.value.error_type == ErrorType.TIMEOUT
+    assert 'stalled' in str(caught.value)
+
+
+def test_paused_wait_is_not_a_stall():
+    timeouts = TransferTimeouts(read_stall=0.1, min_throughput=0)
+    run(transfer(timeouts, 2, 0.3, paused=True))
+
+
+def test_paused_time_is_left_out_of_the_throughput_window():
+    timeouts = TransferTimeouts(read_stall=10, min_throughput=100_000, throughput_window=0.1)
+    with pytest.raises(DownloadError) as caught:
+        run(transfer(timeouts, 10, 0.05, paused=False))
+    assert 'Throughput' in str(caught.value)
+    run(transfer(timeouts, 10, 0.05, paused=True))
+
+
+async def process(url: str, **kwargs) -> dict:
+    processor = ZipDownloadExtractor(FakeActor(), retry_policy=RetryPolicy(max_retries=0), **kwargs)
+    try:
+        return await processor.process_zip(url)
+    finally:
+        await processor.close()
+
+
+def test_bandwidth_cap_does_not_trip_the_watchdog(workdir):
+    # Over two seconds at the cap (after its initial burst), far below the throughput floor
+    archive = make_zip({'data.bin': os.urandom(600 * 1024)})
+    timeouts = TransferTimeouts(min_throughput=1024 * 1024, throughput_window=1.5)
+
+    async def scenario():
+        async with serve({'/a.zip': body(archive)}) as base:
+            return await process(base + '/a.zip', timeouts=timeouts, bandwidth=BandwidthLimiter(host_rate=128 * 1024))
+
+    result = run(scenario())
+    assert result['success'], result
+    assert extracted_paths(result) == ['data.bin']
+
+
+def test_waiting_for_a_streamed_extraction_to_finish_is_not_a_stall(workdir, monkeypatch):
+    finish = src.main.ArchiveStream.finish
+
+    async def slow_finish(self):
+        await asyncio.sleep(1.5)
+        await finish(self)
+
+    monkeypatch.setattr(src.main.ArchiveStream, 'finish', slow_finish)
+    tar = make_tar({'a.txt': b'a' * 10_000}, 'gz')
+
+    async def scenario():
+        async with serve({'/a.tar.gz': body(tar)}) as base:
+            return await process(base + '/a.tar.gz', timeouts=TransferTimeouts(read_stall=0.5))
+
+    result = run(scenario())
+    assert result['success'], result
+    assert extracted_paths(result) == ['a.txt']
@@ -0,0 +1,111 @@
+import hashlib
+import io
+import os
+
+from aiohttp import web
+
+import src.main
+from src.checksum import StreamingHasher
+from src.main import ZipDownloadExtractor
+from src.writer import BufferPool, MemorySink
+
+from .helpers import FakeActor, body, extracted_paths, make_zip, run, serve
+
+ZIP_FILES = {'a.txt': b'alpha ' * 5000, 'b.bin': os.urandom(50_000)}
+
+
+async def write_chunks(sink: MemorySink, data: bytes, hasher: StreamingHasher, chunk: int = 1000):
+    stream = sink.open_stream(0, hasher)
+    try:
+        for start in range(0, len(data), chunk):
+            await stream.write(data[start:start + chunk])
+    finally:
+        await stream.close()
+
+
+def test_memory_sink_keeps_small_bodies_in_memory():
+    data = os.urandom(8000)
+    sink = MemorySink(10_000)
+    hasher = StreamingHasher({'sha256': hashlib.sha256(data).hexdigest()})
+    run(write_chunks(sink, data, hasher))
+    assert sink.in_memory
+    assert isinstance(sink.file, io.BytesIO)
+    assert sink.size == len(data)
+    assert sink.file.getvalue() == data
+    assert hasher.mismatches() == {}
+
+
+def test_memory_sink_spills_through_write_behind(tmp_path):
+    data = os.urandom(50_000)
+    sink = MemorySink(10_000, str(tmp_path), BufferPool(buffer_size=4096))
+    hasher = StreamingHasher({'sha256': hashlib.sha256(data).hexdigest()})
+    run(write_chunks(sink, data, hasher))
+    assert not sink.in_memory
+    assert sink.size == len(data)
+    sink.file.seek(0)
+    assert sink.file.read() == data
+    # The first part was hashed in memory, the rest by the writer thread, in order
+    assert hasher.complete and hasher.position == len(data)
+    assert hasher.mismatches() == {}
+    sink.close()
+
+
+def chunked(data: bytes):
+    """Handler sending `data` without a Content-Length."""
+    async def handler(request):
+        response = web.StreamResponse()
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        for start in range(0, len(data), 4096):
+            await response.write(data[start:start + 4096])
+        await response.write_eof()
+        return response
+    return handler
+
+
+def sinks_created(monkeypatch):
+    created = []
+
+    class RecordingSink(MemorySink):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(src.main, 'MemorySink', RecordingSink)
+    return created
+
+
+async def process(base: str, path: str) -> dict:
+    processor = ZipDownloadExtractor(FakeActor())
+    try:
+        return await processor.process_zip(base + path, in_memory_threshold=1024 * 1024)
+    finally:
+        await processor.close()
+
+
+def test_body_with_known_small_length_is_kept_in_memory(workdir, monkeypatch):
+    created = sinks_created(monkeypatch)
+    archive = make_zip(ZIP_FILES)
+
+    async def scenario():
+        async with serve({'/a.zip': body(archive)}) as base:
+            return await process(base, '/a.zip')
+
+    result = run(scenario())
+    assert result['success'], result
+    assert extracted_paths(result) == ['a.txt', 'b.bin']
+    assert len(created) == 1 and created[0].in_memory
+
+
+def test_body_without_length_is_written_to_disk(workdir, monkeypatch):
+    created = sinks_created(monkeypatch)
+    archive = make_zip(ZIP_FILES)
+
+    async def scenario():
+        async with serve({'/a.zip': chunked(archive)}) as base:
+            return await process(base, '/a.zip')
+
+    result = run(scenario())
+    assert result['success'], result
+    assert extracted_paths(result) == ['a.txt', 'b.bin']
+    assert created == []
@@ -0,0 +1,111 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import src.zipaes
+from src.extraction import ExtractionOptions
+from src.main import ZipDownloadExtractor
+from src.retry import ErrorType
+from src.zipaes import COUNTER_RUN, AesKeyCache, counter_blocks
+
+from .helpers import FakeActor, files_under, make_aes_zip
+
+FILES = {
+    'small.txt': b'hello ' * 1000,
+    'big.bin': os.urandom(3 * 1024 * 1024),
+    'empty.txt': b'',
+}
+
+
+def tamper(archive: bytes, name: str, offset: int) -> bytes:
+    """Flip one ciphertext bit `offset` bytes into the data of entry `name`."""
+    header = archive.index(b'PK\x03\x04')
+    while True:
+        name_length, extra_length = struct.unpack_from('<HH', archive, header + 26)
+        if archive[header + 30:header + 30 + name_length] == name.encode():
+            break
+        header = archive.index(b'PK\x03\x04', header + 4)
+    # Local header, name and extra field, then the AES-256 salt (16 bytes) and password verifier (2 bytes)
+    position = header + 30 + name_length + extra_length + 16 + 2 + offset
+    data = bytearray(archive)
+    data[position] ^= 1
+    return bytes(data)
+
+
+@pytest.mark.parametrize('strength', [1, 2, 3])
+@pytest.mark.parametrize('deflate', [True, False])
+def test_aes_entries_decrypt_to_original(workdir, strength, deflate):
+    path = workdir / 'aes.zip'
+    path.write_bytes(make_aes_zip(FILES, b'secret', strength, deflate))
+    extractor = ZipDownloadExtractor(FakeActor())
+    out = workdir / 'out'
+    assert extractor.extract_zip(str(path), str(out), ExtractionOptions(password='secret'))
+    assert {name: (out / name).read_bytes() for name in files_under(out)} == FILES
+    assert extractor.stats['corrupted_files'] == 0
+
+
+def test_wrong_password_fails_before_writing(workdir):
+    path = workdir / 'aes.zip'
+    path.write_bytes(make_aes_zip(FILES, b'secret'))
+    extractor = ZipDownloadExtractor(FakeActor())
+    out = workdir / 'out'
+    assert not extractor.extract_zip(str(path), str(out), ExtractionOptions(password='wrong'))
+    assert extractor._error_type(str(path)) == ErrorType.BAD_PASSWORD
+    assert files_under(out) == []
+
+
+def test_tampered_entry_leaves_no_partial_file(workdir):
+    # Flipped near the end, so most of the entry has been decrypted and written when the HMAC fails
+    path = workdir / 'aes.zip'
+    path.write_bytes(tamper(make_aes_zip(FILES, b'secret', deflate=False), 'big.bin', len(FILES['big.bin']) - 10))
+    extractor = ZipDownloadExtractor(FakeActor())
+    out = workdir / 'out'
+    extractor.extract_zip(str(path), str(out), ExtractionOptions(password='secret'))
+    assert files_under(out) == ['empty.txt', 'small.txt']
+    assert extractor.stats['corrupted_files'] == 1
+    assert any('Bad HMAC' in error for error in extractor.stats['errors'])
+    manifest = extractor._build_manifest(str(out), [])
+    assert sorted(item['path'] for item in manifest) == ['empty.txt', 'small.txt']
+
+
+@pytest.mark.parametrize('first, count', [(1, 1), (1, 3), (2 ** 40, COUNTER_RUN), (5, 2 * COUNTER_RUN + 7)])
+def test_counter_blocks_are_little_endian_128_bit(first, count):
+    expected = b''.join((first + i).to_bytes(16, 'little') for i in range(count))
+    assert counter_blocks(first, count) == expected
+
+
+def test_key_cache_keeps_the_most_recent_keys(monkeypatch):
+    derivations = []
+    real = src.zipaes.hashlib.pbkdf2_hmac
+
+    def counting(*args):
+        derivations.append(args[2])
+        return real(*args)
+
+    monkeypatch.setattr(src.zipaes.hashlib, 'pbkdf2_hmac', counting)
+    cache = AesKeyCache(max_size=3)
+    salts = [bytes([i]) * 16 for i in range(5)]
+    keys = [cache.derive(b'secret', salt, 32) for salt in salts]
+    assert len(cache) == 3
+    # Cached: no new derivation; evicted: derived again, with the same result
+    assert cache.derive(b'secret', salts[4], 32) == keys[4]
+    assert cache.derive(b'secret', salts[0], 32) == keys[0]
+    assert derivations == salts + [salts[0]]
+
+
+def test_aes_archives_extract_in_parallel_workers(workdir):
+    # Extraction workers run archives side by side, as for unencrypted ones
+    extractor = ZipDownloadExtractor(FakeActor())
+    archives = []
+    for i in range(4):
+        path = workdir / f"aes{i}.zip"
+        path.write_bytes(make_aes_zip({f"{i}.bin": FILES['big.bin']}, b'secret'))
+        archives.append((str(path), str(workdir / f"out{i}")))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(
+            lambda paths: extractor.extract_zip(*paths, ExtractionOptions(password='secret')), archives))
+    assert all(results)
+    for i, (_, out) in enumerate(archives):
+        assert open(os.path.join(out, f"{i}.bin"), 'rb').read() == FILES['big.bin']
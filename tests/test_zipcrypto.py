@@ -0,0 +1,52 @@
+import os
+import time
+import zipfile
+
+import pytest
+
+from src.zipcrypto import ZipCryptoDecrypter
+
+
+@pytest.fixture(params=['compiled', 'python'])
+def decrypter(request, monkeypatch):
+    """ZipCryptoDecrypter using the compiled routine or the pure-Python loop."""
+    if request.param == 'compiled' and not ZipCryptoDecrypter.compiled:
+        pytest.skip('compiled ZipCrypto routine not built (python -m src._zipcrypto_build)')
+    monkeypatch.setattr(ZipCryptoDecrypter, 'compiled', request.param == 'compiled')
+    return ZipCryptoDecrypter
+
+
+@pytest.mark.parametrize('password', [b'', b'secret', os.urandom(40)])
+def test_matches_stdlib_decrypter(decrypter, password):
+    data = os.urandom(100_000)
+    assert decrypter(password)(data) == zipfile._ZipDecrypter(password)(data)
+
+
+def test_keys_carry_over_between_buffers(decrypter):
+    data = os.urandom(50_000)
+    instance = decrypter(b'secret')
+    pieces = [instance(data[start:start + size]) for start, size in ((0, 1), (1, 4095), (4096, 45_904))]
+    assert b''.join(pieces) == zipfile._ZipDecrypter(b'secret')(data)
+
+
+def test_accepts_memoryview(decrypter):
+    data = os.urandom(1000)
+    assert decrypter(b'secret')(memoryview(data)[10:]) == zipfile._ZipDecrypter(b'secret')(data[10:])
+
+
+def throughput(decrypt, data: bytes) -> float:
+    """Best of three runs, in bytes per second."""
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        decrypt(data)
+        best = min(best, time.perf_counter() - started)
+    return len(data) / best
+
+
+@pytest.mark.benchmark
+def test_throughput_beats_stdlib(decrypter):
+    data = os.urandom(1024 * 1024)
+    ours = throughput(decrypter(b'secret'), data)
+    stdlib = throughput(zipfile._ZipDecrypter(b'secret'), data)
+    assert ours > (10 if decrypter.compiled else 1.2) * stdlib